@@ -25,11 +25,17 @@ class Config(object):
     # PORTAL_DB_USER=os.environ.get('PORTAL_DB_USER')
     # PORTAL_DB_PW=os.environ.get('PORTAL_DB_PW')
     PORTAL_DB_URI=os.environ.get('PORTAL_DB_URI') or ''
+    PORTAL_COST_WORKERS = int(os.environ.get('PORTAL_COST_WORKERS') or 8) #parallel cost calculation requests to the portal
 
     ##LIMS SETTINGS##
     LIMS_URI=os.environ.get('LIMS_URI') or ''
     LIMS_USER=os.environ.get('LIMS_USER') or ''
     LIMS_PW=os.environ.get('LIMS_PW') or ''
+    LIMS_WORKERS = int(os.environ.get('LIMS_WORKERS') or 8) #parallel LIMS requests
+    LIMS_CACHE = os.environ.get('LIMS_CACHE') or '' #on-disk cache of LIMS responses used by the reporting tools, disabled if empty
+    LIMS_CACHE_TTL = int(os.environ.get('LIMS_CACHE_TTL') or 3600) #seconds a cached LIMS response is used without revalidation
+    LIMS_LINEAGE_CACHE = os.environ.get('LIMS_LINEAGE_CACHE') or '' #on-disk cache of project artifact lineage indexes, disabled if empty
+    YEAR_OVERVIEW_STORE = os.environ.get('YEAR_OVERVIEW_STORE') or 'logs/year_overview_rollups.sqlite' #per-project rollups of closed projects used by the year overview
 
     ##MAIL SETTINGS##
     MAIL_HOST=os.environ.get('MAIL_HOST') or 'localhost'
@@ -59,6 +65,17 @@ class Config(object):
     CONV_FASTQC=os.path.join(CONV_SCRIPT_DIR,'FastQC-v0.11.9/')
     MAX_UNDETERMINED=0.40
 
+    ##RUN MANAGER SETTINGS##
+    MANAGE_RUNS_WORKERS = int(os.environ.get('MANAGE_RUNS_WORKERS') or 1) #run directories processed in parallel
+    MANAGE_RUNS_MACHINE_WORKERS = int(os.environ.get('MANAGE_RUNS_MACHINE_WORKERS') or 1) #parallel runs per machine
+    MANAGE_RUNS_THREADS = int(os.environ.get('MANAGE_RUNS_THREADS') or os.cpu_count() or 1) #CPU budget shared by all parallel runs
+    MANAGE_RUNS_IO_SLOTS = int(os.environ.get('MANAGE_RUNS_IO_SLOTS') or 2) #concurrent transfers shared by all parallel runs
+    CONV_PROJECT_WORKERS = int(os.environ.get('CONV_PROJECT_WORKERS') or 1) #projects demultiplexed in parallel within a run
+    CONV_DEMUX_MODE = os.environ.get('CONV_DEMUX_MODE') or 'project' #'project' (bcl-convert per project) or 'flowcell' (one bcl-convert for all projects)
+    CONV_INDEX_DETECTION = (os.environ.get('CONV_INDEX_DETECTION') or 'true').lower() == 'true' #detect index orientation from the index reads before falling back to bcl-convert checks
+    CONV_STREAM_UPLOAD = (os.environ.get('CONV_STREAM_UPLOAD') or 'false').lower() == 'true' #stream sample archives to nextcloud while they are written
+    CONV_STAGING_WORKERS = int(os.environ.get('CONV_STAGING_WORKERS') or 1) #maximum number of sample archives written in parallel
+
     # HPC_RAW_NANOPORE=[
     #     os.path.join(HPC_RAW_ROOT, 'nanopore')
     # ]
@@ -78,6 +95,20 @@ class Config(object):
     NEXTCLOUD_MAX = 90 #percent
     NEXTCLOUD_REMINDER = 5 #days before expiry of download link (if not downloaded)
     NEXTCLOUD_DOWNLOAD_SUMMARY = 'logs/nextcloud_download_summary.csv'
+    NEXTCLOUD_EVENT_STORE = os.environ.get('NEXTCLOUD_EVENT_STORE') or 'logs/nextcloud_download_events.sqlite' #download events parsed from the access logs and the ingest state per log
+    NEXTCLOUD_GEO_CACHE = os.environ.get('NEXTCLOUD_GEO_CACHE') or 'logs/nextcloud_geolocation.sqlite' #geolocation of download IPs
+    NEXTCLOUD_GEO_TTL = 30 #days a resolved IP location is cached
+    NEXTCLOUD_GEO_NEGATIVE_TTL = 1 #days a failed IP lookup is cached
+    NEXTCLOUD_GEOIP_DB = os.environ.get('NEXTCLOUD_GEOIP_DB') or '' #offline MaxMind city database (.mmdb), ip-api.com is used if empty
+    NEXTCLOUD_GEOIP_ASN_DB = os.environ.get('NEXTCLOUD_GEOIP_ASN_DB') or '' #optional offline MaxMind ASN database (.mmdb) for the ISP
+    NEXTCLOUD_TIMEOUT = int(os.environ.get('NEXTCLOUD_TIMEOUT') or 300) #seconds per request
+    NEXTCLOUD_RETRIES = int(os.environ.get('NEXTCLOUD_RETRIES') or 3) #retries of idempotent requests on connection and gateway errors
+    NEXTCLOUD_UPLOAD_CHUNK_SIZE = int(os.environ.get('NEXTCLOUD_UPLOAD_CHUNK_SIZE') or 64 * 1024 * 1024) #bytes per chunk, 5MB to 5GB
+    NEXTCLOUD_UPLOAD_WORKERS = int(os.environ.get('NEXTCLOUD_UPLOAD_WORKERS') or 4) #chunks uploaded in parallel
+    NEXTCLOUD_UPLOAD_RETRIES = int(os.environ.get('NEXTCLOUD_UPLOAD_RETRIES') or 3) #attempts per chunk
+    NEXTCLOUD_WAIT_TIMEOUT = int(os.environ.get('NEXTCLOUD_WAIT_TIMEOUT') or 900) #seconds to wait for copied data to show up in nextcloud
+    NEXTCLOUD_WAIT_INTERVAL = 1 #seconds before the first poll, doubled after every poll
+    NEXTCLOUD_WAIT_MAX_INTERVAL = 60 #seconds between polls at most
 
     ##SMS SERVER SETTINGS##
     SMS_SERVER = os.environ.get('SMS_SERVER') or ''
@@ -12,12 +12,21 @@ import os
 import time
 import shutil
 import re
+import hashlib
+import tarfile
+import multiprocessing
+import threading
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from contextlib import contextmanager
+from multiprocessing.connection import wait
 from genologics.entities import Project
 from genologics.lims import Lims
-from itertools import islice
+from itertools import combinations, islice
 from pathlib import Path
-from typing import Dict, List, Tuple, Optional, Set, Any, Union
+from typing import Callable, Dict, List, Tuple, Optional, Set, Any, Union
 from modules.useq_illumina_parsers import get_expected_reads, parse_sample_sheet
+from modules.useq_index_orientation import detect_index_orientation
 from modules.useq_nextcloud import NextcloudUtil
 from modules.useq_template import TEMPLATE_PATH, TEMPLATE_ENVIRONMENT, render_template
 from modules.useq_mail import send_mail
@@ -39,6 +48,16 @@ class TransferError(RunManagerError):
     pass
 
 
+# Transfer slots shared by all run workers, set up by schedule_runs
+io_slots = None
+
+# Seconds between checking on running demultiplexing checks
+DEMUX_CHECK_POLL_INTERVAL = 2
+
+# Buffer size used when writing and checksumming staged archives
+STAGING_BUFFER_SIZE = 4 * 1024 * 1024
+
+
 def add_flowcell_to_fastq(project_directory: Path, flowcell_id: str, logger: logging.Logger):
     """
     Add flowcell id to fastq.gz filename.
@@ -125,6 +144,102 @@ def process_sample_indices(header: List[str], sample: List[str]) -> Tuple[List[s
     return sample, sample_rev
 
 
+def swap_sample_indices(header: List[str], sample: List[str]) -> List[str]:
+    """
+    Swap the index and index2 of a sample, for samples whose i7 and i5 were entered the wrong way around.
+
+    Args:
+        header (List[str]): Sample sheet header
+        sample (List[str]): Sample data row
+
+    Returns:
+        Sample data row with index and index2 swapped
+    """
+    index_col = header.index('index')
+    index2_col = header.index('index2')
+
+    swapped = sample.copy()
+    swapped[index_col], swapped[index2_col] = sample[index2_col], sample[index_col]
+
+    return swapped
+
+
+def sample_index_orientations(header: List[str], samples: List[List[str]]) -> Dict[str, List[List[str]]]:
+    """
+    Create the samples for every index orientation that can be tested.
+
+    Args:
+        header (List[str]): Sample sheet header
+        samples (List[List[str]]): Sample data rows
+
+    Returns:
+        Samples per orientation ('forward', 'rev' and for dual index 'swapped', 'swapped-rev')
+    """
+    orientations = {'forward': [], 'rev': []}
+    if 'index2' in header:
+        orientations.update({'swapped': [], 'swapped-rev': []})
+
+    for sample in samples:
+        forward_sample, reverse_sample = process_sample_indices(header, sample)
+        orientations['forward'].append(forward_sample)
+        orientations['rev'].append(reverse_sample)
+
+        if 'index2' in header:
+            swapped_sample, swapped_reverse_sample = process_sample_indices(header, swap_sample_indices(header, sample))
+            orientations['swapped'].append(swapped_sample)
+            orientations['swapped-rev'].append(swapped_reverse_sample)
+
+    return orientations
+
+
+def detect_samplesheet_orientation(run_dir: Path, pid: str, project_data: Dict[str, Any], header: List[str],
+                                   orientations: Dict[str, List[List[str]]], logger: logging.Logger) -> Optional[str]:
+    """
+    Detect the index orientation of a project from the index reads, without running bcl-convert.
+
+    Args:
+        run_dir (Path): Run directory path
+        pid (str): Project ID
+        project_data (Dict[str, Any]): Project information
+        header (List[str]): Sample sheet header
+        orientations (Dict[str, List[List[str]]]): Samples per orientation
+        logger (logging.Logger): Logger instance
+
+    Returns:
+        Name of the detected orientation, None if it could not be detected with confidence
+    """
+    if not Config.CONV_INDEX_DETECTION or not project_data['on_lanes']:
+        return None
+
+    index_col = header.index('index')
+    index2_col = header.index('index2') if 'index2' in header else None
+
+    candidates = {
+        orientation: [(sample[index_col], sample[index2_col] if index2_col is not None else '') for sample in samples]
+        for orientation, samples in orientations.items()
+    }
+
+    logger.info(f'Detecting index orientation for projectID {pid} from the index reads')
+    return detect_index_orientation(run_dir, min(project_data['on_lanes']), candidates, logger)
+
+
+def write_samplesheet(sample_sheet: Path, master_sheet: Dict[str, Any], samples: List[List[str]]):
+    """
+    Write a sample sheet with the top section and header of the master sample sheet.
+
+    Args:
+        sample_sheet (Path): Path to the sample sheet to write
+        master_sheet (Dict[str, Any]): Master sample sheet data
+        samples (List[List[str]]): Sample data rows
+    """
+    with open(sample_sheet, 'w') as ss:
+        ss.write(master_sheet['top'])
+        ss.write(f'{",".join(master_sheet["header"])}\n')
+
+        for sample in samples:
+            ss.write(f'{",".join(sample)}\n')
+
+
 def run_system_command(command: str, logger: logging.Logger, shell: bool = False) -> bool:
     """
     Execute system command with proper error handling.
@@ -171,6 +286,38 @@ def update_status(status_file: Path, status: Dict[str, Any]) -> None:
         json.dump(status, f, indent=4)
 
 
+def bcl_convert_thread_options(threads: Optional[int]) -> str:
+    """
+    Create bcl-convert options limiting the number of threads used.
+
+    Args:
+        threads (Optional[int]): Number of threads, None leaves the bcl-convert defaults
+
+    Returns:
+        Command line options string (empty if threads is None)
+    """
+    if not threads:
+        return ''
+
+    return (f' --bcl-num-conversion-threads {threads} --bcl-num-compression-threads {threads} '
+            f'--bcl-num-decompression-threads {max(1, threads // 2)}')
+
+
+@contextmanager
+def transfer_slot():
+    """
+    Hold one of the transfer slots shared by all run workers for the duration of a transfer.
+
+    Does nothing when runs are processed sequentially.
+    """
+    if io_slots is None:
+        yield
+        return
+
+    with io_slots:
+        yield
+
+
 def validate_demultiplexing_stats(stats: Dict[str, Any], pid: str, project_data: Dict[str, Any],
                                 run_data: Dict[str, Any], logger: logging.Logger) -> bool:
     """
@@ -225,7 +372,52 @@ def validate_demultiplexing_stats(stats: Dict[str, Any], pid: str, project_data:
     return True
 
 
-def check_demultiplexing_samplesheet(sample_sheet: Path, pid: str, project_data: Dict[str, Any], run_data: Dict[str, Any], first_tile: str, logger: logging.Logger) -> bool:
+def demultiplexing_check_command(sample_sheet: Path, first_tile: str, threads: Optional[int] = None) -> str:
+    """
+    Create the bcl-convert command testing demultiplexing of a single tile with given samplesheet.
+
+    Args:
+        sample_sheet: (Path) Path to sample sheet (in the Conversion directory of the run)
+        first_tile (str): First tile for testing
+        threads (Optional[int]): Number of threads bcl-convert may use (None for all)
+
+    Returns:
+        bcl-convert command
+    """
+    run_dir = "/" + "/".join(sample_sheet.parts[1:sample_sheet.parts.index('Conversion')])
+    demux_out_dir = sample_sheet.parent / sample_sheet.stem
+
+    command = (f'{Config.CONV_BCLCONVERT}/bcl-convert --bcl-input-directory {run_dir} '
+              f'--output-directory {demux_out_dir} --sample-sheet {sample_sheet} '
+              f'--bcl-sampleproject-subdirectories true --force --tiles {first_tile}')
+    command += bcl_convert_thread_options(threads)
+
+    return command
+
+
+def check_demultiplexing_stats(sample_sheet: Path, pid: str, project_data: Dict[str, Any], run_data: Dict[str, Any], logger: logging.Logger) -> bool:
+    """
+    Validate the stats of a finished demultiplexing test.
+
+    Args:
+        sample_sheet: (Path) Path to the tested sample sheet
+        pid (str): Project ID
+        project_data (Dict[str, Any]): Project information
+        run_data (Dict[str, Any]): Run information
+        logger (logging.Logger): Logger instance
+
+    Returns:
+        True if demultiplexing test passed, False otherwise
+    """
+    demux_out_dir = sample_sheet.parent / sample_sheet.stem
+
+    logger.info(f'Checking demultiplexing stats for {demux_out_dir}/Reports')
+    stats = parse_conversion_stats(demux_out_dir / 'Reports')
+
+    return validate_demultiplexing_stats(stats, pid, project_data, run_data, logger)
+
+
+def check_demultiplexing_samplesheet(sample_sheet: Path, pid: str, project_data: Dict[str, Any], run_data: Dict[str, Any], first_tile: str, logger: logging.Logger, threads: Optional[int] = None) -> bool:
     """
     Test demultiplexing with given samplesheet.
 
@@ -236,32 +428,101 @@ def check_demultiplexing_samplesheet(sample_sheet: Path, pid: str, project_data:
         run_data (Dict[str, Any]): Run information
         first_tile (str): First tile for testing
         logger (logging.Logger): Logger instance
+        threads (Optional[int]): Number of threads bcl-convert may use (None for all)
 
     Returns:
         True if demultiplexing test passed, False otherwise
     """
-    run_dir = "/" + "/".join(sample_sheet.parts[1:sample_sheet.parts.index('Conversion')])
-    demux_out_dir = sample_sheet.parent / sample_sheet.stem
-
     logger.info(f'Running demultiplexing check on {sample_sheet.name}')
 
-    command = (f'{Config.CONV_BCLCONVERT}/bcl-convert --bcl-input-directory {run_dir} '
-              f'--output-directory {demux_out_dir} --sample-sheet {sample_sheet} '
-              f'--bcl-sampleproject-subdirectories true --force --tiles {first_tile}')
-
-    if not run_system_command(command, logger):
+    if not run_system_command(demultiplexing_check_command(sample_sheet, first_tile, threads), logger):
         logger.error(f'Failed to run demultiplexing check on {sample_sheet.name}')
         raise DemultiplexingError(f'Demultiplexing check failed for {sample_sheet.name}')
 
-    logger.info(f'Checking demultiplexing stats for {demux_out_dir}/Reports')
-    stats = parse_conversion_stats(demux_out_dir / 'Reports')
+    return check_demultiplexing_stats(sample_sheet, pid, project_data, run_data, logger)
 
-    return validate_demultiplexing_stats(stats, pid, project_data, run_data, logger)
 
+def race_demultiplexing_checks(sample_sheets: List[Path], pid: str, project_data: Dict[str, Any], run_data: Dict[str, Any], first_tile: str, logger: logging.Logger, threads: Optional[int] = None) -> Optional[Path]:
+    """
+    Test demultiplexing with several samplesheets at the same time.
+
+    Samplesheets are preferred in list order, so the forward orientation wins when both pass. As soon as
+    the most preferred samplesheet that has not failed passes, it is used and the checks still running
+    are cancelled.
 
-def demultiplex_project(run_dir: Path, pid: str, project_data: Dict[str, Any], run_data: Dict[str, Any], master_sheet: Dict[str, Any], first_tile: str, logger: logging.Logger) -> bool:
+    Args:
+        sample_sheets (List[Path]): Paths to the sample sheets to test
+        pid (str): Project ID
+        project_data (Dict[str, Any]): Project information
+        run_data (Dict[str, Any]): Run information
+        first_tile (str): First tile for testing
+        logger (logging.Logger): Logger instance
+        threads (Optional[int]): Number of threads all checks together may use (None for all)
+
+    Returns:
+        Path to the samplesheet that passed, None if none of them passed
+
+    Raises:
+        DemultiplexingError: If bcl-convert failed for one of the checks
     """
-    Demultiplex samples for a specific project.
+    check_threads = split_threads(threads, len(sample_sheets))
+    checks = {}
+    passed = set()
+    failed = set()
+
+    try:
+        for sample_sheet in sample_sheets:
+            command = demultiplexing_check_command(sample_sheet, first_tile, check_threads)
+            logger.info(f'Running demultiplexing check on {sample_sheet.name}')
+            logger.info(f'Running command: {command}')
+
+            with open(sample_sheet.with_suffix('.log'), 'w') as check_log:
+                try:
+                    checks[sample_sheet] = subprocess.Popen(shlex.split(command), stdout=subprocess.DEVNULL, stderr=check_log)
+                except FileNotFoundError as e:
+                    logger.error(f'Process failed - executable not found: {e}')
+                    raise DemultiplexingError(f'Demultiplexing check failed for {sample_sheet.name}')
+
+        while checks:
+            finished = [sample_sheet for sample_sheet in sample_sheets
+                        if sample_sheet in checks and checks[sample_sheet].poll() is not None]
+
+            for sample_sheet in finished:
+                check = checks.pop(sample_sheet)
+
+                if check.returncode != 0:
+                    logger.error(f'Process failed with return code {check.returncode}, '
+                                 f'see {sample_sheet.with_suffix(".log")}')
+                    logger.error(f'Failed to run demultiplexing check on {sample_sheet.name}')
+                    raise DemultiplexingError(f'Demultiplexing check failed for {sample_sheet.name}')
+
+                if check_demultiplexing_stats(sample_sheet, pid, project_data, run_data, logger):
+                    passed.add(sample_sheet)
+                else:
+                    failed.add(sample_sheet)
+
+            preferred = next((sample_sheet for sample_sheet in sample_sheets if sample_sheet not in failed), None)
+            if preferred in passed:
+                return preferred
+
+            if checks and not finished:
+                time.sleep(DEMUX_CHECK_POLL_INTERVAL)
+
+        return None
+
+    finally:
+        for sample_sheet, check in checks.items():
+            logger.info(f'Cancelling demultiplexing check on {sample_sheet.name}')
+            check.terminate()
+            check.wait()
+
+
+def find_correct_samplesheet(run_dir: Path, pid: str, project_data: Dict[str, Any], run_data: Dict[str, Any], master_sheet: Dict[str, Any], first_tile: str, logger: logging.Logger, threads: Optional[int] = None) -> Optional[Path]:
+    """
+    Create forward and reverse complement sample sheets for a project and find the one with the correct index orientation.
+
+    The orientation is detected from the index reads first, bcl-convert checks on a single tile
+    are only used when the detection is not confident.
 
     Args:
         run_dir (Path): Run directory path
@@ -271,9 +532,10 @@ def demultiplex_project(run_dir: Path, pid: str, project_data: Dict[str, Any], r
         master_sheet (Dict[str, Any]): Master sample sheet data
         first_tile (str): First tile for testing
         logger (logging.Logger): Logger instance
+        threads (Optional[int]): Number of threads bcl-convert may use (None for all)
 
     Returns:
-        True if demultiplexing succeeded, False otherwise
+        Path to the correct sample sheet, None if neither orientation passed the demultiplexing check
     """
     samples = project_data['samples']
     project_directory = run_dir / 'Conversion' / pid
@@ -282,50 +544,66 @@ def demultiplex_project(run_dir: Path, pid: str, project_data: Dict[str, Any], r
     demux_directory = project_directory / 'Demux-check'
     demux_directory.mkdir(parents=True, exist_ok=True)
 
-    flowcell = run_dir.name.split("_")[-1]
     logger.info('Moving on with demux test.')
 
+    orientations = sample_index_orientations(master_sheet['header'], samples)
+
+    # Use the orientation detected from the index reads if it is clear enough
+    orientation = detect_samplesheet_orientation(run_dir, pid, project_data, master_sheet['header'], orientations, logger)
+    if orientation:
+        suffix = '' if orientation == 'forward' else f'-{orientation}'
+        sample_sheet = demux_directory / f'SampleSheet-{pid}{suffix}.csv'
+        logger.info(f'Creating samplesheet {sample_sheet}')
+        write_samplesheet(sample_sheet, master_sheet, orientations[orientation])
+        return sample_sheet
+
     # Create both forward and reverse sample sheets
     sample_sheet = demux_directory / f'SampleSheet-{pid}.csv'
     sample_sheet_rev = demux_directory / f'SampleSheet-{pid}-rev.csv'
 
-    with open(sample_sheet, 'w') as ss, open(sample_sheet_rev, 'w') as ssr:
-        logger.info(f'Creating samplesheets {sample_sheet} and {sample_sheet_rev}')
-
-        # Write headers
-        ss.write(master_sheet['top'])
-        ss.write(f'{",".join(master_sheet["header"])}\n')
-        ssr.write(master_sheet['top'])
-        ssr.write(f'{",".join(master_sheet["header"])}\n')
-
-        # Process samples
-        for sample in samples:
-            forward_sample, reverse_sample = process_sample_indices(master_sheet['header'], sample)
-            ss.write(f'{",".join(forward_sample)}\n')
-            ssr.write(f'{",".join(reverse_sample)}\n')
+    logger.info(f'Creating samplesheets {sample_sheet} and {sample_sheet_rev}')
+    write_samplesheet(sample_sheet, master_sheet, orientations['forward'])
+    write_samplesheet(sample_sheet_rev, master_sheet, orientations['rev'])
 
-    # Test both sample sheets to find the correct one
-    correct_samplesheet = None
+    # Test both sample sheets at the same time to find the correct one
     try:
-        if check_demultiplexing_samplesheet(sample_sheet, pid, project_data, run_data, first_tile, logger):
-            correct_samplesheet = sample_sheet
-        elif check_demultiplexing_samplesheet(sample_sheet_rev, pid, project_data, run_data, first_tile, logger):
-            correct_samplesheet = sample_sheet_rev
+        correct_samplesheet = race_demultiplexing_checks([sample_sheet, sample_sheet_rev], pid, project_data,
+                                                         run_data, first_tile, logger, threads=threads)
     except DemultiplexingError:
-        logger.error(f'Could not create a correct samplesheet for projectID {pid}, skipping demux.')
-        return False
+        correct_samplesheet = None
 
     if not correct_samplesheet:
         logger.error(f'Could not create a correct samplesheet for projectID {pid}, skipping demux.')
-        return False
+
+    return correct_samplesheet
+
+
+def convert_project(run_dir: Path, pid: str, sample_sheet: Path, first_tile: str, logger: logging.Logger, threads: Optional[int] = None):
+    """
+    Run the full bcl-convert for a project using its validated sample sheet.
+
+    Args:
+        run_dir (Path): Run directory path
+        pid (str): Project ID
+        sample_sheet (Path): Validated sample sheet of the project
+        first_tile (str): First tile (only converted in dev mode)
+        logger (logging.Logger): Logger instance
+        threads (Optional[int]): Number of threads bcl-convert may use (None for all)
+
+    Raises:
+        DemultiplexingError: If bcl-convert failed
+    """
+    project_directory = run_dir / 'Conversion' / pid
+    flowcell = run_dir.name.split("_")[-1]
 
     # Move correct samplesheet and run full demultiplexing
-    final_samplesheet = project_directory / correct_samplesheet.name
-    shutil.move(str(correct_samplesheet), str(final_samplesheet))
+    final_samplesheet = project_directory / sample_sheet.name
+    shutil.move(str(sample_sheet), str(final_samplesheet))
 
     logger.info('Starting demultiplexing')
     command = (f'{Config.CONV_BCLCONVERT}/bcl-convert --bcl-input-directory {run_dir} '
               f'--output-directory {project_directory} --force --sample-sheet {final_samplesheet}')
+    command += bcl_convert_thread_options(threads)
 
     if Config.DEVMODE:
         command += f" --tiles {first_tile} "
@@ -335,9 +613,365 @@ def demultiplex_project(run_dir: Path, pid: str, project_data: Dict[str, Any], r
         raise DemultiplexingError(f'Demultiplexing failed for project {pid}')
 
     add_flowcell_to_fastq(project_directory, flowcell, logger)
+
+
+def demultiplex_project(run_dir: Path, pid: str, project_data: Dict[str, Any], run_data: Dict[str, Any], master_sheet: Dict[str, Any], first_tile: str, logger: logging.Logger, threads: Optional[int] = None) -> bool:
+    """
+    Demultiplex samples for a specific project.
+
+    Args:
+        run_dir (Path): Run directory path
+        pid (str): Project ID
+        project_data (Dict[str, Any]): Project information
+        run_data (Dict[str, Any]): Run information
+        master_sheet (Dict[str, Any]): Master sample sheet data
+        first_tile (str): First tile for testing
+        logger (logging.Logger): Logger instance
+        threads (Optional[int]): Number of threads bcl-convert may use (None for all)
+
+    Returns:
+        True if demultiplexing succeeded, False otherwise
+    """
+    correct_samplesheet = find_correct_samplesheet(run_dir, pid, project_data, run_data, master_sheet,
+                                                   first_tile, logger, threads=threads)
+    if not correct_samplesheet:
+        return False
+
+    convert_project(run_dir, pid, correct_samplesheet, first_tile, logger, threads=threads)
+    return True
+
+
+def split_threads(threads: Optional[int], workers: int) -> Optional[int]:
+    """
+    Divide a thread budget over a number of concurrent workers.
+
+    Args:
+        threads (Optional[int]): Total number of threads (None for no limit)
+        workers (int): Number of concurrent workers
+
+    Returns:
+        Number of threads per worker (None if there is no limit and only one worker)
+    """
+    if workers <= 1:
+        return threads
+
+    return max(1, (threads or os.cpu_count() or 1) // workers)
+
+
+def run_for_projects(func: Callable[[str], Any], pids: List[str], workers: int, logger: logging.Logger) -> Dict[str, Any]:
+    """
+    Call func for every project ID, using up to `workers` threads.
+
+    Args:
+        func (Callable[[str], Any]): Function called with a project ID
+        pids (List[str]): Project IDs
+        workers (int): Maximum number of concurrent calls
+        logger (logging.Logger): Logger instance
+
+    Returns:
+        Dictionary mapping project IDs to the return value of func
+
+    Raises:
+        Exception: Re-raises the first exception raised by func, after cancelling the calls not yet started
+    """
+    results = {}
+
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as executor:
+        futures = {executor.submit(func, pid): pid for pid in pids}
+
+        for future in as_completed(futures):
+            try:
+                results[futures[future]] = future.result()
+            except Exception as e:
+                logger.error(f'Demultiplexing failed for {futures[future]}: {e}')
+                for pending in futures:
+                    pending.cancel()
+                raise
+
+    return results
+
+
+def demultiplex_projects(run_dir: Path, pids: List[str], project_data: Dict[str, Any], run_data: Dict[str, Any],
+                         master_sheet: Dict[str, Any], first_tile: str, status: Dict[str, Any], status_file: Path,
+                         logger: logging.Logger, threads: Optional[int] = None):
+    """
+    Demultiplex projects, running up to Config.CONV_PROJECT_WORKERS bcl-convert processes at the same time.
+
+    The thread budget of the run is divided over the concurrent bcl-convert processes and
+    the result of every project is written to the status file as soon as it is known.
+    In 'flowcell' mode (Config.CONV_DEMUX_MODE) the projects are converted in a single pass instead.
+
+    Args:
+        run_dir (Path): Run directory path
+        pids (List[str]): Project IDs to demultiplex
+        project_data (Dict[str, Any]): Project information
+        run_data (Dict[str, Any]): Run information
+        master_sheet (Dict[str, Any]): Master sample sheet data
+        first_tile (str): First tile for testing
+        status (Dict[str, Any]): Run status, updated in place
+        status_file (Path): Path to status file
+        logger (logging.Logger): Logger instance
+        threads (Optional[int]): Number of threads this run may use (None for no limit)
+    """
+    if not pids:
+        return
+
+    if Config.CONV_DEMUX_MODE == 'flowcell':
+        demultiplex_flowcell(run_dir, pids, project_data, run_data, master_sheet,
+                             first_tile, status, status_file, logger, threads=threads)
+        return
+
+    workers = max(1, min(Config.CONV_PROJECT_WORKERS, len(pids)))
+    project_threads = split_threads(threads, workers)
+    status_lock = threading.Lock()
+
+    def demultiplex(pid: str):
+        logger.info(f'Starting demultiplexing attempt for projectID {pid}')
+        success = demultiplex_project(run_dir, pid, project_data[pid], run_data, master_sheet,
+                                      first_tile, logger, threads=project_threads)
+
+        with status_lock:
+            status['projects'][pid]['Demultiplexing'] = success
+            if not success:
+                status['projects'][pid]['BCL-Only'] = True
+            update_status(status_file, status)
+
+    run_for_projects(demultiplex, pids, workers, logger)
+
+
+def index_distance(index_a: str, index_b: str) -> int:
+    """
+    Count the mismatching positions of two indices of equal length.
+
+    Args:
+        index_a (str): First index sequence
+        index_b (str): Second index sequence
+
+    Returns:
+        Number of mismatches
+    """
+    return sum(base_a != base_b for base_a, base_b in zip(index_a, index_b))
+
+
+def can_merge_samplesheets(header: List[str], project_samples: Dict[str, List[List[str]]], logger: logging.Logger) -> bool:
+    """
+    Check if the validated sample sheets of several projects can be converted as one sample sheet.
+
+    Samples sharing a lane must have equal index lengths, and indices of different projects
+    sharing a lane must not collide when bcl-convert allows one mismatch per index.
+
+    Args:
+        header (List[str]): Sample sheet header
+        project_samples (Dict[str, List[List[str]]]): Validated sample rows per project ID
+        logger (logging.Logger): Logger instance
+
+    Returns:
+        True if the sample sheets can be merged, False otherwise
+    """
+    lane_col = header.index('Lane') if 'Lane' in header else None
+    index_col = header.index('index')
+    index2_col = header.index('index2') if 'index2' in header else None
+
+    lanes = {}
+    for pid, samples in project_samples.items():
+        for sample in samples:
+            lane = sample[lane_col] if lane_col is not None else 'all'
+            index2 = sample[index2_col] if index2_col is not None else ''
+            lanes.setdefault(lane, []).append((pid, sample[index_col], index2))
+
+    for lane, indices in lanes.items():
+        if len({(len(index), len(index2)) for _, index, index2 in indices}) > 1:
+            logger.warning(f'Index lengths differ on lane {lane}, samplesheets can not be merged')
+            return False
+
+        for (pid_a, index_a, index2_a), (pid_b, index_b, index2_b) in combinations(indices, 2):
+            if pid_a == pid_b:
+                continue
+            if index_distance(index_a, index_b) <= 2 and index_distance(index2_a, index2_b) <= 2:
+                logger.warning(f'Indices of {pid_a} and {pid_b} collide on lane {lane}, samplesheets can not be merged')
+                return False
+
     return True
 
 
+def filter_report(report: Path, filtered_report: Path, pid: str, sample_ids: Set[str], lanes: Set[int], path_replacement: Tuple[str, str]):
+    """
+    Write the rows of a whole flowcell bcl-convert report that belong to a single project.
+
+    Rows are matched on the Sample_Project column if present, otherwise on sample ID. Undetermined
+    rows and rows without a sample column are kept for the lanes of the project. Reports without
+    a sample or lane column are copied as is.
+
+    Args:
+        report (Path): Whole flowcell report
+        filtered_report (Path): Project report to write
+        pid (str): Project ID
+        sample_ids (Set[str]): Sample IDs of the project
+        lanes (Set[int]): Lanes of the project
+        path_replacement (Tuple[str, str]): Output path of the project in the whole flowcell conversion and its new location
+    """
+    with open(report, 'r') as original, open(filtered_report, 'w') as filtered:
+        header_line = original.readline()
+        header = header_line.rstrip('\n').split(',')
+        filtered.write(header_line)
+
+        sample_col = next((header.index(col) for col in ['SampleID', 'Sample_ID', 'RGSM'] if col in header), None)
+        project_col = header.index('Sample_Project') if 'Sample_Project' in header else None
+        lane_col = header.index('Lane') if 'Lane' in header else None
+        lane_names = {str(lane) for lane in lanes}
+
+        for line in original:
+            if sample_col is None and lane_col is None:
+                filtered.write(line)
+                continue
+
+            parts = line.rstrip('\n').split(',')
+            on_lane = lane_col is None or (len(parts) > lane_col and parts[lane_col] in lane_names)
+            sample = parts[sample_col] if sample_col is not None and len(parts) > sample_col else None
+
+            if sample is None or sample == 'Undetermined':
+                keep = on_lane
+            elif project_col is not None and len(parts) > project_col:
+                keep = on_lane and parts[project_col] == pid
+            else:
+                keep = on_lane and sample in sample_ids
+
+            if keep:
+                filtered.write(line.replace(*path_replacement))
+
+
+def split_flowcell_output(run_dir: Path, flowcell_directory: Path, pid: str, project_data: Dict[str, Any], run_data: Dict[str, Any], logger: logging.Logger):
+    """
+    Move the output of a whole flowcell conversion for one project into Conversion/<pid>.
+
+    FastQ files are moved, Undetermined reads only for lanes the project has to itself
+    and all Reports are filtered down to the samples and lanes of the project.
+
+    Args:
+        run_dir (Path): Run directory path
+        flowcell_directory (Path): Output directory of the whole flowcell conversion
+        pid (str): Project ID
+        project_data (Dict[str, Any]): Project information
+        run_data (Dict[str, Any]): Run information
+        logger (logging.Logger): Logger instance
+    """
+    logger.info(f'Splitting flowcell conversion output for {pid}')
+    project_directory = run_dir / 'Conversion' / pid
+    project_directory.mkdir(parents=True, exist_ok=True)
+
+    for fastq in (flowcell_directory / pid).glob('*.fastq.gz'):
+        fastq.rename(project_directory / fastq.name)
+
+    for lane in project_data['on_lanes']:
+        if run_data['lanes'].get(lane, {}).get('projects') == {pid}:
+            for fastq in flowcell_directory.glob(f'Undetermined_S0_L{lane:03d}_*.fastq.gz'):
+                fastq.rename(project_directory / fastq.name)
+
+    reports_directory = project_directory / 'Reports'
+    reports_directory.mkdir(parents=True, exist_ok=True)
+    path_replacement = (f'{flowcell_directory / pid}/', f'{project_directory}/')
+
+    for report in (flowcell_directory / 'Reports').iterdir():
+        if not report.is_file():
+            continue
+
+        if report.suffix == '.csv':
+            filter_report(report, reports_directory / report.name, pid, project_data['sample_ids'],
+                          project_data['on_lanes'], path_replacement)
+        else:
+            shutil.copy(str(report), str(reports_directory / report.name))
+
+
+def demultiplex_flowcell(run_dir: Path, pids: List[str], project_data: Dict[str, Any], run_data: Dict[str, Any],
+                         master_sheet: Dict[str, Any], first_tile: str, status: Dict[str, Any], status_file: Path,
+                         logger: logging.Logger, threads: Optional[int] = None):
+    """
+    Demultiplex projects with a single bcl-convert pass over the whole flowcell.
+
+    The index orientation of every project is validated first, then the validated sample sheets are
+    merged and converted once with --bcl-sampleproject-subdirectories. The output is split into
+    Conversion/<pid> so it looks the same as a conversion per project. Falls back to a conversion
+    per project when the sample sheets can not be merged.
+
+    Args:
+        run_dir (Path): Run directory path
+        pids (List[str]): Project IDs to demultiplex
+        project_data (Dict[str, Any]): Project information
+        run_data (Dict[str, Any]): Run information
+        master_sheet (Dict[str, Any]): Master sample sheet data
+        first_tile (str): First tile for testing
+        status (Dict[str, Any]): Run status, updated in place
+        status_file (Path): Path to status file
+        logger (logging.Logger): Logger instance
+        threads (Optional[int]): Number of threads this run may use (None for no limit)
+    """
+    workers = max(1, min(Config.CONV_PROJECT_WORKERS, len(pids)))
+    project_threads = split_threads(threads, workers)
+    flowcell = run_dir.name.split("_")[-1]
+
+    logger.info(f'Validating index orientation for projectIDs {", ".join(pids)}')
+    sample_sheets = run_for_projects(
+        lambda pid: find_correct_samplesheet(run_dir, pid, project_data[pid], run_data, master_sheet,
+                                             first_tile, logger, threads=project_threads),
+        pids, workers, logger
+    )
+
+    for pid in pids:
+        if not sample_sheets[pid]:
+            status['projects'][pid]['BCL-Only'] = True
+    update_status(status_file, status)
+
+    pids = [pid for pid in pids if sample_sheets[pid]]
+    if not pids:
+        return
+
+    project_samples = {pid: parse_sample_sheet(sample_sheets[pid])['samples'] for pid in pids}
+
+    if not can_merge_samplesheets(master_sheet['header'], project_samples, logger):
+        logger.warning('Falling back to demultiplexing per project')
+
+        def convert(pid: str):
+            convert_project(run_dir, pid, sample_sheets[pid], first_tile, logger, threads=project_threads)
+
+        run_for_projects(convert, pids, workers, logger)
+    else:
+        conversion_directory = run_dir / 'Conversion'
+        flowcell_directory = conversion_directory / 'Flowcell'
+        merged_sample_sheet = conversion_directory / 'SampleSheet-flowcell.csv'
+
+        with open(merged_sample_sheet, 'w') as ss:
+            logger.info(f'Creating samplesheet {merged_sample_sheet}')
+            ss.write(master_sheet['top'])
+            ss.write(f'{",".join(master_sheet["header"])}\n')
+            for pid in pids:
+                for sample in project_samples[pid]:
+                    ss.write(f'{",".join(sample)}\n')
+
+        logger.info('Starting whole flowcell demultiplexing')
+        command = (f'{Config.CONV_BCLCONVERT}/bcl-convert --bcl-input-directory {run_dir} '
+                  f'--output-directory {flowcell_directory} --force --sample-sheet {merged_sample_sheet} '
+                  f'--bcl-sampleproject-subdirectories true')
+        command += bcl_convert_thread_options(threads)
+
+        if Config.DEVMODE:
+            command += f" --tiles {first_tile} "
+
+        if not run_system_command(command, logger):
+            logger.error(f'Failed to run demultiplexing for projectIDs {", ".join(pids)}.')
+            raise DemultiplexingError(f'Demultiplexing failed for flowcell {flowcell}')
+
+        for pid in pids:
+            split_flowcell_output(run_dir, flowcell_directory, pid, project_data[pid], run_data, logger)
+            shutil.move(str(sample_sheets[pid]), str(conversion_directory / pid / sample_sheets[pid].name))
+            add_flowcell_to_fastq(conversion_directory / pid, flowcell, logger)
+
+        shutil.rmtree(flowcell_directory)
+
+    for pid in pids:
+        status['projects'][pid]['Demultiplexing'] = True
+    update_status(status_file, status)
+
+
 def filter_stats_by_samples(lims: Lims, pid: str, pid_staging: Path, report_dir: Path):
     """
     Filter adapter and demultiplexing stats to include only project samples.
@@ -374,7 +1008,7 @@ def filter_stats_by_samples(lims: Lims, pid: str, pid_staging: Path, report_dir:
                     filtered.write(line)
 
 
-def generate_run_statistics(lims: Lims, run_dir: Path, logger: logging.Logger) -> bool:
+def generate_run_statistics(lims: Lims, run_dir: Path, logger: logging.Logger, threads: Optional[int] = None) -> bool:
     """
     Generate comprehensive run statistics and quality reports.
 
@@ -382,6 +1016,7 @@ def generate_run_statistics(lims: Lims, run_dir: Path, logger: logging.Logger) -
         lims (Lims): LIMS connection
         run_dir (Path): Run directory path
         logger (logging.Logger): Logger instance
+        threads (Optional[int]): Number of threads FastQC may use (None for the default of 24)
 
     Returns:
         True if statistics generation succeeded
@@ -430,7 +1065,7 @@ def generate_run_statistics(lims: Lims, run_dir: Path, logger: logging.Logger) -
         # Run FastQC and MultiQC if not in dev mode
         if not Config.DEVMODE:
             logger.info('Running FastQC')
-            fastqc_command = (f'{Config.CONV_FASTQC}/fastqc -t 24 -q '
+            fastqc_command = (f'{Config.CONV_FASTQC}/fastqc -t {threads or 24} -q '
                             f'{run_dir}/Conversion/**/*_R*fastq.gz -o {fastqc_dir}')
 
             if not run_system_command(fastqc_command, logger, shell=True):
@@ -453,7 +1088,8 @@ def generate_run_statistics(lims: Lims, run_dir: Path, logger: logging.Logger) -
     consolidate_statistics_files(conversion_dir, stats_dir)
 
     # Upload to HPC
-    upload_to_hpc(lims, run_dir, None, logger)
+    with transfer_slot():
+        upload_to_hpc(lims, run_dir, None, logger)
     return True
 
 
@@ -750,111 +1386,424 @@ def parse_summary_stats(summary_file: Path) -> Dict[str, Any]:
         if '(I)' in read:  # Skip index reads
             continue
 
-        for lane in tmp[read]:
-            if lane not in stats['all']:
-                stats['all'][lane] = {}
-            stats['all'][lane][read] = tmp[read][lane]
+        for lane in tmp[read]:
+            if lane not in stats['all']:
+                stats['all'][lane] = {}
+            stats['all'][lane][read] = tmp[read][lane]
+
+    return stats
+
+
+def upload_to_archive(run_dir: Path, logger: logging.Logger) -> bool:
+    """
+    Upload run directory to archive storage.
+
+    Args:
+        run_dir (Path): Run directory path
+        logger (logging.Logger): Logger instance
+
+    Returns:
+        True if upload succeeded
+    """
+    # Determine machine name
+    if 'MyRun' in run_dir.parents[0].name:
+        machine = run_dir.parents[1].name
+    else:
+        machine = run_dir.parents[0].name
+
+    command = "rsync -rahm "
+    if Config.DEVMODE:
+        command += "--dry-run "
+
+    logger.info('Uploading run folder to archive storage')
+
+    if machine == 'WES-WGS':
+        command += f"--exclude '*jpg' {run_dir} {Config.USEQ_USER}@{Config.HPC_TRANSFER_SERVER}:{Config.HPC_ARCHIVE_DIR}/{machine}"
+    else:
+        command += f"--exclude '*jpg' --exclude '*fastq.gz' --exclude '*fq.gz' {run_dir} {Config.USEQ_USER}@{Config.HPC_TRANSFER_SERVER}:{Config.HPC_ARCHIVE_DIR}/{machine}"
+
+    if not run_system_command(command, logger):
+        logger.error('Failed upload run folder to archive storage')
+        raise TransferError('Archive upload failed')
+
+    return True
+
+
+def upload_to_hpc(lims: Lims, run_dir: Path, pid: Optional[str], logger: logging.Logger) -> bool:
+    """
+    Upload run data to HPC storage.
+
+    Args:
+        lims (Lims): LIMS connection
+        run_dir (Path): Run directory path
+        pid (Optional[str]): Project ID (optional)
+        logger (logging.Logger): Logger instance
+
+    Returns:
+        True if upload succeeded
+    """
+    # Determine machine name
+    if 'MyRun' in run_dir.parents[0].name:
+        machine = run_dir.parents[1].name
+    else:
+        machine = run_dir.parents[0].name
+
+    command = '/usr/bin/rsync -rah --update --stats --verbose --prune-empty-dirs '
+    if Config.DEVMODE:
+        command += '--dry-run '
+
+    if pid:
+        project = Project(lims, id=pid)
+        samples = lims.get_samples(projectlimsid=project.id)
+
+        if samples:
+            analysis_steps = samples[0].udf.get('Analysis', '').split(',')
+            if len(analysis_steps) > 1 or project.udf.get('Application', '') == 'SNP Fingerprinting':
+                command += '--exclude "*Undetermined_*.fastq.gz" '
+                command += f'--include "Conversion/{pid}/*.fastq.gz" '
+            else:
+                command += f'--exclude "Conversion/{pid}/*.fastq.gz" '
+
+        command += (f" --include '*/' --include 'md5sum.txt' --include 'SampleSheet.csv' "
+                   f"--include 'RunInfo.xml' --include '*unParameters.xml' --include 'InterOp/**' "
+                   f"--include '*/Conversion/{pid}/Reports/**' --include 'Data/Intensities/BaseCalls/Stats/**' "
+                   f"--include '*.[pP][eE][dD]'")
+    else:
+        command += ' --exclude "*.fastq.gz" '
+        command += (f" --include '*/' --include 'md5sum.txt' --include 'SampleSheet.csv' "
+                   f"--include 'RunInfo.xml' --include '*unParameters.xml' --include 'InterOp/**' "
+                   f"--include '*/Conversion/Reports/**' --include 'Data/Intensities/BaseCalls/Stats/**' "
+                   f"--include '*.[pP][eE][dD]'")
+
+    command += " --exclude '*' "
+    command += f" {run_dir} {Config.USEQ_USER}@{Config.HPC_TRANSFER_SERVER}:/{Config.HPC_RAW_ROOT}/{machine}"
+
+    logger.info('Uploading run folder to HPC')
+
+    if not run_system_command(command, logger):
+        logger.error('Failed upload run folder to HPC')
+        raise TransferError('HPC upload failed')
+
+    return True
+
+
+class StagingWriter:
+    """
+    File-like object writing a staged archive while computing its MD5 checksum.
+
+    The archive can be streamed to Nextcloud over ssh at the same time, so each byte is read from disk once.
+    """
+
+    def __init__(self, path: Path, logger: logging.Logger, remote_path: Optional[str] = None):
+        """
+        Args:
+            path (Path): Path of the archive to write
+            logger (logging.Logger): Logger instance
+            remote_path (Optional[str]): Path on the Nextcloud host to stream the archive to (None to only write locally)
+        """
+        self.path = path
+        self.logger = logger
+        self.md5 = hashlib.md5()
+        self.file = open(path, 'wb')
+        self.stream = None
+
+        if remote_path:
+            try:
+                self.stream = subprocess.Popen(['ssh', Config.NEXTCLOUD_HOST, f'cat > {shlex.quote(remote_path)}'],
+                                               stdin=subprocess.PIPE, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+            except OSError as e:
+                logger.warning(f'Could not stream {path.name} to nextcloud, it will be uploaded afterwards: {e}')
+
+    def write(self, data: bytes) -> int:
+        self.file.write(data)
+        self.md5.update(data)
+
+        if self.stream:
+            try:
+                self.stream.stdin.write(data)
+            except OSError as e:
+                self.logger.warning(f'Streaming {self.path.name} to nextcloud failed, it will be uploaded afterwards: {e}')
+                self._stop_stream()
+
+        return len(data)
+
+    def _stop_stream(self) -> bool:
+        """Close the stream to Nextcloud and return whether it completed."""
+        stream, self.stream = self.stream, None
+        try:
+            stream.stdin.close()
+        except OSError:
+            pass
+        return stream.wait() == 0
+
+    def close(self) -> bool:
+        """
+        Close the archive.
+
+        Returns:
+            True if the archive was also streamed to Nextcloud completely
+        """
+        self.file.close()
+        return self._stop_stream() if self.stream else False
+
+
+def write_md5_file(file: Path, md5: str):
+    """
+    Store the MD5 checksum of a staged file next to it, so it does not have to be read again on resume.
+
+    Args:
+        file (Path): Staged file
+        md5 (str): MD5 hex digest of the file
+    """
+    md5_file = file.with_name(f'{file.name}.md5')
+    md5_file.write_text(f'{md5}\n')
+
+
+def read_md5_file(file: Path) -> str:
+    """
+    Get the MD5 checksum of a staged file, computing (and storing) it if it is not known yet.
+
+    Args:
+        file (Path): Staged file
+
+    Returns:
+        MD5 hex digest of the file
+    """
+    md5_file = file.with_name(f'{file.name}.md5')
+    if md5_file.is_file():
+        return md5_file.read_text().strip()
+
+    md5 = hashlib.md5()
+    with open(file, 'rb') as f:
+        for block in iter(lambda: f.read(STAGING_BUFFER_SIZE), b''):
+            md5.update(block)
+
+    write_md5_file(file, md5.hexdigest())
+    return md5.hexdigest()
+
+
+def stage_tar(tar_file: Path, done_file: Path, files: List[Path], logger: logging.Logger, remote_path: Optional[str] = None) -> bool:
+    """
+    Create a tar archive of files in one pass, computing its MD5 checksum while writing.
+
+    The archive is marked done with done_file and is not created again when the marker exists.
+
+    Args:
+        tar_file (Path): Path of the archive to create
+        done_file (Path): Marker file for a finished archive
+        files (List[Path]): Files to add, stored under their file name
+        logger (logging.Logger): Logger instance
+        remote_path (Optional[str]): Path on the Nextcloud host to stream the archive to while writing
+
+    Returns:
+        True if the archive was created and streamed to Nextcloud, False if it still has to be uploaded
+
+    Raises:
+        TransferError: If the archive could not be created
+    """
+    if done_file.is_file():
+        return False
+
+    logger.info(f'Creating {tar_file}')
+    writer = StagingWriter(tar_file, logger, remote_path)
+    streamed = False
+
+    try:
+        with tarfile.open(fileobj=writer, mode='w|', format=tarfile.GNU_FORMAT, bufsize=STAGING_BUFFER_SIZE) as tar:
+            for file in files:
+                tar.add(file, arcname=file.name)
+    except (OSError, tarfile.TarError) as e:
+        logger.error(f'Failed to create {tar_file}: {e}')
+        raise TransferError(f'Failed to create tar file {tar_file.name}')
+    finally:
+        streamed = writer.close()
+
+    write_md5_file(tar_file, writer.md5.hexdigest())
+    done_file.touch()
+
+    return streamed
+
+
+class AdaptiveIOLimit:
+    """
+    Concurrency limit for staging archives that adapts to the throughput of the staging filesystem.
 
-    return stats
+    The limit starts at one writer and grows while adding writers increases the throughput. When the
+    throughput drops the limit shrinks again, so the filesystem is saturated without thrashing it.
+    The best throughput seen decays every window, so the limit can grow again after a slow period.
+    """
+
+    def __init__(self, max_workers: int, window: float = 10.0, decay: float = 0.8):
+        """
+        Args:
+            max_workers (int): Upper bound for the number of concurrent writers
+            window (float): Seconds over which the throughput is measured before adapting the limit
+            decay (float): Factor the best throughput is multiplied with every window it is not reached
+        """
+        self.max_workers = max(1, max_workers)
+        self.window = window
+        self.decay = decay
+        self.limit = 1
+        self.active = 0
+        self.best_rate = 0.0
+        self.window_bytes = 0
+        self.window_start = time.monotonic()
+        self.condition = threading.Condition()
+
+    @contextmanager
+    def slot(self):
+        """Wait until a writer is allowed to start."""
+        with self.condition:
+            self.condition.wait_for(lambda: self.active < self.limit)
+            self.active += 1
+        try:
+            yield
+        finally:
+            with self.condition:
+                self.active -= 1
+                self.condition.notify_all()
+
+    def record(self, nr_bytes: int):
+        """
+        Record the bytes written by a finished writer and adapt the limit once a window has passed.
+
+        Args:
+            nr_bytes (int): Number of bytes written
+        """
+        with self.condition:
+            self.window_bytes += nr_bytes
+            elapsed = time.monotonic() - self.window_start
+            if elapsed < self.window:
+                return
+
+            rate = self.window_bytes / elapsed
+            if rate > self.best_rate * 1.1:
+                self.best_rate = rate
+                self.limit = min(self.limit + 1, self.max_workers)
+            else:
+                if rate < self.best_rate * 0.9:
+                    self.limit = max(self.limit - 1, 1)
+                self.best_rate = max(rate, self.best_rate * self.decay)
 
+            self.window_bytes = 0
+            self.window_start = time.monotonic()
+            self.condition.notify_all()
 
-def upload_to_archive(run_dir: Path, logger: logging.Logger) -> bool:
+
+def stage_tars(archives: List[Tuple[Path, Path, List[Path]]], logger: logging.Logger, remote_dir: Optional[str] = None) -> Set[Path]:
     """
-    Upload run directory to archive storage.
+    Create tar archives in parallel, with at most Config.CONV_STAGING_WORKERS writers at a time.
+
+    Archives with a done marker are skipped, the number of concurrent writers adapts to the staging throughput.
 
     Args:
-        run_dir (Path): Run directory path
+        archives (List[Tuple[Path, Path, List[Path]]]): Archive path, done marker and files for each archive
         logger (logging.Logger): Logger instance
+        remote_dir (Optional[str]): Directory on the Nextcloud host to stream the archives to while writing
 
     Returns:
-        True if upload succeeded
-    """
-    # Determine machine name
-    if 'MyRun' in run_dir.parents[0].name:
-        machine = run_dir.parents[1].name
-    else:
-        machine = run_dir.parents[0].name
+        Archives that were streamed to Nextcloud completely
 
-    command = "rsync -rahm "
-    if Config.DEVMODE:
-        command += "--dry-run "
+    Raises:
+        TransferError: If one of the archives could not be created
+    """
+    io_limit = AdaptiveIOLimit(Config.CONV_STAGING_WORKERS)
+    pending = [archive for archive in archives if not archive[1].is_file()]
+
+    def stage(tar_file: Path, done_file: Path, files: List[Path]) -> bool:
+        with io_limit.slot():
+            remote_path = f'{remote_dir}/{tar_file.name}' if remote_dir else None
+            streamed = stage_tar(tar_file, done_file, files, logger, remote_path)
+        io_limit.record(tar_file.stat().st_size)
+        return streamed
+
+    streamed = set()
+    with ThreadPoolExecutor(max_workers=min(Config.CONV_STAGING_WORKERS, len(pending)) or 1) as executor:
+        futures = {executor.submit(stage, *archive): archive[0] for archive in pending}
+        try:
+            for future in as_completed(futures):
+                if future.result():
+                    streamed.add(futures[future])
+        except TransferError:
+            for future in futures:
+                future.cancel()
+            raise
 
-    logger.info('Uploading run folder to archive storage')
+    return streamed
 
-    if machine == 'WES-WGS':
-        command += f"--exclude '*jpg' {run_dir} {Config.USEQ_USER}@{Config.HPC_TRANSFER_SERVER}:{Config.HPC_ARCHIVE_DIR}/{machine}"
-    else:
-        command += f"--exclude '*jpg' --exclude '*fastq.gz' --exclude '*fq.gz' {run_dir} {Config.USEQ_USER}@{Config.HPC_TRANSFER_SERVER}:{Config.HPC_ARCHIVE_DIR}/{machine}"
 
-    if not run_system_command(command, logger):
-        logger.error('Failed upload run folder to archive storage')
-        raise TransferError('Archive upload failed')
+def write_md5sums(staging_dir: Path):
+    """
+    Write md5sums.txt for all archives in a staging directory, in the format of md5sum.
 
-    return True
+    Args:
+        staging_dir (Path): Staging directory
+    """
+    with open(staging_dir / 'md5sums.txt', 'w') as md5sums:
+        for tar_file in sorted(staging_dir.glob('*.tar')):
+            md5sums.write(f'{read_md5_file(tar_file)}  {tar_file.name}\n')
 
 
-def upload_to_hpc(lims: Lims, run_dir: Path, pid: Optional[str], logger: logging.Logger) -> bool:
+def prepare_nextcloud_upload(run_dir: Path, upload_id: str, logger: logging.Logger):
     """
-    Upload run data to HPC storage.
+    Remove previous versions of an upload from Nextcloud and create its directory.
 
     Args:
-        lims (Lims): LIMS connection
         run_dir (Path): Run directory path
-        pid (Optional[str]): Project ID (optional)
+        upload_id (str): Name of the upload directory on Nextcloud
         logger (logging.Logger): Logger instance
-
-    Returns:
-        True if upload succeeded
     """
-    # Determine machine name
-    if 'MyRun' in run_dir.parents[0].name:
-        machine = run_dir.parents[1].name
-    else:
-        machine = run_dir.parents[0].name
+    transfer_done = Path(Config.CONV_STAGING_DIR) / f'{upload_id}.done'
 
-    command = '/usr/bin/rsync -rah --update --stats --verbose --prune-empty-dirs '
-    if Config.DEVMODE:
-        command += '--dry-run '
+    # Handle existing uploads
+    global nextcloud_util
+    if nextcloud_util.check_exists(upload_id) and nextcloud_util.check_exists(f'{upload_id}.done'):
+        logger.info(f'Deleting previous version of {upload_id} on Nextcloud')
+        nextcloud_util.delete(upload_id)
+        nextcloud_util.delete(f'{upload_id}.done')
+    elif nextcloud_util.check_exists(upload_id):
+        logger.info(f'Deleting incomplete previous version of {upload_id} on Nextcloud')
+        transfer_done.touch()
 
-    if pid:
-        project = Project(lims, id=pid)
-        samples = lims.get_samples(projectlimsid=project.id)
+        command = f"scp -r {transfer_done} {Config.NEXTCLOUD_HOST}:{Config.NEXTCLOUD_DATA_ROOT}/{Config.NEXTCLOUD_RAW_DIR}/"
+        logger.info(f'Transferring {transfer_done} to nextcloud')
 
-        if samples:
-            analysis_steps = samples[0].udf.get('Analysis', '').split(',')
-            if len(analysis_steps) > 1 or project.udf.get('Application', '') == 'SNP Fingerprinting':
-                command += '--exclude "*Undetermined_*.fastq.gz" '
-                command += f'--include "Conversion/{pid}/*.fastq.gz" '
-            else:
-                command += f'--exclude "Conversion/{pid}/*.fastq.gz" '
+        if not run_system_command(command, logger):
+            logger.error(f'Failed to upload {transfer_done} to nextcloud')
+            raise TransferError('Failed to upload done marker to Nextcloud')
 
-        command += (f" --include '*/' --include 'md5sum.txt' --include 'SampleSheet.csv' "
-                   f"--include 'RunInfo.xml' --include '*unParameters.xml' --include 'InterOp/**' "
-                   f"--include '*/Conversion/{pid}/Reports/**' --include 'Data/Intensities/BaseCalls/Stats/**' "
-                   f"--include '*.[pP][eE][dD]'")
-    else:
-        command += ' --exclude "*.fastq.gz" '
-        command += (f" --include '*/' --include 'md5sum.txt' --include 'SampleSheet.csv' "
-                   f"--include 'RunInfo.xml' --include '*unParameters.xml' --include 'InterOp/**' "
-                   f"--include '*/Conversion/Reports/**' --include 'Data/Intensities/BaseCalls/Stats/**' "
-                   f"--include '*.[pP][eE][dD]'")
+        transfer_done.unlink()
 
-    command += " --exclude '*' "
-    command += f" {run_dir} {Config.USEQ_USER}@{Config.HPC_TRANSFER_SERVER}:/{Config.HPC_RAW_ROOT}/{machine}"
+        # The previous version can only be deleted once nextcloud picked up the marker
+        if not nextcloud_util.wait_for(f'{upload_id}.done'):
+            logger.error(f'{upload_id}.done did not show up on nextcloud')
+            raise TransferError('Done marker did not show up on Nextcloud')
 
-    logger.info('Uploading run folder to HPC')
+        nextcloud_util.delete(upload_id)
+        nextcloud_util.delete(f'{upload_id}.done')
+
+    # Create directory on Nextcloud
+    tmp_dir = run_dir / upload_id
+    tmp_dir.mkdir(parents=True, exist_ok=True)
+    logger.info(f'Creating nextcloud dir for {upload_id}')
+
+    command = f"scp -r {tmp_dir} {Config.NEXTCLOUD_HOST}:{Config.NEXTCLOUD_DATA_ROOT}/{Config.NEXTCLOUD_RAW_DIR}/"
 
     if not run_system_command(command, logger):
-        logger.error('Failed upload run folder to HPC')
-        raise TransferError('HPC upload failed')
+        logger.error(f'Failed to create nextcloud dir for {upload_id}')
+        tmp_dir.rmdir()
+        raise TransferError('Failed to create Nextcloud directory')
 
-    return True
+    tmp_dir.rmdir()
 
 
 def upload_to_nextcloud(lims: Lims, run_dir: Path, pid: str, logger: logging.Logger, mode: str = 'fastq', skip_undetermined: bool = True, lanes: Optional[Set[int]] = None) -> bool:
     """
     Upload data to Nextcloud storage.
 
+    In FASTQ mode the samples are archived in parallel, each archive checksummed in the same pass. With Config.CONV_STREAM_UPLOAD
+    the archives are also streamed to Nextcloud while they are written.
+
     Args:
         lims (Lims): LIMS instance
         run_dir (Path): Run directory path
@@ -877,6 +1826,16 @@ def upload_to_nextcloud(lims: Lims, run_dir: Path, pid: str, logger: logging.Log
     pid_staging = Path(Config.CONV_STAGING_DIR) / pid
     pid_staging.mkdir(parents=True, exist_ok=True)
 
+    upload_id = f"{pid}_{flowcell}"
+    transfer_done = Path(Config.CONV_STAGING_DIR) / f'{upload_id}.done'
+    remote_dir = f"{Config.NEXTCLOUD_DATA_ROOT}/{Config.NEXTCLOUD_RAW_DIR}/{upload_id}"
+
+    # Archives streamed to Nextcloud while staging do not have to be uploaded again
+    streamed = set()
+    stream_upload = Config.CONV_STREAM_UPLOAD and mode == 'fastq'
+    if stream_upload:
+        prepare_nextcloud_upload(run_dir, upload_id, logger)
+
     if mode == 'fastq':
         # Process FASTQ files
         pid_samples = set()
@@ -887,37 +1846,19 @@ def upload_to_nextcloud(lims: Lims, run_dir: Path, pid: str, logger: logging.Log
             if name != 'Undetermined':
                 pid_samples.add(name)
 
-        # Create tar files for each sample
-        for sample in pid_samples:
-            logger.info(f'Zipping samples for {pid}')
-            sample_zip = pid_staging / f'{sample}.tar'
-            sample_zip_done = pid_staging / f'{sample}.tar.done'
-
-            if not sample_zip_done.is_file():
-                os.chdir(pid_dir)
-                command = f'tar -cvf {sample_zip} {sample}_*fastq.gz'
-
-                if not run_system_command(command, logger, shell=True):
-                    logger.error(f'Failed to create {sample_zip}')
-                    raise TransferError(f'Failed to create tar file for sample {sample}')
-                else:
-                    sample_zip_done.touch()
+        # Collect the archives to create, one for each sample
+        archives = []
+        for sample in sorted(pid_samples):
+            archives.append((pid_staging / f'{sample}.tar', pid_staging / f'{sample}.tar.done',
+                             sorted(pid_dir.glob(f'{sample}_*fastq.gz'))))
 
         # Handle undetermined reads
         if not skip_undetermined:
-            logger.info('Zipping undetermined reads')
-            und_zip = pid_staging / 'undetermined.tar'
-            und_zip_done = pid_staging / 'Undetermined.tar.done'
-
-            if not und_zip_done.is_file():
-                os.chdir(pid_dir)
-                command = f'tar -cvf {und_zip} Undetermined_*fastq.gz'
+            archives.append((pid_staging / 'undetermined.tar', pid_staging / 'Undetermined.tar.done',
+                             sorted(pid_dir.glob('Undetermined_*fastq.gz'))))
 
-                if not run_system_command(command, logger, shell=True):
-                    logger.error(f'Failed to create {und_zip}')
-                    raise TransferError('Failed to create undetermined tar file')
-                else:
-                    und_zip_done.touch()
+        logger.info(f'Zipping samples for {pid}')
+        streamed = stage_tars(archives, logger, remote_dir if stream_upload else None)
 
         # Filter statistics
         logger.info(f'Filtering stats for {pid}')
@@ -957,58 +1898,23 @@ def upload_to_nextcloud(lims: Lims, run_dir: Path, pid: str, logger: logging.Log
                 zip_done.touch()
 
     # Upload to Nextcloud
-    upload_id = f"{pid}_{flowcell}"
-    transfer_done = Path(Config.CONV_STAGING_DIR) / f'{upload_id}.done'
-
-    # Handle existing uploads
-    global nextcloud_util
-    if nextcloud_util.check_exists(upload_id) and nextcloud_util.check_exists(f'{upload_id}.done'):
-        logger.info(f'Deleting previous version of {upload_id} on Nextcloud')
-        nextcloud_util.delete(upload_id)
-        nextcloud_util.delete(f'{upload_id}.done')
-    elif nextcloud_util.check_exists(upload_id):
-        logger.info(f'Deleting incomplete previous version of {upload_id} on Nextcloud')
-        transfer_done.touch()
-
-        command = f"scp -r {transfer_done} {Config.NEXTCLOUD_HOST}:{Config.NEXTCLOUD_DATA_ROOT}/{Config.NEXTCLOUD_RAW_DIR}/"
-        logger.info(f'Transferring {transfer_done} to nextcloud')
-
-        if not run_system_command(command, logger):
-            logger.error(f'Failed to upload {transfer_done} to nextcloud')
-            raise TransferError('Failed to upload done marker to Nextcloud')
-
-        transfer_done.unlink()
-        time.sleep(60)
-        nextcloud_util.delete(upload_id)
-        nextcloud_util.delete(f'{upload_id}.done')
-
-    # Create directory on Nextcloud
-    tmp_dir = run_dir / upload_id
-    tmp_dir.mkdir(parents=True, exist_ok=True)
-    logger.info(f'Creating nextcloud dir for {upload_id}')
-
-    command = f"scp -r {tmp_dir} {Config.NEXTCLOUD_HOST}:{Config.NEXTCLOUD_DATA_ROOT}/{Config.NEXTCLOUD_RAW_DIR}/"
-
-    if not run_system_command(command, logger):
-        logger.error(f'Failed to create nextcloud dir for {upload_id}')
-        tmp_dir.rmdir()
-        raise TransferError('Failed to create Nextcloud directory')
-
-    tmp_dir.rmdir()
+    if not stream_upload:
+        prepare_nextcloud_upload(run_dir, upload_id, logger)
 
-    # Create checksums
+    # Create checksums, reusing the checksums computed while staging
     logger.info(f'Creating md5sums for {upload_id}')
-    os.chdir(pid_staging)
-    command = f'md5sum *.tar > {pid_staging}/md5sums.txt'
-
-    if not run_system_command(command, logger, shell=True):
-        logger.error(f'Failed to create md5sums for files in {pid_staging}')
+    try:
+        write_md5sums(pid_staging)
+    except OSError as e:
+        logger.error(f'Failed to create md5sums for files in {pid_staging}: {e}')
         raise TransferError('Failed to create checksums')
 
     # Upload files
-    upload_commands = [
-        (f'{pid_staging}/*.tar', 'tar files'),
-    ]
+    upload_commands = []
+
+    unstreamed = [str(tar_file) for tar_file in sorted(pid_staging.glob('*.tar')) if tar_file not in streamed]
+    if unstreamed:
+        upload_commands.append((' '.join(unstreamed), 'tar files'))
 
     if mode == 'fastq':
         upload_commands.append((f'{pid_staging}/*.csv', 'CSV files'))
@@ -1017,7 +1923,7 @@ def upload_to_nextcloud(lims: Lims, run_dir: Path, pid: str, logger: logging.Log
 
     for file_pattern, description in upload_commands:
         logger.info(f'Transferring {description} to nextcloud')
-        command = f"scp -r {file_pattern} {Config.NEXTCLOUD_HOST}:{Config.NEXTCLOUD_DATA_ROOT}/{Config.NEXTCLOUD_RAW_DIR}/{upload_id}"
+        command = f"scp -r {file_pattern} {Config.NEXTCLOUD_HOST}:{remote_dir}"
 
         if not run_system_command(command, logger, shell=True):
             logger.error(f'Failed to upload {description} to nextcloud')
@@ -1147,7 +2053,7 @@ def send_status_mail(lims: Lims, message: str, run_dir: Path, project_data: Dict
     send_mail(mail_subject, mail_content, Config.MAIL_SENDER, Config.MAIL_ADMINS, attachments=attachments)
 
 
-def process_run_directory(lims: Lims, run_dir: Path, machine: str, logger: logging.Logger):
+def process_run_directory(lims: Lims, run_dir: Path, machine: str, logger: logging.Logger, threads: Optional[int] = None):
     """
     Process a single run directory through the complete pipeline.
 
@@ -1156,6 +2062,7 @@ def process_run_directory(lims: Lims, run_dir: Path, machine: str, logger: loggi
         run_dir (Path): Run directory path
         machine (str): Machine name
         logger (logging.Logger): Logger instance
+        threads (Optional[int]): Number of threads this run may use (None for no limit)
     """
     # Important file paths
     sample_sheet = run_dir / 'SampleSheet.csv'
@@ -1206,7 +2113,6 @@ def process_run_directory(lims: Lims, run_dir: Path, machine: str, logger: loggi
         logger.info('Extracting sample/project information from samplesheet')
         run_data, project_data = parse_run_data(sample_sheet, default_lanes)
 
-        # Process each project
         for pid in project_data:
             if pid not in status['projects']:
                 status['projects'][pid] = {
@@ -1217,22 +2123,22 @@ def process_run_directory(lims: Lims, run_dir: Path, machine: str, logger: loggi
                 }
                 update_status(status_file, status)
 
-            # Demultiplexing
-            if not status['projects'][pid]['Demultiplexing'] and not status['projects'][pid]['BCL-Only']:
-                logger.info(f'Starting demultiplexing attempt for projectID {pid}')
+        master_sheet = parse_sample_sheet(sample_sheet)
 
-                try:
-                    success = demultiplex_project(run_dir, pid, project_data[pid],
-                                                run_data, parse_sample_sheet(sample_sheet),
-                                                first_tile, logger)
-                    status['projects'][pid]['Demultiplexing'] = success
-                    if not success:
-                        status['projects'][pid]['BCL-Only'] = True
-                    update_status(status_file, status)
+        # With more than one project worker, or when converting the whole flowcell at once,
+        # all projects are demultiplexed before the transfers start
+        if Config.CONV_PROJECT_WORKERS > 1 or Config.CONV_DEMUX_MODE == 'flowcell':
+            pending_pids = [pid for pid in project_data
+                            if not status['projects'][pid]['Demultiplexing'] and not status['projects'][pid]['BCL-Only']]
+            demultiplex_projects(run_dir, pending_pids, project_data, run_data, master_sheet,
+                                 first_tile, status, status_file, logger, threads=threads)
 
-                except Exception as e:
-                    logger.error(f'Demultiplexing failed for {pid}: {e}')
-                    raise
+        # Process each project
+        for pid in project_data:
+            # Demultiplexing
+            if not status['projects'][pid]['Demultiplexing'] and not status['projects'][pid]['BCL-Only']:
+                demultiplex_projects(run_dir, [pid], project_data, run_data, master_sheet,
+                                     first_tile, status, status_file, logger, threads=threads)
 
             # Determine transfer mode
             transfer_mode = 'fastq' if status['projects'][pid]['Demultiplexing'] else 'bcl'
@@ -1246,10 +2152,11 @@ def process_run_directory(lims: Lims, run_dir: Path, machine: str, logger: loggi
                     logger.info(f'Skipping upload of undetermined reads for {pid}')
 
                 try:
-                    success = upload_to_nextcloud(lims, run_dir, pid, logger,
-                                                mode=transfer_mode,
-                                                skip_undetermined=skip_undetermined,
-                                                lanes=project_data[pid]['on_lanes'])
+                    with transfer_slot():
+                        success = upload_to_nextcloud(lims, run_dir, pid, logger,
+                                                    mode=transfer_mode,
+                                                    skip_undetermined=skip_undetermined,
+                                                    lanes=project_data[pid]['on_lanes'])
                     status['projects'][pid]['Transfer-nc'] = success
                     update_status(status_file, status)
 
@@ -1260,7 +2167,8 @@ def process_run_directory(lims: Lims, run_dir: Path, machine: str, logger: loggi
             # HPC transfer
             if not status['projects'][pid]['Transfer-hpc']:
                 try:
-                    success = upload_to_hpc(lims, run_dir, pid, logger)
+                    with transfer_slot():
+                        success = upload_to_hpc(lims, run_dir, pid, logger)
                     status['projects'][pid]['Transfer-hpc'] = success
                     update_status(status_file, status)
 
@@ -1271,7 +2179,7 @@ def process_run_directory(lims: Lims, run_dir: Path, machine: str, logger: loggi
         # Generate run statistics
         if not status['run']['Stats']:
             try:
-                success = generate_run_statistics(lims, run_dir, logger)
+                success = generate_run_statistics(lims, run_dir, logger, threads=threads)
                 status['run']['Stats'] = success
                 update_status(status_file, status)
 
@@ -1282,7 +2190,8 @@ def process_run_directory(lims: Lims, run_dir: Path, machine: str, logger: loggi
         # Archive run
         if not status['run']['Archive']:
             try:
-                success = upload_to_archive(run_dir, logger)
+                with transfer_slot():
+                    success = upload_to_archive(run_dir, logger)
                 status['run']['Archive'] = success
                 update_status(status_file, status)
 
@@ -1501,15 +2410,40 @@ def setup_logger(run_dir: Path) -> logging.Logger:
     return logger
 
 
-def manage_runs(lims: Lims) -> None:
-    """Main function to manage sequencing runs.
+def acquire_run_lock(run_dir: Path) -> bool:
+    """
+    Atomically claim a run directory by creating its .mgr_running lock file.
+
+    Overlapping invocations race on the same file, so only one of them can claim a run.
 
     Args:
-        lims (Lims): LIMS instance
+        run_dir (Path): Run directory path
+
+    Returns:
+        True if the run was claimed, False if it is already running, failed or done
     """
-    machine_aliases = Config.MACHINE_ALIASES
-    if Config.DEVMODE:
-        machine_aliases = ['novaseqx_01']  # Only used for dev runs
+    if any((run_dir / lock).is_file() for lock in ['.mgr_failed', '.mgr_done']):
+        return False
+
+    try:
+        os.close(os.open(run_dir / '.mgr_running', os.O_CREAT | os.O_EXCL | os.O_WRONLY))
+    except FileExistsError:
+        return False
+
+    return True
+
+
+def find_pending_runs(machine_aliases: List[str]) -> List[Tuple[str, Path]]:
+    """
+    Find all finished run directories that have not been processed yet.
+
+    Args:
+        machine_aliases (List[str]): Machine directories to search
+
+    Returns:
+        List of (machine, run_dir) tuples
+    """
+    pending_runs = []
 
     for machine in machine_aliases:
         machine_dir = Path(Config.CONV_MAIN_DIR) / machine
@@ -1533,22 +2467,138 @@ def manage_runs(lims: Lims) -> None:
                     not any(f.is_file() for f in [running_file, failed_file, done_file])):
                 continue
 
-            # Set up logging for this run
-            logger = setup_logger(run_dir)
+            pending_runs.append((machine, run_dir))
 
-            try:
-                logger.info(f'Processing run directory: {run_dir.name}')
-                process_run_directory(lims, run_dir, machine, logger)
+    return pending_runs
 
-            except Exception as e:
-                logger.error(f'Fatal error processing {run_dir.name}: {e}')
-                logger.error(traceback.format_exc())
 
-            finally:
-                # Clean up logger handlers to prevent memory leaks
-                for handler in logger.handlers[:]:
-                    handler.close()
-                    logger.removeHandler(handler)
+def process_run(lims: Lims, run_dir: Path, machine: str, threads: Optional[int] = None) -> None:
+    """
+    Set up logging for a claimed run directory and process it.
+
+    Args:
+        lims (Lims): LIMS instance
+        run_dir (Path): Run directory path
+        machine (str): Machine name
+        threads (Optional[int]): Number of threads this run may use (None for no limit)
+    """
+    # Set up logging for this run
+    logger = setup_logger(run_dir)
+
+    try:
+        logger.info(f'Processing run directory: {run_dir.name}')
+        process_run_directory(lims, run_dir, machine, logger, threads=threads)
+
+    except Exception as e:
+        logger.error(f'Fatal error processing {run_dir.name}: {e}')
+        logger.error(traceback.format_exc())
+
+    finally:
+        # Clean up logger handlers to prevent memory leaks
+        for handler in logger.handlers[:]:
+            handler.close()
+            logger.removeHandler(handler)
+
+
+def _run_worker(lims: Lims, run_dir: Path, machine: str, threads: int) -> None:
+    """
+    Entry point of a forked run worker process.
+
+    Args:
+        lims (Lims): LIMS instance
+        run_dir (Path): Run directory path
+        machine (str): Machine name
+        threads (int): Number of threads this run may use
+    """
+    # Pooled connections inherited from the scheduler must not be shared between workers
+    lims.request_session.close()
+    nextcloud_util.webdav.session.close()
+    nextcloud_util.session.close()
+
+    process_run(lims, run_dir, machine, threads=threads)
+
+
+def schedule_runs(lims: Lims, pending_runs: List[Tuple[str, Path]], workers: int) -> None:
+    """
+    Process run directories in parallel worker processes.
+
+    At most `workers` runs are processed at the same time and at most
+    Config.MANAGE_RUNS_MACHINE_WORKERS runs per machine. The CPU budget
+    (Config.MANAGE_RUNS_THREADS) is divided over the workers and transfers of
+    all workers share Config.MANAGE_RUNS_IO_SLOTS slots.
+
+    Args:
+        lims (Lims): LIMS instance
+        pending_runs (List[Tuple[str, Path]]): List of (machine, run_dir) tuples
+        workers (int): Maximum number of runs processed in parallel
+    """
+    global io_slots
+    general_logger = logging.getLogger('Run_Manager_General')
+
+    context = multiprocessing.get_context('fork')
+    io_slots = context.BoundedSemaphore(max(1, Config.MANAGE_RUNS_IO_SLOTS))
+    machine_workers = max(1, Config.MANAGE_RUNS_MACHINE_WORKERS)
+    threads = max(1, Config.MANAGE_RUNS_THREADS // workers)
+
+    queue = list(pending_runs)
+    active = {}
+
+    while queue or active:
+        machine_load = Counter(machine for machine, _, _ in active.values())
+
+        for machine, run_dir in list(queue):
+            if len(active) >= workers:
+                break
+            if machine_load[machine] >= machine_workers:
+                continue
+
+            queue.remove((machine, run_dir))
+            if not acquire_run_lock(run_dir):
+                continue
+
+            worker = context.Process(target=_run_worker, args=(lims, run_dir, machine, threads), name=run_dir.name)
+            worker.start()
+            active[worker.sentinel] = (machine, run_dir, worker)
+            machine_load[machine] += 1
+
+        if not active:
+            continue
+
+        for sentinel in wait(list(active)):
+            machine, run_dir, worker = active.pop(sentinel)
+            worker.join()
+
+            # A worker that died without cleaning up would otherwise keep its run locked forever
+            running_file = run_dir / '.mgr_running'
+            if worker.exitcode != 0 and running_file.is_file():
+                general_logger.error(f'Worker for {run_dir.name} exited with code {worker.exitcode}')
+                running_file.unlink()
+                (run_dir / '.mgr_failed').touch()
+
+    io_slots = None
+
+
+def manage_runs(lims: Lims, workers: Optional[int] = None) -> None:
+    """Main function to manage sequencing runs.
+
+    Args:
+        lims (Lims): LIMS instance
+        workers (Optional[int]): Number of runs processed in parallel, defaults to Config.MANAGE_RUNS_WORKERS
+    """
+    machine_aliases = Config.MACHINE_ALIASES
+    if Config.DEVMODE:
+        machine_aliases = ['novaseqx_01']  # Only used for dev runs
+
+    workers = workers or Config.MANAGE_RUNS_WORKERS
+    pending_runs = find_pending_runs(machine_aliases)
+
+    if workers > 1:
+        schedule_runs(lims, pending_runs, workers)
+        return
+
+    for machine, run_dir in pending_runs:
+        if acquire_run_lock(run_dir):
+            process_run(lims, run_dir, machine)
 
 
 def zip_conversion_report(run_dir: Path, logger: logging.Logger) -> str:
@@ -1578,11 +2628,12 @@ def zip_conversion_report(run_dir: Path, logger: logging.Logger) -> str:
     return str(zip_file)
 
 
-def run(lims: Lims):
+def run(lims: Lims, workers: Optional[int] = None):
     """Main entry point for run management.
 
     Args:
         lims (Lims): LIMS connection object
+        workers (Optional[int]): Number of runs processed in parallel, defaults to Config.MANAGE_RUNS_WORKERS
     """
     # Set up Nextcloud connection
     global nextcloud_util
@@ -1598,7 +2649,7 @@ def run(lims: Lims):
         )
 
         # Run the main management function
-        manage_runs(lims)
+        manage_runs(lims, workers)
 
     except Exception as e:
         # Log to a general log file if specific run logging isn't available
@@ -1,16 +1,20 @@
 """Module for monitoring and reporting Nextcloud storage usage."""
 
+from concurrent.futures import ThreadPoolExecutor
 from typing import Dict, List, Any, TextIO
 
 from config import Config
 from modules.useq_nextcloud import NextcloudUtil
 from modules.useq_template import render_template
-from modules.useq_mail import send_mail
+from modules.useq_mail import send_mail, smtp_connection
 from sqlalchemy import create_engine
 from sqlalchemy.ext.automap import automap_base
 from sqlalchemy.orm import Session
 from datetime import datetime, timedelta
 from genologics.entities import Project
+from requests.exceptions import HTTPError
+DEBUG = 0
+
 # File size constants
 BYTES_PER_KB = 1024.0
 SIZE_SUFFIXES = ['B', 'KB', 'MB', 'GB', 'TB']
@@ -102,16 +106,52 @@ def _send_usage_report(nextcloud_util: NextcloudUtil, files: Dict[str, Dict[str,
     send_mail(subject, content, Config.MAIL_SENDER, Config.MAIL_ADMINS, attachments={'summary': Config.NEXTCLOUD_DOWNLOAD_SUMMARY})
     
 
+def _fetch_researchers(lims, project_ids: List[str]) -> Dict[str, Any]:
+    """Fetch the researcher of each project, with the projects fetched in parallel.
+
+    Args:
+        lims: LIMS instance for project information retrieval
+        project_ids (List[str]): Unique project IDs
+
+    Returns:
+        Dictionary of researchers by project ID, projects not found in LIMS are left out
+
+    Raises:
+        HTTPError: If the LIMS request of a project failed for another reason than a missing project
+    """
+    def fetch_researcher(project_id):
+        project = Project(lims, id=project_id)
+        researcher = project.researcher
+        researcher.get()
+        return researcher
+
+    researchers = {}
+    with ThreadPoolExecutor(max_workers=Config.LIMS_WORKERS) as executor:
+        futures = {project_id: executor.submit(fetch_researcher, project_id) for project_id in project_ids}
+
+        for project_id, future in futures.items():
+            try:
+                researchers[project_id] = future.result()
+            except HTTPError as e:
+                if e.response is None or e.response.status_code != 404:
+                    raise
+                print(f"Error: Project ID {project_id} not found in LIMS!")
+
+    return researchers
+
+
 def _send_reminder_email(lims, files: Dict[str, Dict[str, Any]]):
     """Send reminder email for files that have not been downloaded.
 
+    The projects of all files due for a reminder are resolved at once and
+    all reminders are sent over one SMTP connection.
+
     Args:
         lims: LIMS instance for project information retrieval
         files (Dict[str, Dict[str, Any]]): Dictionary of file information
     """
-    # undownloaded_files = {path: info for path, info in files.items() if not info.get('download_count')}
+    reminders = []
     for path, info in files.items():
-        download_count = info.get('download_count', 0)
         expiration = info.get('share_expiration', None)
         if not expiration:
             continue
@@ -121,14 +161,18 @@ def _send_reminder_email(lims, files: Dict[str, Dict[str, Any]]):
 
         if days_from_expiration == Config.NEXTCLOUD_REMINDER and not info.get('download_count'):
             candidate_runid = path.split("/")[-1].split("_")[0]
-            project = None
-            try:
-                project = Project(lims, id=candidate_runid)
-            except:
-                print(f"Error: Project ID {candidate_runid} not found in LIMS!")
-                continue
+            reminders.append((candidate_runid, info, expiration_date))
+
+    if not reminders:
+        return
 
-            researcher = project.researcher
+    researchers = _fetch_researchers(lims, list(dict.fromkeys(project_id for project_id, _, _ in reminders)))
+
+    with smtp_connection() as smtp_server:
+        for candidate_runid, info, expiration_date in reminders:
+            if candidate_runid not in researchers:
+                continue
+            researcher = researchers[candidate_runid]
 
             subject = f"REMINDER: USEQ sequencing of sequencing-run ID {candidate_runid} finished"
 
@@ -139,28 +183,51 @@ def _send_reminder_email(lims, files: Dict[str, Dict[str, Any]]):
                 'expiration': expiration_date.strftime("%Y-%m-%d")
             }
             content = render_template('share_reminder_template.html', data)
-            send_mail(subject, content, Config.MAIL_SENDER, [researcher.email, Config.MAIL_ADMINS[0]])
+            send_mail(subject, content, Config.MAIL_SENDER, [researcher.email, Config.MAIL_ADMINS[0]], smtp_server=smtp_server)
 
-def check_usage(lims, nextcloud_util: NextcloudUtil, historic_shares: Dict[Any, Any], mode: str):
+def check_usage(lims, nextcloud_util: NextcloudUtil, files: Dict[str, Dict[str, Any]], mode: str):
     """Check storage usage for a Nextcloud directory and send report.
 
-    Retrieves file list from Nextcloud, calculates total storage usage,
+    Writes the download summary of the listed files, calculates total storage usage,
     and sends an email report to administrators.
 
     Args:
         lims: LIMS instance for project information retrieval
         nextcloud_util (NextcloudUtil): Configured NextcloudUtil instance with directory set
-        historic_shares (Dict[Any, Any]): Dictionary of historic shares
+        files (Dict[str, Dict[str, Any]]): File list of the directory from NextcloudUtil.file_list
         mode (str): Mode of operation (e.g., 'weekly', 'daily')   
     """
 
-    files = nextcloud_util.file_list(historic_shares)
+    nextcloud_util.write_file_summary_csv(files)
     total_size = _calculate_total_size(files)
     if mode == 'weekly':
         _send_usage_report(nextcloud_util, files, total_size)
     elif mode == 'daily':
         _send_reminder_email(lims, files)
 
+    if DEBUG > 0:
+        print(f"Nextcloud requests for {nextcloud_util.run_dir}:\n{nextcloud_util.format_request_metrics()}")
+
+def list_directories(nextcloud_utils: List[NextcloudUtil], historic_shares: Dict[Any, Any]) -> List[Dict[str, Dict[str, Any]]]:
+    """List several Nextcloud directories concurrently.
+
+    The download logs are parsed and geolocated once, and the result is shared by all directories.
+
+    Args:
+        nextcloud_utils (List[NextcloudUtil]): Configured NextcloudUtil instance per directory
+        historic_shares (Dict[Any, Any]): Dictionary of historic shares
+
+    Returns:
+        File list per directory, in the order of nextcloud_utils
+    """
+    token_summary = nextcloud_utils[0].download_summary()
+
+    with ThreadPoolExecutor(max_workers=len(nextcloud_utils)) as executor:
+        return list(executor.map(
+            lambda nextcloud_util: nextcloud_util.file_list(historic_shares, token_summary),
+            nextcloud_utils
+        ))
+
 def _setup_nextcloud_util(directory: str) -> NextcloudUtil:
     """Create and configure a NextcloudUtil instance.
 
@@ -188,7 +255,8 @@ def run(lims, mode: str = 'weekly'):
     Entry point for Nextcloud usage monitoring.
 
     Checks storage usage for both raw data and manual directories,
-    sending separate reports for each.
+    sending separate reports for each. Both directories are listed
+    concurrently and share one parse of the download logs.
 
     Args:
         lims: LIMS instance for project information retrieval
@@ -205,10 +273,13 @@ def run(lims, mode: str = 'weekly'):
     for run in runs_with_share:
         historic_shares[run.run_id] = run.raw_share
 
-    # Check raw directory usage
-    nextcloud_util = _setup_nextcloud_util(Config.NEXTCLOUD_RAW_DIR)
-    check_usage(lims, nextcloud_util, historic_shares, mode)
+    # Check raw and manual directory usage
+    nextcloud_utils = [
+        _setup_nextcloud_util(Config.NEXTCLOUD_RAW_DIR),
+        _setup_nextcloud_util(Config.NEXTCLOUD_MANUAL_DIR),
+    ]
+    directory_files = list_directories(nextcloud_utils, historic_shares)
 
-    # Check manual directory usage
-    nextcloud_util = _setup_nextcloud_util(Config.NEXTCLOUD_MANUAL_DIR)
-    check_usage(lims, nextcloud_util, historic_shares, mode)
+    # Reports are sent one after the other, they share the download summary attachment
+    for nextcloud_util, files in zip(nextcloud_utils, directory_files):
+        check_usage(lims, nextcloud_util, files, mode)
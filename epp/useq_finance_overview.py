@@ -7,6 +7,7 @@ by fetching project costs from the portal API and combining with LIMS data.
 import json
 import re
 import sys
+from concurrent.futures import ThreadPoolExecutor
 from typing import Dict, List, Any, Set, Tuple, Optional, TextIO
 
 import requests
@@ -15,6 +16,8 @@ from genologics.entities import Step, ProtocolStep, Artifact, Sample
 from genologics.lims import Lims
 
 from config import Config
+from modules.useq_lims import get_batch, prefetch
+from modules.useq_lineage import LineageIndex, LineageRow, get_lineage_index
 from modules.useq_template import render_template
 
 from tqdm import tqdm
@@ -196,26 +199,26 @@ def normalize_application_platform(application: str, platform: str) -> Tuple[str
     return application, platform
 
 
-def process_isolation_artifact(sample_artifact: Artifact, sample_meta: Dict[str, Any], run_data: Dict[str, Any]):
+def process_isolation_artifact(row: LineageRow, sample_meta: Dict[str, Any], run_data: Dict[str, Any]):
     """Process isolation artifact and update metadata.
 
     Args:
-        sample_artifact (Artifact): LIMS Artifact from isolation process
+        row (LineageRow): Lineage row of the artifact from isolation process
         sample_meta (Dict[str, Any]): Sample metadata dictionary
         run_data (Dict[str, Any]): Run data dictionary
     """
-    if sample_artifact.type == 'ResultFile':
+    if row.artifact_type == 'ResultFile':
         return
 
-    isolation_type = f"{sample_artifact.udf['US Isolation Type'].split()[0].lower()} isolation"
+    isolation_type = f"{row.udfs['US Isolation Type'].split()[0].lower()} isolation"
 
     if not sample_meta['Isolated']:
         run_data['nr_samples_isolated'] += 1
-        sample_meta['Isolated_date'] = sample_artifact.parent_process.date_run
+        sample_meta['Isolated_date'] = row.date_run
         sample_meta['Isolated'] = True
 
-    run_data['lims_isolation'].add(sample_artifact.udf['US Isolation Type'])
-    run_data['isolation_date'].add(sample_artifact.parent_process.date_run)
+    run_data['lims_isolation'].add(row.udfs['US Isolation Type'])
+    run_data['isolation_date'].add(row.date_run)
 
     # Validate isolation type matches sample type
     sample_type = sample_meta['Sample Type']
@@ -229,17 +232,17 @@ def process_isolation_artifact(sample_artifact: Artifact, sample_meta: Dict[str,
         )
 
 
-def process_libprep_artifact(lims: Lims, sample: Sample, sample_artifact: Artifact, sample_meta: Dict[str, Any], run_data: Dict[str, Any]):
+def process_libprep_artifact(lims: Lims, sample: Sample, row: LineageRow, sample_meta: Dict[str, Any], run_data: Dict[str, Any]):
     """Process library prep artifact and update metadata.
 
     Args:
         lims (Lims): LIMS instance.
         sample (Sample): LIMS Sample
-        sample_artifact (Artifact): LIMS Artifact from library prep process
+        row (LineageRow): Lineage row of the artifact from library prep process
         sample_meta (Dict[str, Any]): Sample metadata dictionary
         run_data (Dict[str, Any]): Run data dictionary
     """
-    if sample_artifact.type == 'ResultFile':
+    if row.artifact_type == 'ResultFile':
         return
 
     runtype = sample.udf['Sequencing Runtype']
@@ -252,32 +255,32 @@ def process_libprep_artifact(lims: Lims, sample: Sample, sample_artifact: Artifa
     elif 'gem-x' in runtype.lower():
         lims_library_prep = runtype.lower()
     else:
-        protocol_name = get_step_protocol(lims, step_id=sample_artifact.parent_process.id)
+        protocol_name = get_step_protocol(lims, step_id=row.process_id)
         lims_library_prep = protocol_name.split("-", 1)[1].lower().strip()
         lims_library_prep = lims_library_prep.replace('illumina ', '')
 
     if not sample_meta['Prepped']:
         run_data['nr_samples_prepped'] += 1
-        sample_meta['Prepped_date'] = sample_artifact.parent_process.date_run
+        sample_meta['Prepped_date'] = row.date_run
         sample_meta['Prepped'] = True
 
     run_data['lims_library_prep'].add(lims_library_prep)
-    run_data['libprep_date'].add(sample_artifact.parent_process.date_run)
+    run_data['libprep_date'].add(row.date_run)
 
 
-def process_run_artifact(lims: Lims, sample_artifact: Artifact, sample_meta: Dict[str, Any], run_data: Dict[str, Any], run_meta: Dict[str, Any], run_date: str, pid_sequenced: Dict[str, Set]):
+def process_run_artifact(lims: Lims, row: LineageRow, sample_meta: Dict[str, Any], run_data: Dict[str, Any], run_meta: Dict[str, Any], run_date: str, pid_sequenced: Dict[str, Set]):
     """Process run artifact and update metadata.
 
     Args:
         lims (Lims): LIMS instance.
-        sample_artifact (Artifact): LIMS Artifact from run process
+        row (LineageRow): Lineage row of the artifact from run process
         sample_meta (Dict[str, Any]) : Sample metadata dictionary
         run_data (Dict[str, Any]): Run data dictionary
         run_meta (Dict[str, Any]): Run metadata for API
         run_date (str): Run date
         pid_sequenced (Dict[str, Set]): Dictionary tracking when projects were sequenced
     """
-    protocol_name = get_step_protocol(lims, step_id=sample_artifact.parent_process.id)
+    protocol_name = get_step_protocol(lims, step_id=row.process_id)
     # print('test', protocol_name)
     run_data['lims_runtype'] = protocol_name.split("-", 1)[1].lower().strip()
 
@@ -288,26 +291,26 @@ def process_run_artifact(lims: Lims, sample_artifact: Artifact, sample_meta: Dic
 
     project_id = run_data['id']
     if project_id:
-        pid_sequenced[project_id].add(sample_artifact.parent_process.date_run)
+        pid_sequenced[project_id].add(row.date_run)
 
     if not sample_meta['Sequenced']:
         run_data['nr_samples_sequenced'] += 1
         sample_meta['Sequenced'] = True
 
 @retry(requests.exceptions.ConnectionError, tries=2, delay=2)
-def process_analysis_artifact(sample_artifact: Artifact, sample: Sample, sample_meta: Dict[str, Any], run_data: Dict[str, Any]):
+def process_analysis_artifact(row: LineageRow, sample: Sample, sample_meta: Dict[str, Any], run_data: Dict[str, Any]):
     """Process analysis artifact and update metadata.
 
     Args:
-        sample_artifact (Artifact): LIMS Artifact from analysis process
+        row (LineageRow): Lineage row of the artifact from analysis process
         sample (Sample): LIMS Sample object
         sample_meta (Dict[str, Any]): Sample metadata dictionary
         run_data (Dict[str, Any]): Run data dictionary
     """
-    run_data['analysis_date'].add(sample_artifact.parent_process.date_run)
+    run_data['analysis_date'].add(row.date_run)
 
     analysis_steps = ['Raw data (FastQ)']
-    process_udf = sample_artifact.parent_process.udf
+    process_udf = row.process_udfs
 
     # Add selected analysis steps
     analysis_options = [
@@ -342,7 +345,7 @@ def process_analysis_artifact(sample_artifact: Artifact, sample: Sample, sample_
 
     if not sample_meta['Analyzed']:
         run_data['nr_samples_analyzed'] += 1
-        sample_meta['Analyzed_date'] = sample_artifact.parent_process.date_run
+        sample_meta['Analyzed_date'] = row.date_run
         sample_meta['Analyzed'] = True
 
 @retry(requests.exceptions.ConnectionError, tries=2, delay=2)
@@ -430,6 +433,45 @@ def fetch_project_costs(project_id: str, run_meta: Dict[str, Any]) -> Dict[str,
         return {'error': f'Failed to retrieve costs - {str(e)}'}
 
 
+def cost_request_key(project_id: str, run_meta: Dict[str, Any]) -> str:
+    """Normalized key of a cost request, identical requests have the same key.
+
+    Args:
+        project_id (str): Project ID
+        run_meta (Dict[str, Any]): Run metadata for cost calculation
+
+    Returns:
+        Project ID and run metadata serialized with sorted keys
+    """
+    return f"{project_id}:{json.dumps(run_meta, sort_keys=True, default=str)}"
+
+
+def fetch_all_project_costs(cost_requests: List[Tuple[str, Dict[str, Any]]]) -> List[Dict[str, Any]]:
+    """Fetch the costs of many projects from the portal API concurrently.
+
+    Identical requests are sent once and share the response.
+
+    Args:
+        cost_requests (List[Tuple[str, Dict[str, Any]]]): Project ID and run metadata per request
+
+    Returns:
+        Cost data from API or error information, in the order of the requests
+    """
+    keys = [cost_request_key(project_id, run_meta) for project_id, run_meta in cost_requests]
+    unique_requests = dict(zip(keys, cost_requests))
+
+    if not unique_requests:
+        return []
+
+    with ThreadPoolExecutor(max_workers=Config.PORTAL_COST_WORKERS) as executor:
+        responses = dict(zip(
+            unique_requests,
+            executor.map(lambda cost_request: fetch_project_costs(*cost_request), unique_requests.values())
+        ))
+
+    return [responses[key] for key in keys]
+
+
 def update_run_costs(run_data: Dict[str, Any], costs: Dict[str, Any], application: str):
     """Update run data with cost information from API response.
 
@@ -497,6 +539,49 @@ def deduplicate_runs(runs: Dict[str, Dict[str, Dict[str, Any]]]) -> Dict[str, Di
 
     return runs_dedup
 
+def prefetch_seq_finance(lims: Lims, pools: List[Artifact]) -> Tuple[Dict[str, List[Sample]], Dict[str, LineageIndex]]:
+    """Load all LIMS entities the finance overview of the pools needs, in bulk.
+
+    Artifacts and samples are loaded through the batch endpoints in parallel chunks, entities
+    without a batch endpoint (projects, researchers, labs, steps) with parallel GETs. The artifacts
+    of the projects are read from their lineage index. The cost calculation then runs over
+    entities that are already loaded.
+
+    Args:
+        lims (Lims): LIMS instance.
+        pools (List[Artifact]): Pool artifacts of the billing step
+
+    Returns:
+        Tuple of (samples by project ID, lineage index by project ID)
+    """
+    get_batch(lims, pools)
+    pool_samples = get_batch(lims, [sample for pool in pools for sample in pool.samples])
+
+    projects = prefetch(sample.project for sample in pool_samples)
+    researchers = prefetch(project.researcher for project in projects)
+    prefetch(researcher.lab for researcher in researchers)
+
+    with ThreadPoolExecutor(max_workers=Config.LIMS_WORKERS) as executor:
+        project_samples = dict(zip(
+            [project.id for project in projects],
+            executor.map(lambda project: lims.get_samples(projectlimsid=project.id), projects)
+        ))
+    get_batch(lims, [sample for samples in project_samples.values() for sample in samples])
+
+    # Flowcell only samples are billed without looking at their artifacts
+    lineage = {
+        project_id: get_lineage_index(lims, project_id, skip_flowcell_only=True) for project_id in project_samples
+    }
+
+    # Library prep and run processes are billed by the protocol of their step
+    prefetch(
+        Step(lims, id=row.process_id) for index in lineage.values()
+        for row in index.process_rows(Config.LIBPREP_PROCESSES + Config.RUN_PROCESSES) if row.date_run
+    )
+
+    return project_samples, lineage
+
+
 @retry(requests.exceptions.ConnectionError, tries=2, delay=2)
 def get_seq_finance(lims: Lims, step_uri: str) -> str:
     """Calculate costs for all sequencing runs included in the step.
@@ -515,12 +600,13 @@ def get_seq_finance(lims: Lims, step_uri: str) -> str:
     runs = {}
     pool_samples = {}
     pid_sequenced = {}
+    cost_requests = []
+
+    # Skip the billing table file
+    io_maps = [io_map for io_map in step_details.input_output_maps if io_map[1]['output-generation-type'] != 'PerAllInputs']
+    project_samples, lineage = prefetch_seq_finance(lims, [io_map[0]['uri'] for io_map in io_maps])
 
-    io_maps = step_details.input_output_maps
     for io_map in tqdm(io_maps, desc="Processing Runs", unit="run"):
-    # for io_map in step_details.input_output_maps:
-        if io_map[1]['output-generation-type'] == 'PerAllInputs':
-            continue  # Skip the billing table file
 
         pool = io_map[0]['uri']
         pool_samples[pool.id] = {}
@@ -566,7 +652,7 @@ def get_seq_finance(lims: Lims, step_uri: str) -> str:
             if project_id not in runs[pool.id]:
                 runs[pool.id][project_id] = initialize_project_run_data(pool.id)
 
-            samples = lims.get_samples(projectlimsid=project_id)
+            samples = project_samples[project_id]
             if len(pool_samples[pool.id][project_id]) != len(samples):
                 # print(project_id, len(samples),len(pool_samples[pool.id][project_id]))
                 runs[pool.id][project_id]['errors'].add(
@@ -642,18 +728,16 @@ def get_seq_finance(lims: Lims, step_uri: str) -> str:
 
 
                     # Process sample artifacts
-                    sample_artifacts = lims.get_artifacts(samplelimsid=sample.id)
-                    for sample_artifact in sample_artifacts:
-                        if not sample_artifact.parent_process or \
-                           not sample_artifact.parent_process.date_run:
+                    for row in lineage[project_id].sample_rows(sample.id):
+                        if not row.date_run:
                             continue
 
-                        process_name = sample_artifact.parent_process.type.name
+                        process_name = row.process_type
                         # print('test', process_name)
                         # Handle different process types
                         if process_name in Config.ISOLATION_PROCESSES:
                             process_isolation_artifact(
-                                sample_artifact, sample_meta, runs[pool.id][project_id]
+                                row, sample_meta, runs[pool.id][project_id]
                             )
 
                         elif process_name in Config.LIBPREP_PROCESSES and \
@@ -661,7 +745,7 @@ def get_seq_finance(lims: Lims, step_uri: str) -> str:
                                 'WGS at HMF', 'WGS', 'WES (100X Coverage)', 'RNA-seq'
                              ]:
                             process_libprep_artifact(
-                                lims, sample, sample_artifact, sample_meta,
+                                lims, sample, row, sample_meta,
                                 runs[pool.id][project_id]
                             )
 
@@ -669,14 +753,14 @@ def get_seq_finance(lims: Lims, step_uri: str) -> str:
                         #      process_name in Config.LOAD_PROCESSES:
                         elif process_name in Config.RUN_PROCESSES:
                             process_run_artifact(
-                                lims, sample_artifact, sample_meta,
+                                lims, row, sample_meta,
                                 runs[pool.id][project_id], run_meta,
                                 run_date, pid_sequenced
                             )
                             # print('Run artifact found', project_id, process_name)
                         elif process_name in Config.ANALYSIS_PROCESSES and application != 'SNP Fingerprinting':
                             process_analysis_artifact(
-                                sample_artifact, sample, sample_meta,
+                                row, sample, sample_meta,
                                 runs[pool.id][project_id]
                             )
 
@@ -712,11 +796,16 @@ def get_seq_finance(lims: Lims, step_uri: str) -> str:
                 ###Check if sample_meta['Sequenced'] = True needs to be set####
 
 
-            # Fetch and update costs
-            costs = fetch_project_costs(project_id, run_meta)
-            update_run_costs(runs[pool.id][project_id], costs, application)
+            # Costs of all projects are fetched at once after the loop
+            cost_requests.append((runs[pool.id][project_id], project_id, run_meta, application))
 
             runs[pool.id][project_id]['run_comments'] = run_comments
+
+    # Fetch and update costs
+    costs = fetch_all_project_costs([(project_id, run_meta) for _, project_id, run_meta, _ in cost_requests])
+    for (run_data, _, _, application), project_costs in zip(cost_requests, costs):
+        update_run_costs(run_data, project_costs, application)
+
     # Deduplicate and convert sets to strings
     runs_dedup = deduplicate_runs(runs)
     return render_template('seq_finance_overview_template.csv', {'pools': runs_dedup})
@@ -790,6 +879,7 @@ def get_snp_finance(lims: Lims, step_uri: str) -> str:
                     runs[run_key]['description'].add(sample.udf['Description'])
 
     # Calculate costs for each run
+    run_metas = {}
     for run_id in runs:
         run_meta = {
             'Application': 'SNP Fingerprinting',
@@ -813,9 +903,11 @@ def get_snp_finance(lims: Lims, step_uri: str) -> str:
                 'Analyzed': False,
             })
 
-        # Fetch and update costs
-        costs = fetch_project_costs(runs[run_id]["id"], run_meta)
+        run_metas[run_id] = run_meta
 
+    # Fetch and update costs
+    all_costs = fetch_all_project_costs([(runs[run_id]["id"], run_meta) for run_id, run_meta in run_metas.items()])
+    for run_id, costs in zip(run_metas, all_costs):
         if 'error' in costs:
             runs[run_id]['errors'].add(costs['error'])
         else:
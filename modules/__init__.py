@@ -1,5 +1,9 @@
 import modules.useq_mail
 import modules.useq_template
 import modules.useq_illumina_parsers
+import modules.useq_index_orientation
+import modules.useq_access_log
 import modules.useq_nextcloud
+import modules.useq_lims
+import modules.useq_lineage
 import modules.useq_ui
@@ -0,0 +1,299 @@
+"""Module for parsing Nextcloud access logs into share download events."""
+
+import argparse
+import random
+import re
+import sys
+import time
+import zlib
+from typing import Dict, Iterable, Iterator, List, Optional, Sequence, Tuple
+from urllib.parse import parse_qs, unquote
+
+# Combined log format:
+# IP - - [05/Jan/2026:09:51:46 +0100] "GET /index.php/s/TOKEN HTTP/2.0" 303 0 "-" "UA string"
+# For WebDAV requests, the share token shows up in the auth-user (3rd) field instead of "-":
+# IP - TOKEN [20/Jul/2026:11:05:45 +0200] "GET /public.php/webdav/file.csv HTTP/2.0" 200 326 "-" "curl/7.61.1"
+LOG_RE = re.compile(
+    r'(?P<ip>\S+)\s+\S+\s+(?P<user>\S+)\s+'
+    r'\[(?P<time>[^\]]+)\]\s+'
+    r'"(?P<method>\S+)\s+(?P<path>\S+)\s+(?P<proto>[^"]+)"\s+'
+    r'(?P<status>\d{3})\s+(?P<size>\S+)\s+'
+    r'"(?P<referrer>[^"]*)"\s+"(?P<agent>[^"]*)"'
+)
+
+# Some logs are the result of grepping across multiple rotated/gzipped log files,
+# which glues a "filename:" prefix onto the front of each line, e.g.:
+#   ssl-nextcloud_server_main.access.log-20260721.gz:10.132.252.91 - - [...] ...
+# Strip that prefix (only) when what follows looks like a real IPv4 address.
+LOG_PREFIX_RE = re.compile(r'^\S*?:(?=\d{1,3}\.\d{1,3}\.\d{1,3}\.\d{1,3}\s)')
+
+# WebDAV public-share access: /public.php/webdav/<optional file path>
+WEBDAV_RE = re.compile(r'^/public\.php/webdav(?P<rest>/.*)?$')
+
+# Matches both /index.php/s/TOKEN and /s/TOKEN, optionally with a subpath
+SHARE_RE = re.compile(r'^/(?:index\.php/)?s/(?P<token>[^/?]+)(?P<rest>/.*)?$')
+
+# Reserved Nextcloud paths that look like a share token but aren't one
+RESERVED_TOKENS = frozenset({'login'})
+
+# Every share-related request contains one of these, other lines are rejected before parsing
+SHARE_MARKERS = ('/s/', '/public.php/webdav')
+
+DEFAULT_BATCH_SIZE = 10000
+
+# Window bits accepting both gzip and zlib headers
+GZIP_WBITS = 32 + zlib.MAX_WBITS
+
+
+def _split_path(path: str) -> Tuple[str, str]:
+    """
+    Split a request path into path and query string, the same way urlparse does for a relative URL.
+
+    Args:
+        path (str): Request path, optionally with parameters, query string and fragment.
+
+    Returns:
+        Tuple of (path, query string).
+    """
+    path = path.partition('#')[0]
+    path, _, query = path.partition('?')
+
+    # Parameters after a ';' in the last path segment are not part of the path
+    if ';' in path:
+        semicolon = path.find(';', path.rfind('/'))
+        if semicolon >= 0:
+            path = path[:semicolon]
+
+    return path, query
+
+
+def classify_log_line(path: str, status: str, user: Optional[str] = None) -> Tuple[Optional[str], Optional[str], Optional[str]]:
+    """
+    Classify a request on a share.
+
+    Args:
+        path (str): Request path.
+        status (str): HTTP status code.
+        user (Optional[str]): Auth-user field of the log line, the share token for WebDAV requests.
+
+    Returns:
+        Tuple of (token, action, filename), all None for requests that are not share-related. The action is one of
+        'download', 'download_attempt', 'view', 'password_prompt', 'not_found' or 'other'.
+    """
+    path, query = _split_path(path)
+
+    # --- WebDAV public-share access: token comes from the auth-user field ---
+    wd = WEBDAV_RE.match(path)
+    if wd:
+        if not user or user == '-':
+            return None, None, None  # no token available, can't attribute this request
+        rest = (wd.group('rest') or '').lstrip('/')
+        files = parse_qs(query).get('files') if 'files=' in query else None
+        filename = unquote(files[0]) if files else (unquote(rest) if rest else None)
+        action = 'download' if status in ('200', '206', '304') else 'download_attempt'
+        return user, action, filename
+
+    # --- Standard /s/TOKEN or /index.php/s/TOKEN access ---
+    m = SHARE_RE.match(path)
+    if not m:
+        return None, None, None
+
+    token = m.group('token')
+    if token in RESERVED_TOKENS:
+        return None, None, None  # e.g. /index.php/s/login -- not a real share
+
+    rest = m.group('rest') or ''
+
+    filename = None
+    files = parse_qs(query).get('files') if 'files=' in query else None
+    if files:
+        filename = unquote(files[0])
+    elif rest.startswith('/download/'):
+        filename = unquote(rest[len('/download/'):])
+
+    is_download_path = rest.startswith('/download')
+    is_auth_path = rest.startswith('/authenticate')
+
+    if status == '404':
+        action = 'not_found'
+    elif is_download_path and status in ('200', '304', '206'):
+        action = 'download'
+    elif is_download_path:
+        action = 'download_attempt'  # hit /download but got a non-200 status
+    elif is_auth_path:
+        action = 'password_prompt'  # password-protected share: password page/submission, not a download
+    elif rest == '' and status in ('200', '303'):
+        action = 'view'  # share landing page, either redirected (303) or rendered directly (200)
+    else:
+        action = 'other'
+
+    return token, action, filename
+
+
+def parse_log_lines(lines: Iterable[str], source: str, offsets: Optional[Sequence[int]] = None) -> List[Dict[str, str]]:
+    """
+    Parse a batch of access log lines into share download events.
+
+    Lines without a share marker are rejected before the full parse.
+
+    Args:
+        lines (Iterable[str]): Log lines in combined log format.
+        source (str): Name of the log file the lines come from.
+        offsets (Optional[Sequence[int]]): Byte offset of every line in the log, stored as 'offset' of its event.
+
+    Returns:
+        List of events for the share-related requests.
+    """
+    log_match = LOG_RE.match
+    strip_prefix = LOG_PREFIX_RE.sub
+    first_marker, second_marker = SHARE_MARKERS
+
+    events = []
+
+    for lineno, line in enumerate(lines, 1):
+        if first_marker not in line and second_marker not in line:
+            continue  # fast path: not a share-related request
+
+        line = line.strip()
+        line = strip_prefix('', line)  # strip any "somefile.gz:" prefix from grepped logs
+        m = log_match(line)
+        if not m:
+            print(f"WARNING: could not parse line {lineno} of {source}: {line[:120]}", file=sys.stderr)
+            continue
+        d = m.groupdict()
+        token, action, filename = classify_log_line(d['path'], d['status'], user=d['user'])
+        if token is None:
+            continue  # not a share-related request
+        events.append({
+            'token': token,
+            'action': action,
+            'filename': filename,
+            'ip': d['ip'],
+            'time': d['time'],
+            'status': d['status'],
+            'size': d['size'],
+            'agent': d['agent'],
+            'raw_path': d['path'],
+            'source': source,
+            'offset': offsets[lineno - 1] if offsets is not None else None,
+        })
+
+    return events
+
+
+def iter_log_events(lines: Iterable[str], source: str, batch_size: int = DEFAULT_BATCH_SIZE) -> Iterator[List[Dict[str, str]]]:
+    """
+    Parse access log lines in batches.
+
+    Args:
+        lines (Iterable[str]): Log lines in combined log format.
+        source (str): Name of the log file the lines come from.
+        batch_size (int): Number of lines per batch.
+
+    Yields:
+        List of events for every batch of lines.
+    """
+    batch = []
+    for line in lines:
+        batch.append(line)
+        if len(batch) == batch_size:
+            yield parse_log_lines(batch, source)
+            batch = []
+
+    if batch:
+        yield parse_log_lines(batch, source)
+
+
+def decompress_chunks(chunks: Iterable[bytes], max_length: int = 4 * 1024 * 1024) -> Iterator[bytes]:
+    """
+    Incrementally decompress a gzip stream as its chunks arrive.
+
+    Concatenated gzip members, as written by appending to a .gz file, are decompressed one after the other.
+
+    Args:
+        chunks (Iterable[bytes]): Chunks of the compressed stream.
+        max_length (int): Maximum number of decompressed bytes per yielded chunk.
+
+    Yields:
+        Chunks of decompressed bytes.
+    """
+    decompressor = zlib.decompressobj(wbits=GZIP_WBITS)
+    for data in chunks:
+        while data:
+            decompressed = decompressor.decompress(data, max_length)
+            if decompressed:
+                yield decompressed
+
+            if decompressor.eof:
+                # Start of the next member, gzip allows zero padding between members
+                data = decompressor.unused_data.lstrip(b"\0")
+                decompressor = zlib.decompressobj(wbits=GZIP_WBITS)
+            else:
+                data = decompressor.unconsumed_tail
+
+
+def synthetic_log_lines(nr_lines: int, share_fraction: float = 0.05, seed: int = 1) -> List[str]:
+    """
+    Generate combined log lines resembling a Nextcloud access log.
+
+    Args:
+        nr_lines (int): Number of lines.
+        share_fraction (float): Fraction of the lines that are share requests.
+        seed (int): Random seed.
+
+    Returns:
+        List of log lines.
+    """
+    rnd = random.Random(seed)
+    other_paths = ['/remote.php/dav/files/usfuser/raw_data/', '/index.php/apps/files/', '/ocs/v2.php/apps/notifications/api/v2/notifications',
+                   '/status.php', '/index.php/login', '/apps/theming/manifest/dashboard']
+    share_paths = ['/index.php/s/{token}', '/s/{token}/download', '/index.php/s/{token}/download?files=sample.tar',
+                   '/s/{token}/authenticate/showShare', '/public.php/webdav/sample.tar']
+
+    lines = []
+    for _ in range(nr_lines):
+        ip = f'{rnd.randint(1, 223)}.{rnd.randint(0, 255)}.{rnd.randint(0, 255)}.{rnd.randint(1, 254)}'
+        token = f'tok{rnd.randint(1, 500)}'
+        if rnd.random() < share_fraction:
+            path = rnd.choice(share_paths).format(token=token)
+            user = token if path.startswith('/public.php') else '-'
+        else:
+            path = rnd.choice(other_paths)
+            user = '-'
+        status = rnd.choice(('200', '200', '206', '303', '404'))
+        lines.append(f'{ip} - {user} [05/Jan/2026:09:51:46 +0100] "GET {path} HTTP/2.0" {status} {rnd.randint(0, 10 ** 9)} '
+                     f'"-" "Mozilla/5.0 (X11; Linux x86_64)"')
+
+    return lines
+
+
+def benchmark(nr_lines: int, batch_size: int = DEFAULT_BATCH_SIZE, share_fraction: float = 0.05) -> float:
+    """
+    Measure the parse throughput on a synthetic log.
+
+    Args:
+        nr_lines (int): Number of synthetic log lines.
+        batch_size (int): Number of lines per batch.
+        share_fraction (float): Fraction of the lines that are share requests.
+
+    Returns:
+        Lines parsed per second.
+    """
+    lines = synthetic_log_lines(nr_lines, share_fraction)
+
+    start = time.perf_counter()
+    nr_events = sum(len(events) for events in iter_log_events(lines, 'benchmark', batch_size))
+    elapsed = time.perf_counter() - start
+
+    print(f'Parsed {nr_lines} lines ({nr_events} share events) in {elapsed:.2f}s: {nr_lines / elapsed:,.0f} lines/s')
+    return nr_lines / elapsed
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Benchmark the Nextcloud access log parser on a synthetic log.')
+    parser.add_argument('--lines', type=int, default=2000000, help='Number of synthetic log lines')
+    parser.add_argument('--batch-size', type=int, default=DEFAULT_BATCH_SIZE, help='Number of lines per batch')
+    parser.add_argument('--share-fraction', type=float, default=0.05, help='Fraction of the lines that are share requests')
+    args = parser.parse_args()
+
+    benchmark(args.lines, args.batch_size, args.share_fraction)
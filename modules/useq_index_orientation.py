@@ -0,0 +1,398 @@
+"""Module for detecting the index orientation of an Illumina run directly from the index basecalls."""
+
+import gzip
+import logging
+import struct
+import xml.etree.ElementTree as ET
+import zlib
+from pathlib import Path
+from typing import Any, BinaryIO, Dict, List, Optional, Tuple, Union
+
+import numpy as np
+
+# Sampling limits
+DEFAULT_MAX_TILES = 2
+DEFAULT_MAX_CLUSTERS = 200000  # per tile
+
+# Confidence thresholds
+MIN_MATCHED_CLUSTERS = 500
+MIN_SCORE_RATIO = 5.0
+
+# Base codes used for the basecalls, 4 is a no-call
+BASE_CODES = {'A': 0, 'C': 1, 'G': 2, 'T': 3}
+NO_CALL = 4
+NR_CODES = 5
+MAX_CODE_LENGTH = 27  # longest index pair fitting in an int64 code
+
+
+class IndexOrientationError(Exception):
+    """Exception for runs of which the index reads can not be sampled."""
+    pass
+
+
+def parse_run_layout(run_info_xml: Union[str, Path]) -> Dict[str, Any]:
+    """
+    Parse the index reads and tiles from a RunInfo.xml file.
+
+    Args:
+        run_info_xml (Union[str, Path]): Path to RunInfo.xml
+
+    Returns:
+        Dictionary with the index reads as (first cycle, number of cycles) in read order
+        and the tiles listed per lane.
+    """
+    root = ET.parse(run_info_xml).getroot()
+
+    layout = {'index_reads': [], 'tiles': {}}
+
+    cycle = 1
+    reads = sorted(root.iter('Read'), key=lambda read: int(read.get('Number')))
+    for read in reads:
+        num_cycles = int(read.get('NumCycles'))
+        if read.get('IsIndexedRead') == 'Y':
+            layout['index_reads'].append((cycle, num_cycles))
+        cycle += num_cycles
+
+    for tile in root.iter('Tile'):
+        lane, _, tile_name = tile.text.strip().partition('_')
+        if tile_name:
+            layout['tiles'].setdefault(int(lane), []).append(int(tile_name))
+
+    return layout
+
+
+def _unpack_cbcl_block(block: bytes, num_clusters: int, max_clusters: int) -> np.ndarray:
+    """
+    Decompress a CBCL tile block into base codes.
+
+    Every byte holds two clusters (low nibble first), with 2 bits for the base and 2 bits for the quality bin.
+
+    Args:
+        block (bytes): Gzip compressed tile block
+        num_clusters (int): Number of clusters in the tile
+        max_clusters (int): Maximum number of clusters to return
+
+    Returns:
+        Array of base codes
+    """
+    # Only the bytes holding the sampled clusters need decompressing
+    nr_clusters = min(num_clusters, max_clusters)
+    packed = zlib.decompressobj(wbits=zlib.MAX_WBITS | 16).decompress(block, (nr_clusters + 1) // 2)
+    packed = np.frombuffer(packed, dtype=np.uint8)
+
+    nibbles = np.empty(packed.size * 2, dtype=np.uint8)
+    nibbles[0::2] = packed & 0x0F
+    nibbles[1::2] = packed >> 4
+    nibbles = nibbles[:nr_clusters]
+
+    bases = nibbles & 0x03
+    bases[(nibbles >> 2) == 0] = NO_CALL
+
+    return bases
+
+
+def _read_cbcl_header(cbcl: BinaryIO) -> Tuple[int, List[Tuple[int, int, int]]]:
+    """
+    Read the header of an opened CBCL file.
+
+    Args:
+        cbcl (BinaryIO): CBCL file opened in binary mode, positioned at the start
+
+    Returns:
+        Tuple of (header size, list of (tile, number of clusters, compressed block size) in storage order)
+    """
+    _, header_size = struct.unpack('<HI', cbcl.read(6))
+    header = cbcl.read(header_size - 6)
+
+    bits_per_basecall, bits_per_qscore = header[0], header[1]
+    if bits_per_basecall != 2 or bits_per_qscore != 2:
+        raise IndexOrientationError(f'Unsupported CBCL encoding ({bits_per_basecall}/{bits_per_qscore} bits)')
+
+    nr_bins = struct.unpack_from('<I', header, 2)[0]
+    offset = 6 + nr_bins * 8
+    nr_tiles = struct.unpack_from('<I', header, offset)[0]
+    offset += 4
+
+    tiles = []
+    for tile_nr in range(nr_tiles):
+        tile, num_clusters, _, compressed_size = struct.unpack_from('<IIII', header, offset + tile_nr * 16)
+        tiles.append((tile, num_clusters, compressed_size))
+
+    return header_size, tiles
+
+
+def _list_cbcl_tiles(cbcl_file: Path) -> List[int]:
+    """
+    List the tiles stored in a CBCL file.
+
+    Args:
+        cbcl_file (Path): Path to the CBCL file
+
+    Returns:
+        Tiles in the order they are stored
+    """
+    with open(cbcl_file, 'rb') as cbcl:
+        _, tiles = _read_cbcl_header(cbcl)
+
+    return [tile for tile, _, _ in tiles]
+
+
+def _read_cbcl_tiles(cbcl_file: Path, tiles: List[int], max_clusters: int) -> Dict[int, np.ndarray]:
+    """
+    Read the base codes of the given tiles from a CBCL file.
+
+    Only the blocks of the requested tiles are read from disk.
+
+    Args:
+        cbcl_file (Path): Path to the CBCL file
+        tiles (List[int]): Tiles to read, tiles not in the file are ignored
+        max_clusters (int): Maximum number of clusters to read per tile
+
+    Returns:
+        Dictionary of base codes per tile
+    """
+    bases = {}
+
+    with open(cbcl_file, 'rb') as cbcl:
+        block_offset, stored_tiles = _read_cbcl_header(cbcl)
+
+        for tile, num_clusters, compressed_size in stored_tiles:
+            if tile in tiles:
+                cbcl.seek(block_offset)
+                bases[tile] = _unpack_cbcl_block(cbcl.read(compressed_size), num_clusters, max_clusters)
+            block_offset += compressed_size
+
+    return bases
+
+
+def _read_bcl_tile(bcl_file: Path, max_clusters: int) -> np.ndarray:
+    """
+    Read the base codes from a (gzipped) per tile BCL file.
+
+    Every byte holds one cluster, with 2 bits for the base and 6 bits for the quality. A zero byte is a no-call.
+
+    Args:
+        bcl_file (Path): Path to the BCL file
+        max_clusters (int): Maximum number of clusters to read
+
+    Returns:
+        Array of base codes
+    """
+    opener = gzip.open if bcl_file.suffix == '.gz' else open
+
+    with opener(bcl_file, 'rb') as bcl:
+        num_clusters = struct.unpack('<I', bcl.read(4))[0]
+        packed = np.frombuffer(bcl.read(min(num_clusters, max_clusters)), dtype=np.uint8)
+
+    bases = packed & 0x03
+    bases[packed == 0] = NO_CALL
+
+    return bases
+
+
+class BasecallSampler:
+    """Sample the basecalls of a few tiles of a lane, cycle by cycle."""
+
+    def __init__(self, run_dir: Path, lane: int, listed_tiles: List[int], max_tiles: int, max_clusters: int):
+        """
+        Args:
+            run_dir (Path): Run directory path
+            lane (int): Lane to sample
+            listed_tiles (List[int]): Tiles of the lane listed in RunInfo.xml, used in this order
+            max_tiles (int): Maximum number of tiles to sample
+            max_clusters (int): Maximum number of clusters to sample per tile
+        """
+        self.lane_dir = run_dir / 'Data' / 'Intensities' / 'BaseCalls' / f'L{lane:03d}'
+        self.lane = lane
+        self.listed_tiles = listed_tiles
+        self.max_tiles = max_tiles
+        self.max_clusters = max_clusters
+        self.tiles = None
+
+    def _select_tiles(self, available_tiles: List[int]) -> List[int]:
+        """Select the tiles to sample, preferring the order of RunInfo.xml."""
+        ordered = [tile for tile in self.listed_tiles if tile in available_tiles] or available_tiles
+        return ordered[:self.max_tiles]
+
+    def read_cycle(self, cycle: int) -> np.ndarray:
+        """
+        Read the base codes of the sampled clusters for one cycle.
+
+        Args:
+            cycle (int): Cycle number
+
+        Returns:
+            Array of base codes, clusters of all sampled tiles concatenated
+
+        Raises:
+            IndexOrientationError: If the basecalls are missing or in an unsupported format
+        """
+        cycle_dir = self.lane_dir / f'C{cycle}.1'
+        cbcl_files = sorted(cycle_dir.glob('*.cbcl'))
+
+        if cbcl_files:
+            if self.tiles is None:
+                available_tiles = [tile for cbcl_file in cbcl_files for tile in _list_cbcl_tiles(cbcl_file)]
+                self.tiles = self._select_tiles(available_tiles)
+
+            bases = {}
+            for cbcl_file in cbcl_files:
+                bases.update(_read_cbcl_tiles(cbcl_file, self.tiles, self.max_clusters))
+        else:
+            bcl_files = {}
+            for bcl_file in cycle_dir.glob(f's_{self.lane}_*.bcl*'):
+                tile = bcl_file.name.split('.')[0].split('_')[-1]
+                if bcl_file.suffix in ('.bcl', '.gz') and tile.isdigit():
+                    bcl_files[int(tile)] = bcl_file
+
+            if self.tiles is None:
+                self.tiles = self._select_tiles(sorted(bcl_files))
+
+            bases = {tile: _read_bcl_tile(bcl_files[tile], self.max_clusters)
+                     for tile in self.tiles if tile in bcl_files}
+
+        if not self.tiles or any(tile not in bases for tile in self.tiles):
+            raise IndexOrientationError(f'No usable basecalls for lane {self.lane} cycle {cycle} in {cycle_dir}')
+
+        return np.concatenate([bases[tile] for tile in self.tiles])
+
+    def read_cycles(self, first_cycle: int, num_cycles: int) -> np.ndarray:
+        """
+        Read the base codes of the sampled clusters for a range of cycles.
+
+        Args:
+            first_cycle (int): First cycle number
+            num_cycles (int): Number of cycles
+
+        Returns:
+            Array of shape (num_cycles, clusters) with base codes
+        """
+        return np.stack([self.read_cycle(cycle) for cycle in range(first_cycle, first_cycle + num_cycles)])
+
+
+def encode_sequence(sequence: str) -> int:
+    """
+    Encode a base sequence the same way encode_basecalls encodes the observed indices.
+
+    Args:
+        sequence (str): Base sequence
+
+    Returns:
+        Integer code of the sequence
+    """
+    code = 0
+    for base in sequence:
+        code = code * NR_CODES + BASE_CODES.get(base, NO_CALL)
+    return code
+
+
+def encode_basecalls(basecalls: np.ndarray) -> np.ndarray:
+    """
+    Encode the basecalls of every cluster into one integer per cluster.
+
+    Args:
+        basecalls (np.ndarray): Array of shape (cycles, clusters) with base codes
+
+    Returns:
+        Array with one integer code per cluster
+    """
+    codes = np.zeros(basecalls.shape[1], dtype=np.int64)
+    for cycle_bases in basecalls:
+        codes = codes * NR_CODES + cycle_bases
+    return codes
+
+
+def score_orientations(index_reads: List[np.ndarray], candidates: Dict[str, List[Tuple[str, str]]]) -> Dict[str, int]:
+    """
+    Count the sampled clusters matching the index pairs of each candidate orientation.
+
+    Observed index pairs are counted once per index length combination, after which every
+    candidate is scored with a lookup of its expected pairs in the counted pairs.
+
+    Args:
+        index_reads (List[np.ndarray]): Basecalls per index read, arrays of shape (cycles, clusters)
+        candidates (Dict[str, List[Tuple[str, str]]]): Index pairs (index, index2) per orientation,
+            index2 is an empty string for single index samples
+
+    Returns:
+        Number of matching clusters per orientation
+    """
+    read_lengths = [read.shape[0] for read in index_reads] + [0, 0]
+    observed = {}
+    scores = {}
+
+    for orientation, index_pairs in candidates.items():
+        expected = {}
+        for index, index2 in index_pairs:
+            lengths = (len(index), len(index2))
+            expected.setdefault(lengths, set()).add(
+                encode_sequence(index) * NR_CODES ** len(index2) + encode_sequence(index2))
+
+        scores[orientation] = 0
+        for lengths, codes in expected.items():
+            if lengths not in observed:
+                if lengths[0] > read_lengths[0] or lengths[1] > read_lengths[1] or sum(lengths) > MAX_CODE_LENGTH:
+                    raise IndexOrientationError(f'Index lengths {lengths} do not fit the index reads of the run')
+
+                pair_codes = encode_basecalls(index_reads[0][:lengths[0]])
+                if lengths[1]:
+                    pair_codes = pair_codes * NR_CODES ** lengths[1] + encode_basecalls(index_reads[1][:lengths[1]])
+                observed[lengths] = np.unique(pair_codes, return_counts=True)
+
+            unique_codes, counts = observed[lengths]
+            matches = np.isin(unique_codes, np.fromiter(codes, dtype=np.int64))
+            scores[orientation] += int(counts[matches].sum())
+
+    return scores
+
+
+def detect_index_orientation(run_dir: Path, lane: int, candidates: Dict[str, List[Tuple[str, str]]],
+                             logger: logging.Logger, max_tiles: int = DEFAULT_MAX_TILES,
+                             max_clusters: int = DEFAULT_MAX_CLUSTERS) -> Optional[str]:
+    """
+    Detect which candidate index orientation matches the index reads of a run.
+
+    The index cycles of a few tiles of the lane are sampled and the observed index pairs are
+    scored against every candidate. The best candidate is only returned when it matches enough
+    clusters and clearly outscores the runner-up.
+
+    Args:
+        run_dir (Path): Run directory path
+        lane (int): Lane to sample
+        candidates (Dict[str, List[Tuple[str, str]]]): Index pairs (index, index2) per orientation
+        logger (logging.Logger): Logger instance
+        max_tiles (int): Maximum number of tiles to sample
+        max_clusters (int): Maximum number of clusters to sample per tile
+
+    Returns:
+        Name of the detected orientation, None if the orientation could not be detected with confidence
+    """
+    try:
+        layout = parse_run_layout(run_dir / 'RunInfo.xml')
+        if not layout['index_reads']:
+            logger.info('Run has no index reads, index orientation can not be detected')
+            return None
+
+        sampler = BasecallSampler(run_dir, lane, layout['tiles'].get(lane, []), max_tiles, max_clusters)
+        index_reads = [sampler.read_cycles(first_cycle, num_cycles)
+                       for first_cycle, num_cycles in layout['index_reads'][:2]]
+        scores = score_orientations(index_reads, candidates)
+
+    except (IndexOrientationError, OSError, ET.ParseError, struct.error, zlib.error) as e:
+        logger.warning(f'Index orientation detection failed: {e}')
+        return None
+
+    total_clusters = index_reads[0].shape[1]
+    ranked = sorted(scores, key=scores.get, reverse=True)
+    best = ranked[0]
+    runner_up = scores[ranked[1]] if len(ranked) > 1 else 0
+
+    logger.info(f'Index orientation scores on {total_clusters} clusters of lane {lane} '
+                f'(tiles {sampler.tiles}): {scores}')
+
+    if scores[best] < MIN_MATCHED_CLUSTERS or scores[best] < MIN_SCORE_RATIO * runner_up:
+        logger.info('Index orientation could not be detected with confidence')
+        return None
+
+    logger.info(f'Detected index orientation {best}')
+    return best
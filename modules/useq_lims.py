@@ -0,0 +1,344 @@
+"""Module for cached access to the genologics LIMS API."""
+
+import sqlite3
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple
+from xml.etree import ElementTree
+
+import requests
+from genologics.lims import Lims, TIMEOUT
+
+from config import Config
+
+# Maximum number of entities per batch retrieve request
+BATCH_SIZE = 500
+
+# Maximum number of sample IDs per filtered list query, keeps the query string short
+QUERY_SIZE = 50
+
+# Entities and GET responses (content, etag, fetched_at) shared by all CachedLims instances in the process
+_ENTITY_CACHE = {}
+_RESPONSE_CACHE = {}
+_CACHE_LOCK = threading.Lock()
+
+
+class CachedLims(Lims):
+    """
+    Lims with cached GET responses, for read-only reporting tools.
+
+    Entities and GET responses (single entities and list queries such as get_samples(projectlimsid=...)) are
+    shared by all instances in the process, and optionally kept in an on-disk cache keyed by URI. A cached
+    response younger than the TTL is used as is, an older one is revalidated with its ETag (if the server
+    sent one) or fetched again. PUT, POST and DELETE drop the cached responses of their URI.
+    """
+
+    def __init__(self, baseuri: str, username: str, password: str, version: str = Lims.VERSION,
+                 cache_file: Optional[str] = None, ttl: Optional[int] = None):
+        """
+        Args:
+            baseuri (str): Base URI of the LIMS server.
+            username (str): LIMS username.
+            password (str): LIMS password.
+            version (str): LIMS API version.
+            cache_file (Optional[str]): On-disk cache, defaults to Config.LIMS_CACHE (disabled if empty).
+            ttl (Optional[int]): Seconds a cached response is used without revalidation, defaults to Config.LIMS_CACHE_TTL.
+        """
+        super().__init__(baseuri, username, password, version)
+        self.cache = _ENTITY_CACHE
+        self.ttl = Config.LIMS_CACHE_TTL if ttl is None else ttl
+        self.metrics = {'hits': 0, 'misses': 0, 'revalidated': 0}
+
+        self.store = None
+        cache_file = Config.LIMS_CACHE if cache_file is None else cache_file
+        if cache_file:
+            self.store = sqlite3.connect(cache_file, check_same_thread=False)
+            self.store.execute("""
+                CREATE TABLE IF NOT EXISTS responses (
+                    uri TEXT PRIMARY KEY,
+                    content BLOB NOT NULL,
+                    etag TEXT,
+                    fetched_at REAL NOT NULL
+                )
+            """)
+            self.store.commit()
+
+    def _count(self, metric: str):
+        """
+        Increment a cache counter.
+
+        Args:
+            metric (str): Name of the counter.
+        """
+        with _CACHE_LOCK:
+            self.metrics[metric] += 1
+
+    def _cached_response(self, url: str) -> Optional[Tuple[bytes, Optional[str], float]]:
+        """
+        Look up a response in the process-wide cache, falling back to the on-disk cache.
+
+        Args:
+            url (str): Full URL including the query string.
+
+        Returns:
+            Tuple of (content, etag, fetched_at), None if the URL was not cached.
+        """
+        with _CACHE_LOCK:
+            cached = _RESPONSE_CACHE.get(url)
+            if cached is None and self.store:
+                cached = self.store.execute(
+                    "SELECT content, etag, fetched_at FROM responses WHERE uri = ?", (url,)
+                ).fetchone()
+                if cached:
+                    _RESPONSE_CACHE[url] = cached
+
+        return cached
+
+    def _store_response(self, url: str, content: bytes, etag: Optional[str]):
+        """
+        Store a response in the process-wide and on-disk caches.
+
+        Args:
+            url (str): Full URL including the query string.
+            content (bytes): Response XML.
+            etag (Optional[str]): ETag header of the response.
+        """
+        cached = (content, etag, time.time())
+        with _CACHE_LOCK:
+            _RESPONSE_CACHE[url] = cached
+            if self.store:
+                with self.store:
+                    self.store.execute(
+                        "INSERT OR REPLACE INTO responses (uri, content, etag, fetched_at) VALUES (?, ?, ?, ?)",
+                        (url, *cached),
+                    )
+
+    def invalidate(self, uri: str):
+        """
+        Drop the cached responses of a URI, including those with a query string (e.g. artifact states).
+
+        Args:
+            uri (str): URI without query string.
+        """
+        prefix = f"{uri}?"
+        with _CACHE_LOCK:
+            for url in [url for url in _RESPONSE_CACHE if url == uri or url.startswith(prefix)]:
+                del _RESPONSE_CACHE[url]
+            if self.store:
+                with self.store:
+                    self.store.execute(
+                        "DELETE FROM responses WHERE uri = ? OR substr(uri, 1, ?) = ?", (uri, len(prefix), prefix)
+                    )
+
+    def get(self, uri, params=dict()):
+        """
+        GET data from the URI, served from the cache when possible.
+
+        Args:
+            uri (str): URI to get.
+            params (dict): Query parameters.
+
+        Returns:
+            Response XML as an ElementTree.
+        """
+        url = requests.Request('GET', uri, params=params).prepare().url
+        cached = self._cached_response(url)
+
+        if cached and time.time() - cached[2] < self.ttl:
+            self._count('hits')
+            return ElementTree.fromstring(cached[0])
+
+        headers = {'accept': 'application/xml'}
+        if cached and cached[1]:
+            headers['If-None-Match'] = cached[1]
+
+        try:
+            response = self.request_session.get(url, auth=(self.username, self.password), headers=headers, timeout=TIMEOUT)
+        except requests.exceptions.Timeout as e:
+            raise type(e)(f"{e}, Error trying to reach {uri}")
+
+        if cached and response.status_code == 304:
+            self._count('revalidated')
+            content, etag = cached[0], cached[1]
+        else:
+            self.validate_response(response)
+            self._count('misses')
+            content, etag = response.content, response.headers.get('ETag')
+
+        self._store_response(url, content, etag)
+        return ElementTree.fromstring(content)
+
+    def put(self, uri, data, params=dict()):
+        """PUT the serialized XML to the given URI and drop its cached responses."""
+        self.invalidate(uri)
+        return super().put(uri, data, params)
+
+    def post(self, uri, data, params=dict()):
+        """POST the serialized XML to the given URI and drop its cached responses."""
+        self.invalidate(uri)
+        return super().post(uri, data, params)
+
+    def delete(self, uri, params=dict()):
+        """DELETE the given URI and drop its cached responses."""
+        self.invalidate(uri)
+        return super().delete(uri, params)
+
+    def cache_metrics(self) -> Dict[str, int]:
+        """
+        Get the cache counters of this instance.
+
+        Returns:
+            Dictionary with the number of hits, misses and revalidated responses.
+        """
+        with _CACHE_LOCK:
+            return dict(self.metrics)
+
+    def format_cache_metrics(self) -> str:
+        """
+        Format the cache counters as a one line summary.
+
+        Returns:
+            Summary of hits, misses and revalidated responses.
+        """
+        metrics = self.cache_metrics()
+        total = sum(metrics.values())
+        hit_ratio = metrics['hits'] / total if total else 0.0
+        return (f"LIMS cache: {metrics['hits']} hits, {metrics['misses']} misses, "
+                f"{metrics['revalidated']} revalidated ({hit_ratio:.0%} hits)")
+
+    def close(self):
+        """Close the on-disk cache."""
+        if self.store:
+            self.store.close()
+            self.store = None
+
+
+def unique_entities(entities: Iterable[Any]) -> List[Any]:
+    """
+    Deduplicate entities by URI, keeping their order.
+
+    Args:
+        entities (Iterable[Any]): LIMS entities, None values are skipped.
+
+    Returns:
+        List of unique entities.
+    """
+    unique = {}
+    for entity in entities:
+        if entity is not None and entity.uri not in unique:
+            unique[entity.uri] = entity
+
+    return list(unique.values())
+
+
+def prefetch(entities: Iterable[Any], workers: Optional[int] = None) -> List[Any]:
+    """
+    GET the entities that are not loaded yet, in parallel.
+
+    For entity types without a batch endpoint, such as projects, processes and researchers.
+
+    Args:
+        entities (Iterable[Any]): LIMS entities.
+        workers (Optional[int]): Number of parallel requests, defaults to Config.LIMS_WORKERS.
+
+    Returns:
+        List of unique entities.
+    """
+    entities = unique_entities(entities)
+    pending = [entity for entity in entities if entity.root is None]
+
+    if pending:
+        with ThreadPoolExecutor(max_workers=workers or Config.LIMS_WORKERS) as executor:
+            list(executor.map(lambda entity: entity.get(), pending))
+
+    return entities
+
+
+def get_batch(lims: Lims, instances: Iterable[Any], chunk_size: int = BATCH_SIZE, workers: Optional[int] = None) -> List[Any]:
+    """
+    Load entities through the batch retrieve endpoint, in parallel chunks.
+
+    Only artifacts, containers, files and samples have a batch endpoint.
+
+    Args:
+        lims (Lims): LIMS instance.
+        instances (Iterable[Any]): LIMS entities of one type.
+        chunk_size (int): Maximum number of entities per batch request.
+        workers (Optional[int]): Number of parallel requests, defaults to Config.LIMS_WORKERS.
+
+    Returns:
+        List of unique entities.
+    """
+    instances = unique_entities(instances)
+    pending = [instance for instance in instances if instance.root is None]
+    chunks = [pending[start:start + chunk_size] for start in range(0, len(pending), chunk_size)]
+
+    if chunks:
+        with ThreadPoolExecutor(max_workers=workers or Config.LIMS_WORKERS) as executor:
+            list(executor.map(lims.get_batch, chunks))
+
+    return instances
+
+
+def get_sample_artifacts(lims: Lims, sample_ids: Iterable[str], chunk_size: int = QUERY_SIZE, workers: Optional[int] = None) -> Dict[str, List[Any]]:
+    """
+    Get the artifacts of many samples, with one list query per chunk of samples and batch retrieval of the artifacts.
+
+    Equivalent to lims.get_artifacts(samplelimsid=sample_id) for every sample, with the artifacts already loaded.
+
+    Args:
+        lims (Lims): LIMS instance.
+        sample_ids (Iterable[str]): Sample LIMS IDs.
+        chunk_size (int): Maximum number of sample IDs per list query.
+        workers (Optional[int]): Number of parallel requests, defaults to Config.LIMS_WORKERS.
+
+    Returns:
+        Dictionary of artifacts by sample ID, in the order the LIMS lists them.
+    """
+    sample_ids = list(dict.fromkeys(sample_ids))
+    chunks = [sample_ids[start:start + chunk_size] for start in range(0, len(sample_ids), chunk_size)]
+
+    with ThreadPoolExecutor(max_workers=workers or Config.LIMS_WORKERS) as executor:
+        artifacts = [artifact for chunk in executor.map(lambda chunk: lims.get_artifacts(samplelimsid=chunk), chunks)
+                     for artifact in chunk]
+
+    get_batch(lims, artifacts, workers=workers)
+
+    # Pools hold several samples, so an artifact can belong to more than one of the requested samples
+    sample_artifacts = {sample_id: [] for sample_id in sample_ids}
+    for artifact in unique_entities(artifacts):
+        for sample in artifact.samples:
+            if sample.id in sample_artifacts:
+                sample_artifacts[sample.id].append(artifact)
+
+    return sample_artifacts
+
+
+def iter_pages(lims: Lims, klass: Any, params: Optional[Dict[str, Any]] = None, workers: Optional[int] = None) -> Iterator[List[Any]]:
+    """
+    Stream a filtered list query page by page, instead of collecting all pages first like the lims.get_* methods.
+
+    Entities of types with a batch endpoint (artifacts, containers, files, samples) are loaded a page at a time.
+
+    Args:
+        lims (Lims): LIMS instance.
+        klass (Any): Entity class, e.g. Sample.
+        params (Optional[Dict[str, Any]]): Query parameters, e.g. {'udf.Budget Number': ['B1', 'B2']}; list values match any of them.
+        workers (Optional[int]): Number of parallel batch requests, defaults to Config.LIMS_WORKERS.
+
+    Yields:
+        List of entities for every page.
+    """
+    tag = klass._TAG or klass.__name__.lower()
+    root = lims.get(lims.get_uri(klass._URI), params=params or {})
+
+    while root is not None:
+        page = [klass(lims, uri=node.attrib['uri']) for node in root.findall(tag)]
+        if page and klass._URI in ('artifacts', 'containers', 'files', 'samples'):
+            get_batch(lims, page, workers=workers)
+        yield page
+
+        # The next page URI repeats the query parameters
+        next_page = root.find('next-page')
+        root = lims.get(next_page.attrib['uri']) if next_page is not None else None
@@ -0,0 +1,296 @@
+"""Module for indexing the artifact lineage of LIMS projects."""
+
+import json
+import sqlite3
+import threading
+from contextlib import closing
+from datetime import datetime, timezone
+from typing import Any, Dict, Iterable, List, NamedTuple, Optional
+
+from genologics.entities import Project
+from genologics.lims import Lims
+
+from config import Config
+from modules.useq_lims import CachedLims, get_batch, get_sample_artifacts, prefetch
+
+# Artifact UDFs kept in the index, used to classify and report measurements
+ARTIFACT_UDFS = (
+    'US Isolation Type',
+    'Concentration Qubit QC (DNA) 5.0 (ng/ul)',
+    'RIN',
+    'Average length (bp)',
+)
+
+# Process UDFs kept in the index, the analyses requested in an analysis step
+PROCESS_UDFS = (
+    'Mapping',
+    'Germline SNV/InDel calling',
+    'Read count analysis (mRNA)',
+    'Differential expression analysis + figures (mRNA)',
+    'CNV + SV calling',
+    'Somatic calling (tumor/normal pair)',
+)
+
+# Format of the last-modified filter of the LIMS API
+LAST_MODIFIED_FORMAT = '%Y-%m-%dT%H:%M:%SZ'
+
+# Lineage indexes built or validated by this process, by project ID
+_INDEXES = {}
+_INDEX_LOCK = threading.Lock()
+
+
+class LineageRow(NamedTuple):
+    """Artifact of a sample with the process that produced it."""
+    sample_id: str
+    artifact_id: str
+    artifact_type: str
+    process_id: str
+    process_type: str
+    date_run: Optional[str]
+    has_udfs: bool
+    udfs: Dict[str, Any]
+    process_udfs: Dict[str, Any]
+
+
+class LineageIndex:
+    """
+    Artifact lineage of a project: one row per sample artifact that was produced by a process.
+
+    Rows are kept in the order the LIMS lists the artifacts of each sample.
+    """
+
+    def __init__(self, project_id: str, rows: List[LineageRow], indexed_at: str, skip_flowcell_only: bool = False):
+        """
+        Args:
+            project_id (str): LIMS project ID.
+            rows (List[LineageRow]): Lineage rows.
+            indexed_at (str): UTC time the rows were read from the LIMS, in LAST_MODIFIED_FORMAT.
+            skip_flowcell_only (bool): Whether the artifacts of 'Flowcell only' samples were left out.
+        """
+        self.project_id = project_id
+        self.rows = rows
+        self.indexed_at = indexed_at
+        self.skip_flowcell_only = skip_flowcell_only
+        self._sample_rows = {}
+        for row in rows:
+            self._sample_rows.setdefault(row.sample_id, []).append(row)
+
+    def sample_rows(self, sample_id: str) -> List[LineageRow]:
+        """
+        Get the rows of a sample.
+
+        Args:
+            sample_id (str): Sample LIMS ID.
+
+        Returns:
+            Rows of the sample's artifacts.
+        """
+        return self._sample_rows.get(sample_id, [])
+
+    def process_rows(self, process_types: Iterable[str]) -> List[LineageRow]:
+        """
+        Get the rows of artifacts produced by processes of the given types.
+
+        Args:
+            process_types (Iterable[str]): Process type names.
+
+        Returns:
+            Rows of the artifacts produced by those process types.
+        """
+        process_types = set(process_types)
+        return [row for row in self.rows if row.process_type in process_types]
+
+
+def _usable(index: Optional[LineageIndex], skip_flowcell_only: bool) -> bool:
+    """
+    Check whether an index has the rows a caller needs, a complete index serves every caller.
+
+    Args:
+        index (Optional[LineageIndex]): Lineage index.
+        skip_flowcell_only (bool): Whether the caller can do without the rows of 'Flowcell only' samples.
+
+    Returns:
+        True if the index can be used.
+    """
+    return index is not None and (skip_flowcell_only or not index.skip_flowcell_only)
+
+
+def build_lineage_index(lims: Lims, project_id: str, skip_flowcell_only: bool = False) -> LineageIndex:
+    """
+    Walk sample, artifacts and parent processes of a project once and index them.
+
+    Args:
+        lims (Lims): LIMS instance.
+        project_id (str): LIMS project ID.
+        skip_flowcell_only (bool): Leave out the artifacts of 'Flowcell only' samples, which are billed without them.
+
+    Returns:
+        Lineage index of the project.
+    """
+    indexed_at = datetime.now(timezone.utc).strftime(LAST_MODIFIED_FORMAT)
+
+    samples = get_batch(lims, lims.get_samples(projectlimsid=project_id))
+    if skip_flowcell_only:
+        samples = [sample for sample in samples if 'Flowcell only' not in sample.udf.get('Sequencing Runtype', '')]
+    sample_artifacts = get_sample_artifacts(lims, [sample.id for sample in samples])
+
+    processes = prefetch(
+        artifact.parent_process for artifacts in sample_artifacts.values() for artifact in artifacts
+    )
+    prefetch(process.type for process in processes)
+
+    rows = []
+    for sample_id, artifacts in sample_artifacts.items():
+        for artifact in artifacts:
+            process = artifact.parent_process
+            if not process:
+                continue
+
+            artifact_udfs = dict(artifact.udf.items())
+            process_udfs = dict(process.udf.items())
+
+            rows.append(LineageRow(
+                sample_id=sample_id,
+                artifact_id=artifact.id,
+                artifact_type=artifact.type,
+                process_id=process.id,
+                process_type=process.type.name,
+                date_run=process.date_run,
+                has_udfs=bool(artifact_udfs),
+                udfs={name: artifact_udfs[name] for name in ARTIFACT_UDFS if name in artifact_udfs},
+                process_udfs={name: process_udfs[name] for name in PROCESS_UDFS if name in process_udfs},
+            ))
+
+    return LineageIndex(project_id, rows, indexed_at, skip_flowcell_only)
+
+
+def _connect_lineage_cache() -> sqlite3.Connection:
+    """
+    Open the on-disk lineage cache, creating its table if needed.
+
+    Returns:
+        Connection to the lineage cache.
+    """
+    store = sqlite3.connect(Config.LIMS_LINEAGE_CACHE)
+    store.execute("""
+        CREATE TABLE IF NOT EXISTS lineage (
+            project_id TEXT PRIMARY KEY,
+            indexed_at TEXT NOT NULL,
+            rows TEXT NOT NULL,
+            skip_flowcell_only INTEGER NOT NULL DEFAULT 0
+        )
+    """)
+    return store
+
+
+def _load_cached_index(project_id: str) -> Optional[LineageIndex]:
+    """
+    Load the lineage index of a project from the on-disk cache.
+
+    Args:
+        project_id (str): LIMS project ID.
+
+    Returns:
+        Cached lineage index, None if the cache is disabled or has no index for the project.
+    """
+    if not Config.LIMS_LINEAGE_CACHE:
+        return None
+
+    with closing(_connect_lineage_cache()) as store:
+        cached = store.execute(
+            "SELECT indexed_at, rows, skip_flowcell_only FROM lineage WHERE project_id = ?", (project_id,)
+        ).fetchone()
+
+    if not cached:
+        return None
+
+    indexed_at, rows, skip_flowcell_only = cached
+    return LineageIndex(project_id, [LineageRow(*row) for row in json.loads(rows)], indexed_at, bool(skip_flowcell_only))
+
+
+def _store_cached_index(index: LineageIndex):
+    """
+    Store the lineage index of a project in the on-disk cache.
+
+    Args:
+        index (LineageIndex): Lineage index.
+    """
+    if not Config.LIMS_LINEAGE_CACHE:
+        return
+
+    with closing(_connect_lineage_cache()) as store, store:
+        store.execute(
+            "INSERT OR REPLACE INTO lineage (project_id, indexed_at, rows, skip_flowcell_only) VALUES (?, ?, ?, ?)",
+            (index.project_id, index.indexed_at, json.dumps(index.rows, default=str), int(index.skip_flowcell_only)),
+        )
+
+
+def _uncached(lims: Lims) -> Lims:
+    """
+    Get a LIMS instance that reads every response from the server.
+
+    Responses of a CachedLims can be older than the time an index is stamped with, and a cached
+    last-modified query keeps answering "not modified" until the index is rebuilt.
+
+    Args:
+        lims (Lims): LIMS instance.
+
+    Returns:
+        The LIMS instance itself, or a plain Lims with the same connection settings for a CachedLims.
+    """
+    if isinstance(lims, CachedLims):
+        return Lims(lims.baseuri, lims.username, lims.password, lims.VERSION)
+    return lims
+
+
+def _modified_since(lims: Lims, project_id: str, since: str) -> bool:
+    """
+    Check whether a project or a process run on its samples was modified after a point in time.
+
+    Args:
+        lims (Lims): LIMS instance.
+        project_id (str): LIMS project ID.
+        since (str): UTC time in LAST_MODIFIED_FORMAT.
+
+    Returns:
+        True if the project or one of its processes was modified since then.
+    """
+    project = Project(lims, id=project_id)
+    if lims.get_projects(name=project.name, last_modified=since):
+        return True
+
+    return bool(lims.get_processes(projectname=project.name, last_modified=since))
+
+
+def get_lineage_index(lims: Lims, project_id: str, skip_flowcell_only: bool = False) -> LineageIndex:
+    """
+    Get the lineage index of a project, built at most once per process.
+
+    An index from the on-disk cache (Config.LIMS_LINEAGE_CACHE) is used as long as neither the project
+    nor any process run on its samples was modified after the index was built. A complete index is
+    also used by callers that skip 'Flowcell only' samples, not the other way around. Indexes are built
+    and checked without the response cache of a CachedLims.
+
+    Args:
+        lims (Lims): LIMS instance.
+        project_id (str): LIMS project ID.
+        skip_flowcell_only (bool): Whether the caller can do without the rows of 'Flowcell only' samples.
+
+    Returns:
+        Lineage index of the project.
+    """
+    with _INDEX_LOCK:
+        index = _INDEXES.get(project_id)
+    if _usable(index, skip_flowcell_only):
+        return index
+
+    lims = _uncached(lims)
+    index = _load_cached_index(project_id)
+    if not _usable(index, skip_flowcell_only) or _modified_since(lims, project_id, index.indexed_at):
+        index = build_lineage_index(lims, project_id, skip_flowcell_only)
+        _store_cached_index(index)
+
+    with _INDEX_LOCK:
+        _INDEXES[project_id] = index
+
+    return index
@@ -10,10 +10,24 @@ from email.mime.text import MIMEText
 from pathlib import Path
 from typing import Dict, List, Optional
 
+from config import Config
 from modules.useq_template import TEMPLATE_PATH
 
 
-def send_mail(subject: str, content: str, sender: str, receivers: List[str], attachments: Optional[Dict[str, str]] = None, logo: bool = True,):
+def smtp_connection() -> smtplib.SMTP:
+    """
+    Open a connection to the mail server (Config.MAIL_HOST), to send several emails over.
+
+    Use it as a context manager, the connection is closed on exit.
+
+    Returns:
+        SMTP connection.
+    """
+    return smtplib.SMTP(Config.MAIL_HOST)
+
+
+def send_mail(subject: str, content: str, sender: str, receivers: List[str], attachments: Optional[Dict[str, str]] = None, logo: bool = True,
+              smtp_server: Optional[smtplib.SMTP] = None):
     """
     Send an HTML email to one or more recipients with optional attachments.
 
@@ -24,6 +38,7 @@ def send_mail(subject: str, content: str, sender: str, receivers: List[str], att
         receivers (List[str]): List of recipient email addresses.
         attachments (Optional[Dict[str, str]]): Optional dictionary mapping attachment names to file paths.
         logo (bool): If True, attach the USEQ logo to the email.
+        smtp_server (Optional[smtplib.SMTP]): Open connection from smtp_connection, a new connection is opened if not given.
 
     Raises:
         FileNotFoundError: If the logo file cannot be found when logo=True.
@@ -48,8 +63,11 @@ def send_mail(subject: str, content: str, sender: str, receivers: List[str], att
         _attach_logo(outer)
 
     # Send the email
-    with smtplib.SMTP("localhost") as smtp_server:
+    if smtp_server:
         smtp_server.sendmail(sender, receivers, outer.as_string())
+    else:
+        with smtp_connection() as smtp_server:
+            smtp_server.sendmail(sender, receivers, outer.as_string())
 
 
 def _attach_file(outer: MIMEMultipart, attachment_name: str, attachment_path: str):
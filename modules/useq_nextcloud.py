@@ -1,26 +1,114 @@
 """Module for interacting with Nextcloud via WebDAV and OCS API."""
 
-import re
-import sys
 import time
 import json
 import ntpath
 import os
 import secrets
 import csv
+import hashlib
 import ipaddress
+import sqlite3
+import threading
+import xml.etree.ElementTree as ET
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import closing
 from pathlib import Path
-from typing import Any, Dict, List, Optional, TextIO
+from typing import Any, Dict, Iterator, List, Optional, TextIO, Tuple
 from xml.dom.minidom import parseString
 from collections import defaultdict
-from urllib.parse import urlparse, parse_qs, unquote
+from urllib.parse import urlparse, quote, unquote
 from config import Config
+from modules.useq_access_log import decompress_chunks, parse_log_lines
 import easywebdav
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 
 # Configuration
 DEBUG = 0
 
+# WebDAV namespaces and the properties requested when listing
+DAV_NS = {'d': 'DAV:', 'oc': 'http://owncloud.org/ns'}
+PROPFIND_BODY = (
+    '<?xml version="1.0"?>'
+    '<d:propfind xmlns:d="DAV:" xmlns:oc="http://owncloud.org/ns">'
+    '<d:prop><d:getcontentlength/><d:getlastmodified/><d:getetag/><d:resourcetype/><oc:size/></d:prop>'
+    '</d:propfind>'
+)
+
+# Bytes read from the start of an access log to fingerprint it by its first line
+LOG_FINGERPRINT_SIZE = 64 * 1024
+
+# Download statistics of a share token copied onto the shared file
+SHARE_SUMMARY_FIELDS = (
+    "downloaded", "download_count", "view_count", "not_found_count", "unique_ips", "ip_locations", "files",
+    "total_bytes_downloaded", "first_seen", "last_seen", "integrity_flags",
+)
+
+
+class NextcloudUploadError(Exception):
+    """Exception for failed chunked uploads to Nextcloud."""
+    pass
+
+
+class NextcloudSession(requests.Session):
+    """
+    Keep-alive session shared by all WebDAV and OCS calls of a NextcloudUtil.
+
+    Requests get a default timeout and idempotent requests are retried on connection errors and
+    gateway errors. The number of calls and their latency are recorded per method and endpoint.
+    """
+
+    def __init__(self, user: str, password: str, pool_size: int):
+        """
+        Args:
+            user (str): Nextcloud username.
+            password (str): Nextcloud password.
+            pool_size (int): Number of connections kept alive.
+        """
+        super().__init__()
+        self.auth = (user, password)
+
+        retries = Retry(
+            total=Config.NEXTCLOUD_RETRIES,
+            backoff_factor=1,
+            status_forcelist=(502, 503, 504),
+            allowed_methods=frozenset({"GET", "HEAD", "OPTIONS", "PROPFIND"}),
+            raise_on_status=False,
+        )
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size, max_retries=retries)
+        self.mount("http://", adapter)
+        self.mount("https://", adapter)
+
+        self.metrics = {}
+        self.metrics_lock = threading.Lock()
+
+    @staticmethod
+    def _endpoint(url: str) -> str:
+        """Group a URL into the endpoint it belongs to, e.g. webdav, uploads or ocs."""
+        path = urlparse(url).path.lstrip("/")
+        for prefix, endpoint in (("remote.php/dav/files/", "webdav"), ("remote.php/dav/uploads/", "uploads"),
+                                 ("ocs/", "ocs"), ("remote.php/webdav/", "webdav")):
+            if path.startswith(prefix):
+                return endpoint
+        return path.split("/")[0] or "/"
+
+    def request(self, method, url, *args, **kwargs):
+        kwargs.setdefault("timeout", Config.NEXTCLOUD_TIMEOUT)
+
+        start = time.monotonic()
+        try:
+            return super().request(method, url, *args, **kwargs)
+        finally:
+            elapsed = time.monotonic() - start
+            key = f"{method.upper()} {self._endpoint(url)}"
+            with self.metrics_lock:
+                metric = self.metrics.setdefault(key, {"count": 0, "total_time": 0.0, "max_time": 0.0})
+                metric["count"] += 1
+                metric["total_time"] += elapsed
+                metric["max_time"] = max(metric["max_time"], elapsed)
+
 
 class NextcloudUtil:
     """
@@ -36,24 +124,28 @@ class NextcloudUtil:
             print(f"{self.__class__.__name__} init called")
 
         self.hostname = ""
+        self.protocol = "https"
         self.webdav = None
+        self.session = None
         self.user = ""
         self.password = ""
         self.webdav_root = ""
         self.run_dir = ""
         self.recipient = ""
 
-    def set_hostname(self, hostname: str):
+    def set_hostname(self, hostname: str, protocol: str = "https"):
         """
         Set the Nextcloud server hostname.
 
         Args:
-            hostname (str): The hostname of the Nextcloud server.
+            hostname (str): The hostname of the Nextcloud server, optionally with a port.
+            protocol (str): Protocol to connect with, "http" is only meant for local test servers.
         """
         if DEBUG > 0:
             print(f"{self.__class__.__name__} set_hostname called")
 
         self.hostname = hostname
+        self.protocol = protocol
 
     def setup(self, user: str, password: str, webdav_root: str, run_dir: str, recipient: str):
         """
@@ -71,11 +163,39 @@ class NextcloudUtil:
 
         self.user = user
         self.password = password
-        self.webdav = easywebdav.connect(self.hostname, username=user, password=password, protocol="https")
+        self.webdav = easywebdav.connect(self.hostname, username=user, password=password, protocol=self.protocol)
         self.webdav_root = webdav_root
         self.run_dir = run_dir
         self.recipient = recipient
 
+        # One pooled session for all WebDAV and OCS calls, with a connection per upload worker
+        self.session = NextcloudSession(user, password, Config.NEXTCLOUD_UPLOAD_WORKERS)
+        self.webdav.session = self.session
+
+    def request_metrics(self) -> Dict[str, Dict[str, float]]:
+        """
+        Get the number of calls and their latency per method and endpoint.
+
+        Returns:
+            Dictionary mapping "METHOD endpoint" to count, total_time and max_time (seconds).
+        """
+        with self.session.metrics_lock:
+            return {key: dict(metric) for key, metric in self.session.metrics.items()}
+
+    def format_request_metrics(self) -> str:
+        """
+        Format the request metrics as a table, slowest endpoint first.
+
+        Returns:
+            Multi-line string with one line per method and endpoint.
+        """
+        metrics = sorted(self.request_metrics().items(), key=lambda item: item[1]["total_time"], reverse=True)
+        lines = [f"{'Request':<24}{'Count':>8}{'Total (s)':>12}{'Mean (s)':>12}{'Max (s)':>12}"]
+        for key, metric in metrics:
+            lines.append(f"{key:<24}{metric['count']:>8}{metric['total_time']:>12.2f}"
+                         f"{metric['total_time'] / metric['count']:>12.3f}{metric['max_time']:>12.3f}")
+        return "\n".join(lines)
+
     def simple_file_list(self, directory: str) -> List[str]:
         """
         Get a simple list of filenames in a directory.
@@ -87,7 +207,7 @@ class NextcloudUtil:
             List of filenames (excluding directories).
         """
         files = []
-        path = f"{self.webdav_root}{self.run_dir}/{directory}"
+        path = self._remote_path(directory)
 
         for file in self.webdav.ls(path):
             if not file.contenttype:  # Skip directories
@@ -99,7 +219,7 @@ class NextcloudUtil:
 
         return files
 
-    def _check_download_event_integrity(self, events):
+    def _check_download_event_integrity(self, store: sqlite3.Connection) -> Dict[str, List[str]]:
         """
         Compare repeated download requests for the same (token, filename).
         For a single named file, its true size cannot legitimately change between
@@ -108,70 +228,57 @@ class NextcloudUtil:
         For whole-share/root downloads (filename is None), size differences are
         ambiguous (folder contents may have changed between requests), so these
         are only flagged as "ambiguous", not failed.
-        """
-        groups = defaultdict(list)
-        downloads = [e for e in events if e['action'] == 'download']
-        for e in downloads:
-            groups[(e['token'], e['filename'])].append(e)
-
-        # default: every download is assumed successful (200 + bytes sent)
-        for e in downloads:
-            e['likely_status'] = 'success'
-
-        flagged = []
-        for (token, filename), evs in groups.items():
-            if len(evs) < 2:
-                continue
-            sizes = set(e['size'] for e in evs)
-            if len(sizes) <= 1:
-                continue  # identical repeats -- not a failure signal
-
-            if filename is None:
-                # whole-share/root download: differing sizes could just mean
-                # folder contents changed between requests
-                for e in evs:
-                    e['likely_status'] = 'ambiguous (whole-share size differs between requests; folder contents may have changed)'
-                flagged.append((token, filename, evs, 'ambiguous'))
-            else:
-                max_size = max(int(e['size']) for e in evs)
-                for e in evs:
-                    if int(e['size']) < max_size:
-                        e['likely_status'] = 'likely incomplete/failed (smaller than a later transfer of the same file)'
-                    else:
-                        e['likely_status'] = 'likely successful (largest transfer of this file)'
-                flagged.append((token, filename, evs, 'incomplete_then_retried'))
-
-        return flagged
-
-    def _summarize_download_events(self, events): #Needs DOC
-        by_token = defaultdict(list)
-        for e in events:
-            by_token[e['token']].append(e)
+        Downloads that are not part of such a group are assumed successful and not flagged.
 
-        # for token, evs in by_token.items():
-        #     downloads = [e for e in evs if e['action'] in ('download', 'download_attempt')]
-        #     views = [e for e in evs if e['action'] == 'view']
-        #     not_found = [e for e in evs if e['action'] == 'not_found']
-
-            # print(f"\n=== Share token: {token} ===")
-            # if downloads:
-            #     print(f"  DOWNLOADED: yes ({len(downloads)} download request(s))")
-            # else:
-            #     print("  DOWNLOADED: no confirmed download requests found")
+        Args:
+            store (sqlite3.Connection): Connection to the event store.
 
-            # if views:
-            #     ips_viewed = sorted(set(e['ip'] for e in views))
-            #     print(f"  Viewed (link opened) {len(views)}x by IP(s): {', '.join(ips_viewed)}")
+        Returns:
+            Dictionary mapping tokens to their sorted integrity flags.
+        """
+        rows = store.execute("""
+            WITH repeated AS (
+                SELECT token, filename, MAX(size) AS max_size
+                FROM events
+                WHERE action = 'download'
+                GROUP BY token, filename
+                HAVING COUNT(*) > 1 AND COUNT(DISTINCT size) > 1
+            )
+            SELECT DISTINCT e.token,
+                CASE
+                    WHEN r.filename IS NULL THEN 'ambiguous (whole-share size differs between requests; folder contents may have changed)'
+                    WHEN e.size < r.max_size THEN 'likely incomplete/failed (smaller than a later transfer of the same file)'
+                    ELSE 'likely successful (largest transfer of this file)'
+                END AS flag
+            FROM events e
+            JOIN repeated r ON e.token = r.token AND e.filename IS r.filename
+            WHERE e.action = 'download'
+            ORDER BY e.token, flag
+        """)
+
+        flags = defaultdict(list)
+        for token, flag in rows:
+            flags[token].append(flag)
+
+        return flags
+
+    def _summarize_download_events(self, store: sqlite3.Connection) -> Dict[str, Dict[str, int]]:
+        """
+        Count the events per share token and action.
 
-            # if not_found:
-            #     ips_404 = sorted(set(e['ip'] for e in not_found))
-            #     print(f"  404 / invalid-link hits: {len(not_found)}x from {', '.join(ips_404)}")
+        Args:
+            store (sqlite3.Connection): Connection to the event store.
 
-            # for e in downloads:
-            #     fname = e['filename'] or '(root/whole share)'
-            #     print(f"    -> {e['time']}  ip={e['ip']:<16} file={fname}  status={e['status']}  size={e['size']}")
+        Returns:
+            Dictionary mapping tokens to the number of events per action.
+        """
+        by_token = defaultdict(dict)
+        for token, action, count in store.execute(
+                "SELECT token, action, COUNT(*) FROM events GROUP BY token, action ORDER BY token"):
+            by_token[token][action] = count
 
         return by_token
+
     def _format_location(self, geo):
         if not geo:
             return 'unknown'
@@ -181,48 +288,67 @@ class NextcloudUtil:
             loc += f" ({geo['isp']})"
         return loc
 
-    def _build_token_summary(self, events, geo):
-        by_token = defaultdict(list)
-        for e in events:
-            by_token[e['token']].append(e)
+    def _build_token_summary(self, store: sqlite3.Connection, geo: Dict[str, Dict[str, str]]) -> Dict[str, Dict[str, Any]]:
+        """
+        Roll up the download events per share token.
+
+        Args:
+            store (sqlite3.Connection): Connection to the event store.
+            geo (Dict[str, Dict[str, str]]): Location per IP.
+
+        Returns:
+            Dictionary mapping tokens to their download statistics.
+        """
+        ips = defaultdict(list)
+        for token, ip in store.execute("SELECT DISTINCT token, ip FROM events ORDER BY token, ip"):
+            ips[token].append(ip)
+
+        filenames = defaultdict(list)
+        for token, filename in store.execute("""
+                SELECT DISTINCT token, filename FROM events
+                WHERE action = 'download' AND filename IS NOT NULL AND filename != ''
+                ORDER BY token, filename"""):
+            filenames[token].append(filename)
+
+        integrity_flags = self._check_download_event_integrity(store)
 
         summary = {}
-        for token, evs in sorted(by_token.items()):
-            downloads = [e for e in evs if e['action'] == 'download']
-            views = [e for e in evs if e['action'] == 'view']
-            not_found = [e for e in evs if e['action'] == 'not_found']
-            pw_prompts = [e for e in evs if e['action'] == 'password_prompt']
-
-            ips = sorted(set(e['ip'] for e in evs))
-            ip_locations = '; '.join(f"{ip} [{self._format_location(geo.get(ip))}]" for ip in ips)
-
-            filenames = sorted(set(e['filename'] for e in downloads if e['filename']))
-            total_bytes = sum(int(e['size']) for e in downloads if e['size'].isdigit())
-
-            times = sorted(e['time'] for e in evs)
-            integrity_issues = sorted(set(
-                e['likely_status'] for e in downloads
-                if e.get('likely_status') and e['likely_status'] != 'success'
-            ))
-    
+        rows = store.execute("""
+            SELECT token,
+                SUM(action = 'download'),
+                SUM(action = 'view'),
+                SUM(action = 'password_prompt'),
+                SUM(action = 'not_found'),
+                COUNT(DISTINCT ip),
+                SUM(CASE WHEN action = 'download' THEN size END),
+                MIN(time),
+                MAX(time)
+            FROM events
+            GROUP BY token
+            ORDER BY token
+        """)
+
+        for token, downloads, views, pw_prompts, not_found, unique_ips, total_bytes, first_seen, last_seen in rows:
+            ip_locations = '; '.join(f"{ip} [{self._format_location(geo.get(ip))}]" for ip in ips[token])
+
             summary[token] = {
                 'token': token,
                 'downloaded': 'yes' if downloads else 'no',
-                'download_count': len(downloads),
-                'view_count': len(views),
-                'password_prompt_count': len(pw_prompts),
-                'not_found_count': len(not_found),
-                'unique_ips': len(ips),
+                'download_count': downloads,
+                'view_count': views,
+                'password_prompt_count': pw_prompts,
+                'not_found_count': not_found,
+                'unique_ips': unique_ips,
                 'ip_locations': ip_locations,
-                'files': '; '.join(filenames) if filenames else '',
-                'total_bytes_downloaded': total_bytes,
-                'first_seen': times[0] if times else '',
-                'last_seen': times[-1] if times else '',
-                'integrity_flags': '; '.join(integrity_issues) if integrity_issues else 'OK',
+                'files': '; '.join(filenames[token]),
+                'total_bytes_downloaded': total_bytes or 0,
+                'first_seen': first_seen or '',
+                'last_seen': last_seen or '',
+                'integrity_flags': '; '.join(integrity_flags[token]) if token in integrity_flags else 'OK',
             }
         return summary
 
-    def _write_file_summary_csv(self, summary, delimiter=';'):
+    def write_file_summary_csv(self, summary, delimiter=';'):
         """Write a summary of file information to a CSV file."""
         
         fields =[
@@ -235,10 +361,35 @@ class NextcloudUtil:
             w.writerows(summary.values())
 
 
-    def file_list(self, historic_shares: Dict[Any,Any]) -> Dict[str, Dict[str, Any]]:
+    def download_summary(self) -> Dict[str, Dict[str, Any]]:
+        """
+        Ingest new download log lines and summarize the downloads per share token.
+
+        The summary does not depend on the run directory, so one summary can be shared by the file lists
+        of several directories.
+
+        Returns:
+            Dictionary of download statistics by share token.
+        """
+        # Ingest new download log lines into the event store
+        self._parse_download_logs()
+
+        with closing(self._connect_event_store()) as store:
+            all_ips = [ip for ip, in store.execute("SELECT DISTINCT ip FROM events ORDER BY ip")]
+
+            geo = self._geolocate_ips(all_ips)
+
+            return self._build_token_summary(store, geo)
+
+    def file_list(self, historic_shares: Dict[Any,Any], token_summary: Optional[Dict[str, Dict[str, Any]]] = None) -> Dict[str, Dict[str, Any]]:
         """
         Get detailed information about files including download statistics.
 
+        Args:
+            historic_shares (Dict[Any, Any]): Dictionary of historic share IDs by run ID.
+            token_summary (Optional[Dict[str, Dict[str, Any]]]): Download statistics by share token from
+                download_summary, the download logs are parsed if not given.
+
         Returns:
             Dictionary mapping file paths to file metadata including:
             - size: File size in bytes
@@ -250,45 +401,40 @@ class NextcloudUtil:
             - download_dates: List of download timestamps
         """
         files = {}
-        # download_ids = {}
-
-        # Parse download logs
-        events = self._parse_download_logs()
 
-        self._summarize_download_events(events)
+        if token_summary is None:
+            token_summary = self.download_summary()
 
-        flagged = self._check_download_event_integrity(events)
+        # List the run directory in one request, directory sizes come from oc:size
+        run_dir_href = self._href(self._remote_path())
+        entries = [entry for entry in self._propfind(self._remote_path(), depth="1")
+                   if entry["href"] != run_dir_href]
 
-        all_ips = sorted(set(e['ip'] for e in events ))
+        # Servers that do not report oc:size get the directory sizes from one depth infinity listing
+        directory_sizes = {}
+        if any(entry["is_dir"] and entry["size"] is None for entry in entries):
+            directory_sizes = self._directory_sizes(self._remote_path())
 
-        geo = self._geolocate_ips(all_ips)
-
-        token_summary = self._build_token_summary(events, geo)
-     
-        # List files in run directory
-        for file in self.webdav.ls(f"{self.webdav_root}{self.run_dir}"):
-            file_path = file.name.replace(self.webdav_root, "")
+        for entry in entries:
+            file_path = entry["href"].replace(self.webdav_root, "")
 
             # Skip certain files and directories
             if (file_path.endswith(".done") or
                 file_path.endswith("raw_data/") or
                 file_path.endswith("other_data/")):
                 continue
-            
-            size = 0
-            if file.contenttype:
-                size = file.size
-            else:  # Directory - sum size of all files
-                for subfile in self.webdav.ls(f"{self.webdav_root}{file_path}"):
-                    size += subfile.size
+
+            size = entry["size"]
+            if entry["is_dir"]:
+                if size is None:
+                    size = directory_sizes.get(entry["href"], 0)
 
                 file_path = file_path[:-1]  # Remove trailing slash
 
-                
             files[file_path] = {
                 "file": file_path,
-                "size": size,
-                "mtime": file.mtime,
+                "size": size or 0,
+                "mtime": entry["mtime"],
                 "share_expiration" : "",
                 "share_id": "",
                 "downloaded": "",
@@ -307,163 +453,328 @@ class NextcloudUtil:
         # Get share IDs and match with download logs
         self._populate_share_info(files, token_summary, historic_shares)
 
-        self._write_file_summary_csv(files)
-
         return files
 
-    def _classify_log_line(self, path, status, user=None):
-        """Return (token, action, filename). action is one of:
-        'download', 'view', 'password_prompt', 'not_found', 'other'.
+    def _connect_event_store(self) -> sqlite3.Connection:
         """
-        # WebDAV public-share access: /public.php/webdav/<optional file path>
-        WEBDAV_RE = re.compile(r'^/public\.php/webdav(?P<rest>/.*)?$')
+        Open the local event store, creating its tables and indexes if needed.
 
-        # Matches both /index.php/s/TOKEN and /s/TOKEN, optionally with a subpath
-        SHARE_RE = re.compile(r'^/(?:index\.php/)?s/(?P<token>[^/?]+)(?P<rest>/.*)?$')
+        The store has one row per share-related request with indexes on token and filename. A request is
+        identified by the fingerprint of its log and the byte offset of its line, so lines that are ingested
+        again (e.g. after rotation) are stored once. The store also has the ingest state (etag, size, ingested
+        byte offset and fingerprint) of every access log file, and the ingested byte offset per fingerprint,
+        which a rotated copy of a log continues from.
 
-        # Reserved Nextcloud paths that look like a share token but aren't one
-        RESERVED_TOKENS = {'login'}
-
-        parsed = urlparse(path)
-        qs = parse_qs(parsed.query)
+        Returns:
+            Connection to the event store.
+        """
+        store = sqlite3.connect(Config.NEXTCLOUD_EVENT_STORE)
+        store.executescript("""
+            CREATE TABLE IF NOT EXISTS events (
+                id INTEGER PRIMARY KEY,
+                token TEXT NOT NULL,
+                action TEXT NOT NULL,
+                filename TEXT,
+                ip TEXT NOT NULL,
+                time TEXT NOT NULL,
+                status TEXT NOT NULL,
+                size INTEGER,
+                agent TEXT,
+                raw_path TEXT,
+                source TEXT NOT NULL,
+                fingerprint TEXT,
+                line_offset INTEGER
+            );
+            CREATE INDEX IF NOT EXISTS events_token ON events (token, action);
+            CREATE INDEX IF NOT EXISTS events_filename ON events (filename);
+            CREATE INDEX IF NOT EXISTS events_source ON events (source);
+            CREATE UNIQUE INDEX IF NOT EXISTS events_line ON events (fingerprint, line_offset);
+            CREATE TABLE IF NOT EXISTS ingest_state (
+                source TEXT PRIMARY KEY,
+                etag TEXT,
+                size INTEGER,
+                offset INTEGER NOT NULL,
+                fingerprint TEXT
+            );
+            CREATE TABLE IF NOT EXISTS log_offsets (
+                fingerprint TEXT PRIMARY KEY,
+                offset INTEGER NOT NULL
+            );
+        """)
+        return store
+
+    def _log_fingerprint(self, url: str, compressed: bool) -> Optional[str]:
+        """
+        Fingerprint a log file by its first line, which does not change while the log grows.
 
-        # --- WebDAV public-share access: token comes from the auth-user field ---
-        wd = WEBDAV_RE.match(parsed.path)
-        if wd:
-            if not user or user == '-':
-                return None, None, None  # no token available, can't attribute this request
-            rest = (wd.group('rest') or '').lstrip('/')
-            filename = unquote(qs['files'][0]) if 'files' in qs else (unquote(rest) if rest else None)
-            action = 'download' if status in ('200', '206', '304') else 'download_attempt'
-            return user, action, filename
+        Only the first LOG_FINGERPRINT_SIZE bytes are requested.
 
-        # --- Standard /s/TOKEN or /index.php/s/TOKEN access ---
-        m = SHARE_RE.match(parsed.path)
-        if not m:
-            return None, None, None
+        Args:
+            url (str): URL of the log file.
+            compressed (bool): Whether the log file is gzip compressed.
 
-        token = m.group('token')
-        if token in RESERVED_TOKENS:
-            return None, None, None  # e.g. /index.php/s/login -- not a real share
+        Returns:
+            SHA-1 of the first line, None if the log has no complete first line yet.
+        """
+        head = b""
 
-        rest = m.group('rest') or ''
+        with self.session.get(url, headers={"Range": f"bytes=0-{LOG_FINGERPRINT_SIZE - 1}"}, stream=True) as response:
+            if response.status_code == 416:  # empty log
+                return None
 
-        filename = None
-        if 'files' in qs:
-            filename = unquote(qs['files'][0])
-        elif rest.startswith('/download/'):
-            filename = unquote(rest[len('/download/'):])
+            response.raise_for_status()
+            chunks = response.iter_content(chunk_size=LOG_FINGERPRINT_SIZE)
+            if compressed:
+                chunks = decompress_chunks(chunks)
 
-        is_download_path = rest.startswith('/download')
-        is_auth_path = rest.startswith('/authenticate')
+            for chunk in chunks:
+                head += chunk
+                if b"\n" in head or len(head) >= LOG_FINGERPRINT_SIZE:
+                    break
 
-        if status == '404':
-            action = 'not_found'
-        elif is_download_path and status in ('200', '304', '206'):
-            action = 'download'
-        elif is_download_path:
-            action = 'download_attempt'  # hit /download but got a non-200 status
-        elif is_auth_path:
-            action = 'password_prompt'  # password-protected share: password page/submission, not a download
-        elif rest == '' and status in ('200', '303'):
-            action = 'view'  # share landing page, either redirected (303) or rendered directly (200)
-        else:
-            action = 'other'
+        if b"\n" in head:
+            head = head[:head.index(b"\n") + 1]
+        elif len(head) < LOG_FINGERPRINT_SIZE:
+            return None
 
-        return token, action, filename
+        return hashlib.sha1(head[:LOG_FINGERPRINT_SIZE]).hexdigest()
 
-    def _parse_download_logs(self) -> Dict[str, Dict[str, List[str]]]:
+    def _fetch_log_events(self, url: str, source: str, offset: int, compressed: bool) -> Tuple[List[Dict[str, str]], int, int]:
         """
-        Parse download logs to extract download statistics.
+        Stream a log file and parse the lines after an offset.
 
-        Returns:
-            Dictionary mapping share IDs to download information.
-        """
-        # Combined log format:
-        # IP - - [05/Jan/2026:09:51:46 +0100] "GET /index.php/s/TOKEN HTTP/2.0" 303 0 "-" "UA string"
-        # For WebDAV requests, the share token shows up in the auth-user (3rd) field instead of "-":
-        # IP - TOKEN [20/Jul/2026:11:05:45 +0200] "GET /public.php/webdav/file.csv HTTP/2.0" 200 326 "-" "curl/7.61.1"
-        LOG_RE = re.compile(
-            r'(?P<ip>\S+)\s+\S+\s+(?P<user>\S+)\s+'
-            r'\[(?P<time>[^\]]+)\]\s+'
-            r'"(?P<method>\S+)\s+(?P<path>\S+)\s+(?P<proto>[^"]+)"\s+'
-            r'(?P<status>\d{3})\s+(?P<size>\S+)\s+'
-            r'"(?P<referrer>[^"]*)"\s+"(?P<agent>[^"]*)"'
-        )
+        Plain logs are fetched from the offset with a Range request, only complete lines are parsed.
+        Compressed logs are fetched whole and decompressed as the bytes arrive, the offset then counts
+        decompressed bytes.
 
-        # Some logs are the result of grepping across multiple rotated/gzipped log files,
-        # which glues a "filename:" prefix onto the front of each line, e.g.:
-        #   ssl-nextcloud_server_main.access.log-20260721.gz:10.132.252.91 - - [...] ...
-        # Strip that prefix (only) when what follows looks like a real IPv4 address.
-        LOG_PREFIX_RE = re.compile(r'^\S*?:(?=\d{1,3}\.\d{1,3}\.\d{1,3}\.\d{1,3}\s)')
+        Args:
+            url (str): URL of the log file.
+            source (str): Name of the log the events are stored under.
+            offset (int): Number of (decompressed) bytes that were already ingested.
+            compressed (bool): Whether the log file is gzip compressed.
 
+        Returns:
+            Tuple of (events with the byte offset of their line, new offset, number of bytes to skip that were
+            missing from the log).
+        """
+        headers = {"Range": f"bytes={offset}-"} if offset and not compressed else {}
         events = []
+        skip = 0
 
-        for file in self.webdav.ls(f"{self.webdav_root}log/"):
-            if not file.contenttype:  # Skip directories
-                continue
+        with self.session.get(url, headers=headers, stream=True) as response:
+            if response.status_code == 416:  # nothing new
+                return events, offset, skip
 
-            url = f"https://{self.hostname}/{file.name}"
-            response = requests.get(url, auth=(self.user, self.password))
             response.raise_for_status()
             if DEBUG > 0:
-                print(file.name, file.size)
+                print(source, offset)
+
+            # Servers ignoring the range send the whole file, byte ranges don't apply within a compressed file
+            skip = offset if compressed or response.status_code == 200 else 0
+            chunks = response.iter_content(chunk_size=1024 * 1024)
+            if compressed:
+                chunks = decompress_chunks(chunks)
+            pending = b""
+
+            # Parse the complete lines as the bytes arrive
+            for chunk in chunks:
+                if skip:
+                    skipped = min(skip, len(chunk))
+                    chunk = chunk[skipped:]
+                    skip -= skipped
+
+                pending += chunk
+                complete = pending.rfind(b"\n") + 1
+                if complete:
+                    lines = pending[:complete - 1].split(b"\n")
+                    offsets = []
+                    for line in lines:
+                        offsets.append(offset)
+                        offset += len(line) + 1
+                    events.extend(parse_log_lines(
+                        [line.decode("utf-8", errors="replace") for line in lines], source, offsets
+                    ))
+                    pending = pending[complete:]
+
+            # A compressed log is no longer written to, so its last line is complete too
+            if compressed and pending:
+                events.extend(parse_log_lines([pending.decode("utf-8", errors="replace")], source, [offset]))
+                offset += len(pending)
+
+        return events, offset, skip
+
+    def _ingest_log_file(self, store: sqlite3.Connection, entry: Dict[str, Any]) -> int:
+        """
+        Fetch and parse the bytes of a log file that were not ingested yet.
 
-            for lineno, line in enumerate(response.iter_lines(decode_unicode=True), 1):
-                line = line.strip()
-                if not line:
-                    continue
-                line = LOG_PREFIX_RE.sub('', line)  # strip any "somefile.gz:" prefix from grepped logs
-                m = LOG_RE.match(line)
-                if not m:
-                    print(f"WARNING: could not parse line {lineno}: {line[:120]}", file=sys.stderr)
+        Only complete lines are ingested, a trailing partial line is fetched again on the next run.
+        Every file is its own source, and is read from the offset ingested for its fingerprint (the hash of
+        its first line). A rotated log, e.g. access.log.1 or access.log-20260721.gz, has the fingerprint of
+        the live log it was, so only the lines added after the last run of the live log are ingested.
+        A live log whose first line changed is a new log and is read from the start. Events already stored
+        are kept, and lines that were already stored under the same fingerprint and offset are skipped.
+        The new events and the new ingest state are stored in one transaction.
+
+        Args:
+            store (sqlite3.Connection): Connection to the event store.
+            entry (Dict[str, Any]): PROPFIND entry of the log file.
+
+        Returns:
+            Number of new events stored.
+        """
+        source = entry["href"].rstrip("/").split("/")[-1]
+        compressed = source.endswith(".gz")
+
+        state = store.execute("SELECT etag, size FROM ingest_state WHERE source = ?", (source,)).fetchone()
+        if state and state == (entry["etag"], entry["size"]):
+            return 0  # unchanged since the last run
+
+        url = f"{self.protocol}://{self.hostname}/{quote(entry['href'].lstrip('/'))}"
+        fingerprint = self._log_fingerprint(url, compressed)
+        if fingerprint is None:
+            return 0  # no complete line yet
+
+        known = store.execute("SELECT offset FROM log_offsets WHERE fingerprint = ?", (fingerprint,)).fetchone()
+        offset = known[0] if known else 0
+
+        # Truncated, ingest it again from the start
+        if not compressed and entry["size"] is not None and entry["size"] < offset:
+            offset = 0
+
+        events, offset, missing = self._fetch_log_events(url, source, offset, compressed)
+
+        # Shorter than what was ingested under its fingerprint, ingest it again from the start
+        if missing:
+            events, offset, _ = self._fetch_log_events(url, source, 0, compressed)
+
+        changes = store.total_changes
+        with store:
+            store.executemany(
+                "INSERT OR IGNORE INTO events "
+                "(token, action, filename, ip, time, status, size, agent, raw_path, source, fingerprint, line_offset) "
+                "VALUES (:token, :action, :filename, :ip, :time, :status, :size, :agent, :raw_path, :source, "
+                ":fingerprint, :offset)",
+                [{**event, 'size': int(event['size']) if event['size'].isdigit() else None,
+                  'fingerprint': fingerprint} for event in events],
+            )
+            stored = store.total_changes - changes
+            store.execute(
+                "INSERT OR REPLACE INTO ingest_state (source, etag, size, offset, fingerprint) VALUES (?, ?, ?, ?, ?)",
+                (source, entry["etag"], entry["size"], offset, fingerprint),
+            )
+            store.execute(
+                "INSERT INTO log_offsets (fingerprint, offset) VALUES (?, ?) "
+                "ON CONFLICT (fingerprint) DO UPDATE SET offset = MAX(offset, excluded.offset)",
+                (fingerprint, offset),
+            )
+
+        return stored
+
+    def _parse_download_logs(self) -> int:
+        """
+        Ingest new access log lines into the local event store.
+
+        Per log file the etag, size and ingested byte offset are kept, so only bytes added since the last
+        run are fetched (with a Range request) and parsed. Rotated logs continue from the offset ingested from
+        the live log they were, rotated .gz logs are decompressed while streaming.
+
+        Returns:
+            Number of events ingested.
+        """
+        ingested = 0
+
+        with closing(self._connect_event_store()) as store:
+            for entry in self._iter_propfind(f"{self.webdav_root}{Config.NEXTCLOUD_LOG_DIR}", depth="1"):
+                if entry["is_dir"]:  # Skip directories
                     continue
-                d = m.groupdict()
-                token, action, filename = self._classify_log_line(d['path'], d['status'], user=d.get('user'))
-                if token is None:
-                    continue  # not a share-related request
-                events.append({
-                    'token': token,
-                    'action': action,
-                    'filename': filename,
-                    'ip': d['ip'],
-                    'time': d['time'],
-                    'status': d['status'],
-                    'size': d['size'],
-                    'agent': d['agent'],
-                    'raw_path': d['path'],
-                })
-
-        return events
 
-    def _geolocate_ips(self, ips: List) -> Dict[Any, Any]:
+                ingested += self._ingest_log_file(store, entry)
+
+        return ingested
+
+    def _connect_geo_cache(self) -> sqlite3.Connection:
         """
-        Resolve each IP to a rough location using ip-api.com's free batch endpoint
-        (no API key needed, up to 100 IPs per request, ~45 req/min rate limit).
-        Private/reserved IPs are detected locally without any network call.
-        Requires the 'requests' package (pip install requests --break-system-packages).
-        Returns {ip: {'country', 'region', 'city', 'isp', 'org', 'as'}}.
+        Open the on-disk IP geolocation cache, creating its table if needed.
+
+        Returns:
+            Connection to the geolocation cache.
+        """
+        cache = sqlite3.connect(Config.NEXTCLOUD_GEO_CACHE)
+        cache.execute("""
+            CREATE TABLE IF NOT EXISTS geolocation (
+                ip TEXT PRIMARY KEY,
+                location TEXT NOT NULL,
+                resolved INTEGER NOT NULL,
+                fetched_at REAL NOT NULL
+            )
+        """)
+        return cache
+
+    def _geolocate_offline(self, ips: List[str]) -> Dict[str, Dict[str, str]]:
         """
+        Resolve IPs with local MaxMind-format databases (Config.NEXTCLOUD_GEOIP_DB, optionally
+        Config.NEXTCLOUD_GEOIP_ASN_DB for the ISP/organisation), without any network call.
+        Requires the 'geoip2' package.
+
+        Args:
+            ips (List[str]): Public IPs to resolve.
+
+        Returns:
+            Dictionary mapping IPs to {'country', 'region', 'city', 'isp', 'org', 'as'}.
+        """
+        import geoip2.database
+        import geoip2.errors
+
         results = {}
-        to_query = []
+        asn_reader = geoip2.database.Reader(Config.NEXTCLOUD_GEOIP_ASN_DB) if Config.NEXTCLOUD_GEOIP_ASN_DB else None
+
+        with geoip2.database.Reader(Config.NEXTCLOUD_GEOIP_DB) as reader:
+            for ip in ips:
+                try:
+                    city = reader.city(ip)
+                except geoip2.errors.AddressNotFoundError:
+                    results[ip] = {'country': 'lookup failed (not in offline database)', 'region': '', 'city': '', 'isp': '', 'org': '', 'as': ''}
+                    continue
 
-        for ip in ips:
-            try:
-                addr = ipaddress.ip_address(ip)
-            except ValueError:
-                results[ip] = {'country': 'invalid IP', 'region': '', 'city': '', 'isp': '', 'org': '', 'as': ''}
-                continue
-            if addr.is_private or addr.is_loopback or addr.is_link_local or addr.is_reserved or addr.is_multicast:
-                results[ip] = {'country': 'Private/Internal network', 'region': '', 'city': '', 'isp': '', 'org': '', 'as': ''}
-                continue
-            to_query.append(ip)
+                results[ip] = {
+                    'country': city.country.name or '',
+                    'region': city.subdivisions.most_specific.name or '',
+                    'city': city.city.name or '',
+                    'isp': '',
+                    'org': '',
+                    'as': '',
+                }
+
+                if asn_reader:
+                    try:
+                        asn = asn_reader.asn(ip)
+                        results[ip]['isp'] = asn.autonomous_system_organization or ''
+                        results[ip]['org'] = asn.autonomous_system_organization or ''
+                        results[ip]['as'] = f"AS{asn.autonomous_system_number}" if asn.autonomous_system_number else ''
+                    except geoip2.errors.AddressNotFoundError:
+                        pass
+
+        if asn_reader:
+            asn_reader.close()
 
-        if not to_query:
-            return results
+        return results
+
+    def _geolocate_online(self, ips: List[str]) -> Dict[str, Dict[str, str]]:
+        """
+        Resolve IPs using ip-api.com's free batch endpoint
+        (no API key needed, up to 100 IPs per request, ~45 req/min rate limit).
+
+        Args:
+            ips (List[str]): Public IPs to resolve.
+
+        Returns:
+            Dictionary mapping IPs to {'country', 'region', 'city', 'isp', 'org', 'as'}.
+        """
+        results = {}
 
         url = 'http://ip-api.com/batch?fields=status,message,country,regionName,city,isp,org,as,query'
-        for i in range(0, len(to_query), 100):
-            batch = to_query[i:i + 100]
+        for i in range(0, len(ips), 100):
+            batch = ips[i:i + 100]
             try:
                 resp = requests.post(url, json=batch, timeout=10)
                 resp.raise_for_status()
@@ -484,81 +795,145 @@ class NextcloudUtil:
             except Exception as e:
                 for ip in batch:
                     results[ip] = {'country': f'lookup unavailable ({e.__class__.__name__})', 'region': '', 'city': '', 'isp': '', 'org': '', 'as': ''}
-            if i + 100 < len(to_query):
+            if i + 100 < len(ips):
                 time.sleep(1.5)  # stay well under the free-tier rate limit
 
         return results
 
-    def _populate_share_info(self, files: Dict[str, Dict[str, Any]], download_ids: Dict[str, Dict[str, List[str]]], historic_shares: Dict[Any, Any]):
+    def _geolocate_ips(self, ips: List) -> Dict[Any, Any]:
+        """
+        Resolve each IP to a rough location.
+        Private/reserved IPs are detected locally without any network call. Public IPs are looked up in
+        the on-disk cache first; only unseen or expired IPs are resolved, with the offline database when
+        Config.NEXTCLOUD_GEOIP_DB is set and with ip-api.com otherwise. Successful lookups are cached for
+        Config.NEXTCLOUD_GEO_TTL days, failed lookups for Config.NEXTCLOUD_GEO_NEGATIVE_TTL days. Provider
+        outages are not cached.
+        Returns {ip: {'country', 'region', 'city', 'isp', 'org', 'as'}}.
+        """
+        results = {}
+        to_query = []
+
+        for ip in ips:
+            try:
+                addr = ipaddress.ip_address(ip)
+            except ValueError:
+                results[ip] = {'country': 'invalid IP', 'region': '', 'city': '', 'isp': '', 'org': '', 'as': ''}
+                continue
+            if addr.is_private or addr.is_loopback or addr.is_link_local or addr.is_reserved or addr.is_multicast:
+                results[ip] = {'country': 'Private/Internal network', 'region': '', 'city': '', 'isp': '', 'org': '', 'as': ''}
+                continue
+            to_query.append(ip)
+
+        if not to_query:
+            return results
+
+        now = time.time()
+        with closing(self._connect_geo_cache()) as cache:
+            # Use the cached locations that did not expire yet
+            cached = {}
+            for i in range(0, len(to_query), 500):
+                batch = to_query[i:i + 500]
+                cached.update((ip, (location, resolved, fetched_at)) for ip, location, resolved, fetched_at in cache.execute(
+                    f"SELECT ip, location, resolved, fetched_at FROM geolocation WHERE ip IN ({','.join('?' * len(batch))})",
+                    batch))
+
+            unseen = []
+            for ip in to_query:
+                if ip in cached:
+                    location, resolved, fetched_at = cached[ip]
+                    ttl = Config.NEXTCLOUD_GEO_TTL if resolved else Config.NEXTCLOUD_GEO_NEGATIVE_TTL
+                    if now - fetched_at < ttl * 86400:
+                        results[ip] = json.loads(location)
+                        continue
+                unseen.append(ip)
+
+            if not unseen:
+                return results
+
+            if Config.NEXTCLOUD_GEOIP_DB:
+                resolved_ips = self._geolocate_offline(unseen)
+            else:
+                resolved_ips = self._geolocate_online(unseen)
+
+            results.update(resolved_ips)
+
+            with cache:
+                cache.executemany(
+                    "INSERT OR REPLACE INTO geolocation (ip, location, resolved, fetched_at) VALUES (?, ?, ?, ?)",
+                    [(ip, json.dumps(location), not location['country'].startswith('lookup failed'), now)
+                     for ip, location in resolved_ips.items()
+                     if not location['country'].startswith('lookup unavailable')],
+                )
+
+        return results
+
+    def _share_index(self) -> Tuple[Dict[str, Dict[str, str]], Dict[str, Dict[str, str]]]:
+        """
+        Fetch the active shares with one OCS call and index them by path and by token.
+
+        The OCS response is streamed and parsed incrementally, so thousands of shares are never held in memory as a DOM.
+
+        Returns:
+            Tuple of (path -> share, token -> share), every share has a path, share_id (token) and share_expiration.
+        """
+        url = f"{self.protocol}://{self.hostname}/ocs/v2.php/apps/files_sharing/api/v1/shares"
+        by_path = {}
+        by_token = {}
+
+        with self.session.get(url, headers={"OCS-APIRequest": "true"}, stream=True) as response:
+            response.raise_for_status()
+            parser = ET.XMLPullParser(events=("end",))
+
+            for chunk in response.iter_content(chunk_size=65536):
+                parser.feed(chunk)
+                for _, element in parser.read_events():
+                    if element.tag != "element" or element.find("path") is None:
+                        continue
+
+                    share = {
+                        "path": element.findtext("path"),
+                        "share_id": element.findtext("token"),
+                        "share_expiration": element.findtext("expiration"),
+                    }
+                    element.clear()
+
+                    if not share["share_id"]:  # Not a link share, never shows up in the access logs
+                        continue
+                    by_path[share["path"]] = share
+                    by_token[share["share_id"]] = share
+
+            parser.close()
+
+        return by_path, by_token
+
+    def _populate_share_info(self, files: Dict[str, Dict[str, Any]], download_ids: Dict[str, Dict[str, Any]], historic_shares: Dict[Any, Any]):
         """
         Populate share IDs and download information for files.
 
+        Files without an active share fall back to the historic share of their run.
+
         Args:
             files (Dict[str, Dict[str, Any]]): Dictionary of file information to update.
-            download_ids (Dict[str, Dict[str, List[str]]]): Dictionary of download statistics by share ID.
+            download_ids (Dict[str, Dict[str, Any]]): Dictionary of download statistics by share ID.
+            historic_shares (Dict[Any, Any]): Dictionary of historic share IDs by run ID.
         """
-        url = f"https://{self.hostname}/ocs/v2.php/apps/files_sharing/api/v1/shares"
-        response = requests.get(
-            url,
-            auth=(self.user, self.password),
-            headers={"OCS-APIRequest": "true"},
-        )
+        by_path, by_token = self._share_index()
 
-        response_dom = parseString(response.text)
-        active_shares = {}
-
-        for element in response_dom.getElementsByTagName("element"):
-            file_path = element.getElementsByTagName("path")[0].firstChild.data
-            
-            active_shares[file_path] = {
-                'share_id' : element.getElementsByTagName("token")[0].firstChild.data,
-                'expiration_date' : element.getElementsByTagName("expiration")[0].firstChild.data
-            }
-
-        for file_path in files:
-
-            if file_path in active_shares:
-                share_id = active_shares[file_path]['share_id']
-                files[file_path]["share_id"] = share_id
-                files[file_path]["share_expiration"] = active_shares[file_path]['expiration_date']
-
-                if share_id in download_ids:
-                    files[file_path]["downloaded"] = download_ids[share_id]["downloaded"]
-                    files[file_path]["download_count"] = download_ids[share_id]["download_count"]
-                    files[file_path]["view_count"] = download_ids[share_id]["view_count"]
-                    files[file_path]["not_found_count"] = download_ids[share_id]["not_found_count"]
-                    files[file_path]["unique_ips"] = download_ids[share_id]["unique_ips"]
-                    files[file_path]["ip_locations"] = download_ids[share_id]["ip_locations"]
-                    files[file_path]["files"] = download_ids[share_id]["files"]
-                    files[file_path]["total_bytes_downloaded"] = download_ids[share_id]["total_bytes_downloaded"]
-                    files[file_path]["first_seen"] = download_ids[share_id]["first_seen"]
-                    files[file_path]["last_seen"] = download_ids[share_id]["last_seen"]
-                    files[file_path]["integrity_flags"] = download_ids[share_id]["integrity_flags"]
+        for file_path, file_info in files.items():
+            share = by_path.get(file_path)
 
-            else:
-                candidate_runid = file_path.split("/")[-1].split("_")[0]
-                
-                if candidate_runid in historic_shares:
-                    share_id = historic_shares[candidate_runid]
-
-                    files[file_path]["share_id"] = share_id
-                    
-                    files[file_path]["share_expiration"] = None
-
-                    if share_id in download_ids:
-                        files[file_path]["downloaded"] = download_ids[share_id]["downloaded"]
-                        files[file_path]["download_count"] = download_ids[share_id]["download_count"]
-                        files[file_path]["view_count"] = download_ids[share_id]["view_count"]
-                        files[file_path]["not_found_count"] = download_ids[share_id]["not_found_count"]
-                        files[file_path]["unique_ips"] = download_ids[share_id]["unique_ips"]
-                        files[file_path]["ip_locations"] = download_ids[share_id]["ip_locations"]
-                        files[file_path]["files"] = download_ids[share_id]["files"]
-                        files[file_path]["total_bytes_downloaded"] = download_ids[share_id]["total_bytes_downloaded"]
-                        files[file_path]["first_seen"] = download_ids[share_id]["first_seen"]
-                        files[file_path]["last_seen"] = download_ids[share_id]["last_seen"]
-                        files[file_path]["integrity_flags"] = download_ids[share_id]["integrity_flags"]
+            if share is None:
+                share_id = historic_shares.get(file_path.split("/")[-1].split("_")[0])
+                if not share_id:
+                    continue
+                share = by_token.get(share_id, {"share_id": share_id, "share_expiration": None})
 
+            file_info["share_id"] = share["share_id"]
+            file_info["share_expiration"] = share["share_expiration"]
 
+            summary = download_ids.get(share["share_id"])
+            if summary:
+                file_info.update((field, summary[field]) for field in SHARE_SUMMARY_FIELDS)
 
     def check_exists(self, file: str) -> bool:
         """
@@ -571,9 +946,47 @@ class NextcloudUtil:
             True if file exists, False otherwise.
         """
 
-        remote_path = f"{self.webdav_root}/{self.run_dir}/{file}"
+        remote_path = self._remote_path(file)
         return self.webdav.exists(remote_path)
 
+    def wait_for(self, file: str, size: Optional[int] = None, timeout: Optional[float] = None) -> bool:
+        """
+        Wait until a file or directory is visible on the server, e.g. after it was copied into the data directory.
+
+        The parent directory is listed with a depth 1 PROPFIND, with exponentially growing intervals
+        between the attempts.
+
+        Args:
+            file (str): Filename relative to webdav_root/run_dir.
+            size (Optional[int]): Expected size in bytes, the total size for directories (None to only check existence).
+            timeout (Optional[float]): Seconds to wait at most, defaults to Config.NEXTCLOUD_WAIT_TIMEOUT.
+
+        Returns:
+            True if the file is visible (with the expected size), False if the timeout passed.
+        """
+        timeout = Config.NEXTCLOUD_WAIT_TIMEOUT if timeout is None else timeout
+        deadline = time.monotonic() + timeout
+        delay = Config.NEXTCLOUD_WAIT_INTERVAL
+
+        parent, _, name = file.strip("/").rpartition("/")
+        directory = self._remote_path(parent)
+
+        while True:
+            try:
+                for entry in self._propfind(directory, depth="1"):
+                    if entry["href"].rstrip("/").split("/")[-1] == name and (size is None or entry["size"] == size):
+                        return True
+            except (requests.RequestException, ET.ParseError) as e:
+                if DEBUG > 0:
+                    print(f"Polling {file} failed: {e}")
+
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return False
+
+            time.sleep(min(delay, remaining))
+            delay = min(delay * 2, Config.NEXTCLOUD_WAIT_MAX_INTERVAL)
+
     def delete(self, file: str):
         """
         Delete a file from the server.
@@ -581,7 +994,7 @@ class NextcloudUtil:
         Args:
             file (str): Filename relative to webdav_root/run_dir.
         """
-        remote_path = f"{self.webdav_root}/{self.run_dir}/{file}"
+        remote_path = self._remote_path(file)
         self.webdav.delete(remote_path)
 
     def create_dir(self, directory: str):
@@ -591,9 +1004,254 @@ class NextcloudUtil:
         Args:
             directory: Directory name relative to webdav_root/run_dir.
         """
-        remote_path = f"{self.webdav_root}/{self.run_dir}/{directory}"
+        remote_path = self._remote_path(directory)
         self.webdav.mkdir(remote_path)
 
+    def _remote_path(self, *parts: str) -> str:
+        """
+        Build a path below webdav_root/run_dir, joining the parts with single slashes.
+
+        Args:
+            parts (str): Path parts relative to webdav_root/run_dir, with or without leading and trailing slashes.
+
+        Returns:
+            Path on the server, e.g. remote.php/dav/files/<user>/<run_dir>/<file>.
+        """
+        return "/".join(part.strip("/") for part in (self.webdav_root, self.run_dir, *parts) if part.strip("/"))
+
+    def _url(self, remote_path: str) -> str:
+        """
+        Build the URL for a path on the server.
+
+        Args:
+            remote_path (str): Path on the server, e.g. remote.php/dav/files/<user>/<file>.
+
+        Returns:
+            Quoted URL of the path.
+        """
+        return f"{self.protocol}://{self.hostname}/{quote(remote_path.lstrip('/'))}"
+
+    def _href(self, remote_path: str) -> str:
+        """
+        Get the href the server reports for a directory path.
+
+        Args:
+            remote_path (str): Directory path on the server.
+
+        Returns:
+            Unquoted absolute path with a trailing slash.
+        """
+        return f"/{remote_path.strip('/')}/"
+
+    def _iter_propfind(self, remote_path: str, depth: str = "1") -> Iterator[Dict[str, Any]]:
+        """
+        List the properties of a path (and its children) with a WebDAV PROPFIND.
+
+        The multistatus response is streamed and parsed incrementally, so large listings
+        (e.g. with depth "infinity") are never held in memory as a whole.
+
+        Args:
+            remote_path (str): Path on the server.
+            depth (str): PROPFIND depth, "0" for the path itself, "1" to include its children or "infinity".
+
+        Yields:
+            Dictionary with href, size, mtime, etag and is_dir for every response. The size of a directory is
+            its oc:size (total size of its contents), None if the server did not report it.
+        """
+        with self.session.request(
+            "PROPFIND",
+            self._url(remote_path),
+            data=PROPFIND_BODY,
+            headers={"Depth": depth, "Content-Type": "application/xml"},
+            stream=True,
+        ) as response:
+            if response.status_code == 404:
+                return
+            response.raise_for_status()
+
+            parser = ET.XMLPullParser(events=("end",))
+            response_tag = f"{{{DAV_NS['d']}}}response"
+
+            for chunk in response.iter_content(chunk_size=65536):
+                parser.feed(chunk)
+                for _, element in parser.read_events():
+                    if element.tag != response_tag:
+                        continue
+
+                    is_dir = element.find(".//d:resourcetype/d:collection", DAV_NS) is not None
+                    if is_dir:
+                        size = element.findtext(".//oc:size", namespaces=DAV_NS)
+                    else:
+                        size = element.findtext(".//d:getcontentlength", namespaces=DAV_NS)
+
+                    yield {
+                        "href": unquote(element.findtext("d:href", namespaces=DAV_NS)),
+                        "size": int(size) if size else None,
+                        "mtime": element.findtext(".//d:getlastmodified", namespaces=DAV_NS),
+                        "etag": element.findtext(".//d:getetag", namespaces=DAV_NS),
+                        "is_dir": is_dir,
+                    }
+                    element.clear()
+
+            parser.close()
+
+    def _propfind(self, remote_path: str, depth: str = "1") -> List[Dict[str, Any]]:
+        """
+        List the properties of a path (and its children) with a WebDAV PROPFIND.
+
+        Args:
+            remote_path (str): Path on the server.
+            depth (str): PROPFIND depth, "0" for the path itself, "1" to include its children or "infinity".
+
+        Returns:
+            List with href, size, mtime, etag and is_dir for every response, empty if the path does not exist.
+        """
+        return list(self._iter_propfind(remote_path, depth))
+
+    def _directory_sizes(self, remote_path: str) -> Dict[str, int]:
+        """
+        Compute the total size of every directory in a path from a single depth infinity listing.
+
+        Args:
+            remote_path (str): Path on the server.
+
+        Returns:
+            Dictionary mapping the href of every directory (with trailing slash) to the total size of its files.
+        """
+        sizes = defaultdict(int)
+        root = self._href(remote_path)
+
+        for entry in self._iter_propfind(remote_path, depth="infinity"):
+            if entry["is_dir"]:
+                sizes[entry["href"]] += 0
+                continue
+
+            # Add the file to every directory between the listed path and the file
+            parent = entry["href"].rpartition("/")[0]
+            while len(parent) + 1 >= len(root):
+                sizes[f"{parent}/"] += entry["size"] or 0
+                parent = parent.rpartition("/")[0]
+
+        return sizes
+
+    def _upload_chunk(self, chunk_url: str, file_path: str, offset: int, length: int, headers: Dict[str, str]):
+        """
+        Upload one chunk of a file, retrying on connection errors and server errors.
+
+        Args:
+            chunk_url (str): URL of the chunk in the upload directory.
+            file_path (str): Local path of the file.
+            offset (int): Offset of the chunk in the file.
+            length (int): Length of the chunk.
+            headers (Dict[str, str]): Headers sent with the chunk.
+
+        Raises:
+            NextcloudUploadError: If the chunk could not be uploaded.
+        """
+        with open(file_path, "rb") as f:
+            f.seek(offset)
+            data = f.read(length)
+
+        for attempt in range(1, Config.NEXTCLOUD_UPLOAD_RETRIES + 1):
+            try:
+                response = self.session.put(chunk_url, data=data, headers=headers)
+                if response.ok:
+                    return
+                if response.status_code < 500:
+                    raise NextcloudUploadError(f"Chunk {chunk_url} rejected with status {response.status_code}")
+                error = f"status {response.status_code}"
+            except requests.RequestException as e:
+                error = str(e)
+
+            if attempt < Config.NEXTCLOUD_UPLOAD_RETRIES:
+                time.sleep(2 ** attempt)
+
+        raise NextcloudUploadError(f"Chunk {chunk_url} failed after {Config.NEXTCLOUD_UPLOAD_RETRIES} attempts: {error}")
+
+    def upload_file(self, file_path: str, remote_path: str) -> Dict[str, Any]:
+        """
+        Upload a file using the Nextcloud chunked upload protocol (v2).
+
+        Chunks are uploaded in parallel into an upload directory named after the file, its size and mtime,
+        so an interrupted upload resumes with the chunks that are still missing. The upload is complete
+        when the final MOVE succeeded and the assembled file on the server has the size of the local file.
+
+        Args:
+            file_path (str): Local path to the file to upload.
+            remote_path (str): Destination path on the server, e.g. remote.php/dav/files/<user>/<file>.
+
+        Returns:
+            Dictionary with the size and etag of the uploaded file.
+
+        Raises:
+            NextcloudUploadError: If the upload failed.
+        """
+        stat = os.stat(file_path)
+        chunk_size = Config.NEXTCLOUD_UPLOAD_CHUNK_SIZE
+        destination = self._url(remote_path)
+
+        upload_id = hashlib.sha1(f"{remote_path}:{stat.st_size}:{stat.st_mtime_ns}".encode()).hexdigest()
+        upload_dir = f"remote.php/dav/uploads/{self.user}/useq-{upload_id}"
+        headers = {"Destination": destination, "OC-Total-Length": str(stat.st_size)}
+
+        # Create the upload directory or resume the chunks already in it
+        response = self.session.request("MKCOL", self._url(upload_dir), headers=headers)
+        uploaded = {}
+        if response.status_code == 405:
+            uploaded = {entry["href"].rstrip("/").split("/")[-1]: entry["size"]
+                        for entry in self._propfind(upload_dir) if not entry["is_dir"]}
+        elif not response.ok:
+            raise NextcloudUploadError(f"Could not create upload directory for {remote_path}: status {response.status_code}")
+
+        chunks = []
+        for number, offset in enumerate(range(0, max(stat.st_size, 1), chunk_size), 1):
+            length = min(chunk_size, stat.st_size - offset)
+            name = f"{number:05d}"
+            if uploaded.get(name) != length:
+                chunks.append((f"{self._url(upload_dir)}/{name}", offset, length))
+
+        with ThreadPoolExecutor(max_workers=Config.NEXTCLOUD_UPLOAD_WORKERS) as executor:
+            futures = [executor.submit(self._upload_chunk, url, file_path, offset, length, headers)
+                       for url, offset, length in chunks]
+            for future in futures:
+                future.result()
+
+        # Assemble the chunks into the destination file
+        response = self.session.request("MOVE", f"{self._url(upload_dir)}/.file", headers=headers)
+        if not response.ok:
+            raise NextcloudUploadError(f"Could not assemble {remote_path}: status {response.status_code}")
+
+        entries = self._propfind(remote_path, depth="0")
+        if not entries or entries[0]["size"] != stat.st_size:
+            raise NextcloudUploadError(f"Size of {remote_path} on the server does not match {file_path}")
+
+        return {"size": entries[0]["size"], "etag": entries[0]["etag"]}
+
+    def upload_directory(self, directory: str, remote_path: str) -> Dict[str, Dict[str, Any]]:
+        """
+        Upload the files of a local directory (not recursive) into a new directory on the server.
+
+        Args:
+            directory (str): Local directory to upload.
+            remote_path (str): Destination directory on the server.
+
+        Returns:
+            Dictionary with the upload result of every file.
+
+        Raises:
+            NextcloudUploadError: If one of the uploads failed.
+        """
+        response = self.session.request("MKCOL", self._url(remote_path))
+        if not response.ok and response.status_code != 405:
+            raise NextcloudUploadError(f"Could not create directory {remote_path}: status {response.status_code}")
+
+        results = {}
+        for file in sorted(Path(directory).iterdir()):
+            if file.is_file():
+                results[file.name] = self.upload_file(str(file), f"{remote_path.strip('/')}/{file.name}")
+
+        return results
+
     def upload(self, file_path: str) -> Dict[str, Any]:
         """
         Upload a file to the server.
@@ -608,17 +1266,18 @@ class NextcloudUtil:
             return {"ERROR": f"File path '{file_path}' is not a file"}
 
         file_basename = ntpath.basename(file_path)
-        remote_path = f"{self.webdav_root}{self.run_dir}{file_basename}"
+        remote_path = self._remote_path(file_basename)
 
         if self.webdav.exists(remote_path):
             return {"ERROR": f"File path '{file_basename}' already exists on server"}
 
-        # Upload file
-        self.webdav.upload(file_path, remote_path)
+        # Upload file in parallel chunks, verified against the local size
+        try:
+            self.upload_file(file_path, remote_path)
+        except (NextcloudUploadError, requests.RequestException) as e:
+            return {"ERROR": str(e)}
 
-        # Verify upload
-        upload_success = self.webdav.exists(remote_path)
-        return {"SUCCESS": upload_success}
+        return {"SUCCESS": True}
 
     def share(self, file_name: str, email: str) -> Dict[str, Any]:
         """
@@ -632,7 +1291,7 @@ class NextcloudUtil:
             Dictionary with either "SUCCESS" ([share_id, password]) or "ERROR" (str) key.
         """
 
-        remote_path = f"{self.webdav_root}/{self.run_dir}/{file_name}"
+        remote_path = self._remote_path(file_name)
 
         if not self.webdav.exists(remote_path):
             return {"ERROR": f"File path '{file_name}' does not exist on server"}
@@ -649,10 +1308,9 @@ class NextcloudUtil:
             "password": password,
         }
 
-        url = f"https://{self.hostname}/ocs/v2.php/apps/files_sharing/api/v1/shares"
-        response = requests.post(
+        url = f"{self.protocol}://{self.hostname}/ocs/v2.php/apps/files_sharing/api/v1/shares"
+        response = self.session.post(
             url,
-            auth=(self.user, self.password),
             headers={"OCS-APIRequest": "true", "Content-Type": "application/json"},
             data=json.dumps(data),
         )
@@ -0,0 +1,125 @@
+"""Shared fixtures, including a local stand-in for the Nextcloud WebDAV server."""
+
+import os
+import shutil
+import sys
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import unquote, urlparse
+
+import pytest
+
+# Modules import config and modules.* from the repository root
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+class WebDAVStandIn(BaseHTTPRequestHandler):
+    """
+    Minimal WebDAV server with the parts of the Nextcloud chunked upload protocol (v2) used by NextcloudUtil.
+
+    Files live below the server's root directory. A MOVE of <upload dir>/.file assembles the chunks of the
+    upload directory, in name order, into the Destination and removes the upload directory.
+    """
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):
+        pass
+
+    def _path(self, url=None):
+        return os.path.join(self.server.root, unquote(urlparse(url or self.path).path).lstrip("/"))
+
+    def _body(self):
+        return self.rfile.read(int(self.headers.get("Content-Length") or 0))
+
+    def _reply(self, status, data=b""):
+        self.send_response(status)
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def do_GET(self):
+        path = self._path()
+        if not os.path.isfile(path):
+            return self._reply(404)
+        with open(path, "rb") as f:
+            self._reply(200, f.read())
+
+    def do_MKCOL(self):
+        self._body()
+        path = self._path()
+        if os.path.exists(path):
+            return self._reply(405)
+        if not os.path.isdir(os.path.dirname(path.rstrip("/"))):
+            return self._reply(409)
+        os.mkdir(path)
+        self._reply(201)
+
+    def do_PUT(self):
+        data = self._body()
+        self.server.requests.append(("PUT", self.path))
+        if self.server.failures > 0:
+            self.server.failures -= 1
+            return self._reply(503)
+        with open(self._path(), "wb") as f:
+            f.write(data)
+        self._reply(201)
+
+    def do_MOVE(self):
+        self._body()
+        self.server.requests.append(("MOVE", self.path, self.headers["Destination"]))
+        upload_dir = os.path.dirname(self._path())
+        if os.path.basename(self._path()) != ".file" or not os.path.isdir(upload_dir):
+            return self._reply(404)
+
+        with open(self._path(self.headers["Destination"]), "wb") as destination:
+            for chunk in sorted(os.listdir(upload_dir)):
+                with open(os.path.join(upload_dir, chunk), "rb") as f:
+                    destination.write(f.read())
+        shutil.rmtree(upload_dir)
+        self._reply(201)
+
+    def do_PROPFIND(self):
+        self._body()
+        path = self._path()
+        if not os.path.exists(path):
+            return self._reply(404)
+
+        items = [path]
+        if os.path.isdir(path) and self.headers.get("Depth") != "0":
+            items += [os.path.join(path, name) for name in sorted(os.listdir(path))]
+
+        responses = []
+        for item in items:
+            href = "/" + os.path.relpath(item, self.server.root)
+            if os.path.isdir(item):
+                prop = "<d:resourcetype><d:collection/></d:resourcetype>"
+                href += "/"
+            else:
+                prop = (f"<d:resourcetype/><d:getcontentlength>{os.path.getsize(item)}</d:getcontentlength>"
+                        f"<d:getetag>\"{os.stat(item).st_mtime_ns}\"</d:getetag>")
+            responses.append(f"<d:response><d:href>{href}</d:href><d:propstat><d:prop>{prop}</d:prop>"
+                             f"</d:propstat></d:response>")
+
+        self._reply(207, ('<?xml version="1.0"?><d:multistatus xmlns:d="DAV:" xmlns:oc="http://owncloud.org/ns">'
+                          + "".join(responses) + "</d:multistatus>").encode())
+
+
+@pytest.fixture
+def webdav_server(tmp_path):
+    """
+    Run the WebDAV stand-in on a free local port.
+
+    The server has a root directory (root), a list of the PUT and MOVE requests it received (requests)
+    and a number of PUT requests that fail with status 503 before PUTs succeed again (failures).
+    """
+    server = ThreadingHTTPServer(("127.0.0.1", 0), WebDAVStandIn)
+    server.root = str(tmp_path / "server")
+    server.requests = []
+    server.failures = 0
+    os.makedirs(server.root)
+
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
@@ -0,0 +1,138 @@
+"""Tests of the chunked Nextcloud upload against the local WebDAV stand-in."""
+
+import os
+
+import pytest
+
+from config import Config
+from modules import useq_nextcloud
+from modules.useq_nextcloud import NextcloudUploadError, NextcloudUtil
+
+WEBDAV_ROOT = "remote.php/dav/files/usfuser/"
+CHUNK_SIZE = 1000
+
+
+@pytest.fixture
+def nextcloud_util(webdav_server, monkeypatch):
+    """NextcloudUtil connected to the stand-in, with small chunks uploaded in order and without retry delays."""
+    monkeypatch.setattr(Config, "NEXTCLOUD_UPLOAD_CHUNK_SIZE", CHUNK_SIZE)
+    monkeypatch.setattr(Config, "NEXTCLOUD_UPLOAD_RETRIES", 3)
+    monkeypatch.setattr(Config, "NEXTCLOUD_UPLOAD_WORKERS", 1)
+    monkeypatch.setattr(useq_nextcloud.time, "sleep", lambda seconds: None)
+
+    for directory in (f"{WEBDAV_ROOT}raw_data", "remote.php/dav/uploads/usfuser"):
+        os.makedirs(os.path.join(webdav_server.root, directory))
+
+    nextcloud_util = NextcloudUtil()
+    nextcloud_util.set_hostname(f"127.0.0.1:{webdav_server.server_address[1]}", protocol="http")
+    nextcloud_util.setup("usfuser", "password", WEBDAV_ROOT, "raw_data/", "")
+    return nextcloud_util
+
+
+def local_file(tmp_path, name, size):
+    """Create a local file with size bytes of non-repeating content."""
+    path = tmp_path / name
+    path.write_bytes(bytes(index % 251 for index in range(size)))
+    return path
+
+
+def test_upload_file_assembles_chunks(webdav_server, nextcloud_util, tmp_path):
+    path = local_file(tmp_path, "run.tar", 2 * CHUNK_SIZE + 500)
+
+    result = nextcloud_util.upload_file(str(path), nextcloud_util._remote_path(path.name))
+
+    remote = os.path.join(webdav_server.root, WEBDAV_ROOT, "raw_data", path.name)
+    assert open(remote, "rb").read() == path.read_bytes()
+    assert result["size"] == path.stat().st_size
+
+    puts = [request for request in webdav_server.requests if request[0] == "PUT"]
+    assert [put[1].rsplit("/", 1)[1] for put in puts] == ["00001", "00002", "00003"]
+
+
+def test_upload_file_moves_upload_directory_to_destination(webdav_server, nextcloud_util, tmp_path):
+    path = local_file(tmp_path, "run.tar", CHUNK_SIZE)
+
+    nextcloud_util.upload_file(str(path), nextcloud_util._remote_path(path.name))
+
+    moves = [request for request in webdav_server.requests if request[0] == "MOVE"]
+    assert len(moves) == 1
+    assert moves[0][1].startswith("/remote.php/dav/uploads/usfuser/") and moves[0][1].endswith("/.file")
+    assert moves[0][2].endswith(f"/{WEBDAV_ROOT}raw_data/run.tar")
+    assert os.listdir(os.path.join(webdav_server.root, "remote.php/dav/uploads/usfuser")) == []
+
+
+def test_upload_file_retries_failed_chunks(webdav_server, nextcloud_util, tmp_path):
+    path = local_file(tmp_path, "run.tar", 2 * CHUNK_SIZE)
+    webdav_server.failures = 2
+
+    nextcloud_util.upload_file(str(path), nextcloud_util._remote_path(path.name))
+
+    remote = os.path.join(webdav_server.root, WEBDAV_ROOT, "raw_data", path.name)
+    assert open(remote, "rb").read() == path.read_bytes()
+    assert len([request for request in webdav_server.requests if request[0] == "PUT"]) == 4
+
+
+def test_upload_file_fails_after_retries(webdav_server, nextcloud_util, tmp_path):
+    path = local_file(tmp_path, "run.tar", CHUNK_SIZE)
+    webdav_server.failures = Config.NEXTCLOUD_UPLOAD_RETRIES
+
+    with pytest.raises(NextcloudUploadError):
+        nextcloud_util.upload_file(str(path), nextcloud_util._remote_path(path.name))
+
+    assert all(request[0] == "PUT" for request in webdav_server.requests)
+
+
+def test_upload_file_resumes_missing_chunks(webdav_server, nextcloud_util, tmp_path):
+    path = local_file(tmp_path, "run.tar", 3 * CHUNK_SIZE)
+    webdav_server.failures = Config.NEXTCLOUD_UPLOAD_RETRIES
+
+    # The first chunk fails on every attempt, the other chunks stay in the upload directory
+    with pytest.raises(NextcloudUploadError):
+        nextcloud_util.upload_file(str(path), nextcloud_util._remote_path(path.name))
+
+    webdav_server.requests.clear()
+    nextcloud_util.upload_file(str(path), nextcloud_util._remote_path(path.name))
+
+    remote = os.path.join(webdav_server.root, WEBDAV_ROOT, "raw_data", path.name)
+    assert open(remote, "rb").read() == path.read_bytes()
+    puts = [request for request in webdav_server.requests if request[0] == "PUT"]
+    assert [put[1].rsplit("/", 1)[1] for put in puts] == ["00001"]
+
+
+def test_upload_directory(webdav_server, nextcloud_util, tmp_path):
+    directory = tmp_path / "run"
+    directory.mkdir()
+    first = local_file(directory, "a.fastq.gz", CHUNK_SIZE + 1)
+    second = local_file(directory, "b.fastq.gz", 10)
+
+    results = nextcloud_util.upload_directory(str(directory), nextcloud_util._remote_path("run/"))
+
+    remote_dir = os.path.join(webdav_server.root, WEBDAV_ROOT, "raw_data", "run")
+    assert sorted(os.listdir(remote_dir)) == ["a.fastq.gz", "b.fastq.gz"]
+    assert open(os.path.join(remote_dir, "a.fastq.gz"), "rb").read() == first.read_bytes()
+    assert results["b.fastq.gz"]["size"] == second.stat().st_size
+
+
+@pytest.mark.parametrize("webdav_root, run_dir", [
+    ("remote.php/dav/files/usfuser/", "raw_data/"),
+    ("remote.php/dav/files/usfuser", "raw_data"),
+    ("/remote.php/dav/files/usfuser/", "/raw_data/"),
+])
+def test_remote_path_joins_with_single_slashes(webdav_root, run_dir):
+    nextcloud_util = NextcloudUtil()
+    nextcloud_util.webdav_root = webdav_root
+    nextcloud_util.run_dir = run_dir
+
+    assert nextcloud_util._remote_path("run.tar") == "remote.php/dav/files/usfuser/raw_data/run.tar"
+    assert nextcloud_util._remote_path("/run/", "a.fastq.gz") == "remote.php/dav/files/usfuser/raw_data/run/a.fastq.gz"
+    assert nextcloud_util._remote_path() == "remote.php/dav/files/usfuser/raw_data"
+
+
+@pytest.mark.parametrize("run_dir", ["raw_data/", "raw_data"])
+def test_wait_for_lists_parent_below_run_dir(webdav_server, nextcloud_util, tmp_path, run_dir):
+    nextcloud_util.run_dir = run_dir
+    os.makedirs(os.path.join(webdav_server.root, WEBDAV_ROOT, "raw_data", "run"))
+    local_file(tmp_path, "done.txt", 10).replace(os.path.join(webdav_server.root, WEBDAV_ROOT, "raw_data", "run", "done.txt"))
+
+    assert nextcloud_util.wait_for("run/done.txt", size=10, timeout=0)
+    assert not nextcloud_util.wait_for("run/missing.txt", timeout=0)
@@ -9,6 +9,7 @@ import traceback
 from typing import Optional, Dict, Any, List
 from pathlib import Path
 from genologics.lims import Lims
+from modules.useq_lims import CachedLims
 from logging.handlers import TimedRotatingFileHandler
 from logging import StreamHandler
 # Import modules
@@ -25,11 +26,19 @@ class USEQTools:
         """Initialize USEQ tools with LIMS connection."""
         try:
             self.lims = Lims(Config.LIMS_URI, Config.LIMS_USER, Config.LIMS_PW)
+            self._cached_lims = None
             logger.info("Successfully connected to LIMS")
         except Exception as e:
             logger.error(f"Failed to connect to LIMS: {e}")
             raise ConnectionError(f"LIMS connection failed: {e}")
 
+    @property
+    def cached_lims(self) -> CachedLims:
+        """LIMS with cached lookups shared by the read-only reporting commands, created on first use."""
+        if self._cached_lims is None:
+            self._cached_lims = CachedLims(Config.LIMS_URI, Config.LIMS_USER, Config.LIMS_PW)
+        return self._cached_lims
+
     def _setup_argument_parser(self) -> argparse.ArgumentParser:
 
         """
@@ -303,7 +312,7 @@ class USEQTools:
         )
         year_parser.add_argument(
             '-y', '--year',
-            help='Year to analyze (leave empty for all years)'
+            help='Year or year range (e.g. 2023-2025) to analyze (leave empty for all years)'
         )
         year_parser.add_argument(
             '-o', '--output',
@@ -614,6 +623,11 @@ class USEQTools:
             'manage_runs',
             help='Manage sequencing run processing pipeline'
         )
+        runs_parser.add_argument(
+            '-w', '--workers',
+            type=int,
+            help='Number of runs processed in parallel (default: MANAGE_RUNS_WORKERS setting)'
+        )
         runs_parser.set_defaults(func=self.manage_runs)
 
         # Run overview
@@ -810,7 +824,8 @@ class USEQTools:
 
         """
         try:
-            utilities.useq_get_researchers.run(self.lims, args.output_file)
+            utilities.useq_get_researchers.run(self.cached_lims, args.output_file)
+            logger.info(self.cached_lims.format_cache_metrics())
         except Exception as e:
             logger.error(f"Get researchers failed: {e}")
             raise
@@ -848,7 +863,8 @@ class USEQTools:
 
         """
         try:
-            utilities.useq_get_accounts.run(self.lims, args.output_file)
+            utilities.useq_get_accounts.run(self.cached_lims, args.output_file)
+            logger.info(self.cached_lims.format_cache_metrics())
         except Exception as e:
             logger.error(f"Get accounts failed: {e}")
             raise
@@ -947,7 +963,7 @@ class USEQTools:
         Args:
             args (argparse.Namespace): Contains command-line arguments including:
 
-                - year: The four-digit year (e.g., '2025') to filter projects based on their closed date. If None, projects from all years are processed.
+                - year: The four-digit year (e.g., '2025') or inclusive year range (e.g., '2023-2025') to filter projects based on their closed date. If None, projects from all years are processed.
                 - output: Optional output file, defaults to stdout.
 
         Raises:
@@ -964,6 +980,7 @@ class USEQTools:
 
         """
         try:
+            # The rollup store is the cache of the year overview, the projects are read fresh from the LIMS
             utilities.useq_year_overview.run(self.lims, args.year, args.output)
         except Exception as e:
             logger.error(f"Year overview failed: {e}")
@@ -1028,7 +1045,8 @@ class USEQTools:
             This functionality is mainly used in :meth:`share_data` and only incidentally manually.
         """
         try:
-            utilities.useq_sample_report.run(self.lims, args.project_id, args.output_file)
+            utilities.useq_sample_report.run(self.cached_lims, args.project_id, args.output_file)
+            logger.info(self.cached_lims.format_cache_metrics())
         except Exception as e:
             logger.error(f"Sample report failed: {e}")
             raise
@@ -1227,7 +1245,8 @@ class USEQTools:
             For most steps add 24- in front of this number, for pooling steps add 122-.
         """
         try:
-            epp.useq_finance_overview.run(self.lims, args.step, args.output_file)
+            epp.useq_finance_overview.run(self.cached_lims, args.step, args.output_file)
+            logger.info(self.cached_lims.format_cache_metrics())
         except Exception as e:
             logger.error(f"Finance overview failed: {e}")
             raise
@@ -1534,6 +1553,7 @@ class USEQTools:
            - Retrieves or locates sample sheets from LIMS or run directory
            - Parses run metadata from XML files (RunInfo.xml, RunParameters.xml)
            - Implements locking mechanism to prevent concurrent processing
+           - Optionally processes several runs in parallel, limited per machine and sharing a CPU and transfer budget
 
         2. Demultiplexing
 
@@ -1541,6 +1561,7 @@ class USEQTools:
            - Tests both forward and reverse complement index configurations
            - Validates demultiplexing quality by checking undetermined read ratios
            - Runs BCL Convert to generate FASTQ files from base call files
+           - Optionally converts all projects in a single BCL Convert pass over the whole flowcell and splits the output per project
            - Adds flowcell IDs to FASTQ filenames for traceability
 
         3. Quality Control & Statistics
@@ -1585,7 +1606,9 @@ class USEQTools:
             9. Email Notification
 
         Args:
-            args: Description of the arguments passed to the method.
+            args (argparse.Namespace): Contains command-line arguments including:
+
+                - workers: Optional number of runs processed in parallel, defaults to the MANAGE_RUNS_WORKERS setting.
 
         Raises:
             Exception: Re-raises any exceptions that occur during processing.
@@ -1594,9 +1617,13 @@ class USEQTools:
             Start the run processing daemon::
 
                 python useq_tools daemons manage_runs
+
+            Start the run processing daemon processing up to 3 runs in parallel::
+
+                python useq_tools daemons manage_runs --workers 3
         """
         try:
-            daemons.useq_manage_runs.run(self.lims)
+            daemons.useq_manage_runs.run(self.lims, args.workers)
         except Exception as e:
             logger.error(f"Run management failed: {e}")
             raise
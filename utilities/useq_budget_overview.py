@@ -1,13 +1,17 @@
-from genologics.entities import Step, ProtocolStep
+from genologics.entities import Step, ProtocolStep, Sample
 from modules.useq_template import TEMPLATE_PATH,TEMPLATE_ENVIRONMENT,renderTemplate
+from modules.useq_lims import iter_pages, prefetch
+from modules.useq_lineage import get_lineage_index
 from config import Config
+from functools import lru_cache
 import re
 import sys
 import json
 import urllib
 #####NEEDS FIXING TO SUPPORT FOR NEW FINANCE DB############
+@lru_cache(maxsize=None)
 def getAllCosts():
-	"""Retrieves costs from cost db"""
+	"""Retrieves costs from cost db, once per process"""
 	costs_json = ""
 	try:
 		costs_json = urllib.request.urlopen( COST_DB ).read()
@@ -63,24 +67,29 @@ def getStepProtocol(lims, step_id=None, step_uri=None):
 	return protocol_name
 
 
-def getOverview(lims,bnr):
+def getBudgetSamples(lims, budget_numbers):
+	"""Streams the samples of all budget numbers from the LIMS in one pass, filtered on the Budget Number UDF by the LIMS"""
+	budget_samples = dict( (bnr, {'seq' : [], 'snp' : []}) for bnr in budget_numbers )
+
+	for samples in iter_pages(lims, Sample, params={'udf.Budget Number' : list(budget_numbers)}):
+		prefetch(sample.project for sample in samples)
+
+		for sample in samples:
+			if 'Budget Number' not in sample.udf: continue
+			project = sample.project
+			sample_type = 'snp' if project.udf['Application'] == 'USF - SNP genotyping' or project.udf['Application'] == 'Research' else 'seq'
+			for bnr in budget_numbers:
+				if sample.udf['Budget Number'] == bnr:
+					budget_samples[bnr][sample_type].append(sample)
+
+	return budget_samples
+
+def getOverview(lims,bnr,seq_samples,snp_samples):
 
-	# samples = lims.get_samples(udf={'Budget Number':bnr})
-	samples = lims.get_samples()
 	ovw_snp = {}
 	ovw_seq = {}
-	snp_samples = []
-	seq_samples = []
 	all_costs = getAllCosts()
 
-	for sample in samples:
-		if 'Budget Number' in sample.udf and bnr in sample.udf['Budget Number']:
-			project = sample.project
-			if project.udf['Application'] == 'USF - SNP genotyping' or project.udf['Application'] == 'Research':
-				snp_samples.append(sample)
-			else:
-				seq_samples.append(sample)
-
 	for sample in seq_samples:
 		project = sample.project
 		if project.id not in ovw_seq:
@@ -100,25 +109,22 @@ def getOverview(lims,bnr):
 		ovw_seq[project.id]['requested_library_prep'].add(sample.udf['Library prep kit'])
 		ovw_seq[project.id]['requested_runtype'].add(sample.udf['Sequencing Runtype'])
 
-		sample_artifacts = lims.get_artifacts(samplelimsid=sample.id)
-		for sample_artifact in sample_artifacts:
-
-			if not sample_artifact.parent_process: continue
-			process_name = sample_artifact.parent_process.type.name
+		for row in get_lineage_index(lims, project.id).sample_rows(sample.id):
+			process_name = row.process_type
 
 			if process_name in Config.ISOLATION_PROCESSES:
 
-				if 'US Isolation Type' in sample_artifact.udf:
-					isolation_type = "{0} isolation".format(sample_artifact.udf['US Isolation Type'].split(" ")[0].lower())
+				if 'US Isolation Type' in row.udfs:
+					isolation_type = "{0} isolation".format(row.udfs['US Isolation Type'].split(" ")[0].lower())
 
-					billing_date = getNearestBillingDate(all_costs, isolation_type , sample_artifact.parent_process.date_run)
+					billing_date = getNearestBillingDate(all_costs, isolation_type , row.date_run)
 
 					ovw_seq[project.id]['isolation_step_costs'] += float(all_costs[ isolation_type ][ 'date_step_costs' ][ billing_date ])
 					ovw_seq[project.id]['isolation_personell_costs'] += float(all_costs[ isolation_type ][ 'date_personell_costs' ][ billing_date ])
 					ovw_seq[project.id]['total_step_costs']+= float(all_costs[ isolation_type ][ 'date_step_costs' ][ billing_date ])
 					ovw_seq[project.id]['total_personell_costs']+= float(all_costs[ isolation_type ][ 'date_personell_costs' ][ billing_date ])
-					ovw_seq[project.id]['lims_isolation'].add(sample_artifact.udf['US Isolation Type'])
-					ovw_seq[project.id]['isolation_date'].add(sample_artifact.parent_process.date_run)
+					ovw_seq[project.id]['lims_isolation'].add(row.udfs['US Isolation Type'])
+					ovw_seq[project.id]['isolation_date'].add(row.date_run)
 
 					if isolation_type == 'rna isolation' and sample.udf['Sample Type'] != 'RNA unisolated':
 						ovw_seq[project.id]['errors'].add("Isolation type {0} in LIMS doesn't match sample type {1}".format(isolation_type, sample.udf['Sample Type']))
@@ -127,7 +133,7 @@ def getOverview(lims,bnr):
 					else:
 						ovw_seq[project.id]['errors'].add("Could not find isolation type")
 			elif process_name in Config.LIBPREP_PROCESSES:
-				protocol_name = getStepProtocol(lims, step_id=sample_artifact.parent_process.id)
+				protocol_name = getStepProtocol(lims, step_id=row.process_id)
 
 				if '-' in protocol_name[0:10]:
 					lims_library_prep = protocol_name.split("-",1)[1].lower().strip()
@@ -136,12 +142,12 @@ def getOverview(lims,bnr):
 
 				ovw_seq[project.id]['lims_library_prep'].add(lims_library_prep)
 
-				billing_date = getNearestBillingDate(all_costs, lims_library_prep , sample_artifact.parent_process.date_run)
+				billing_date = getNearestBillingDate(all_costs, lims_library_prep , row.date_run)
 				ovw_seq[project.id]['libprep_step_costs'] += float(all_costs[ lims_library_prep][ 'date_step_costs' ][ billing_date ])
 				ovw_seq[project.id]['libprep_personell_costs'] += float(all_costs[ lims_library_prep][ 'date_personell_costs' ][ billing_date ])
 				ovw_seq[project.id]['total_step_costs'] += float(all_costs[ lims_library_prep][ 'date_step_costs' ][ billing_date ])
 				ovw_seq[project.id]['total_personell_costs'] += float(all_costs[ lims_library_prep][ 'date_personell_costs' ][ billing_date ])
-				ovw_seq[project.id]['libprep_date'].add(sample_artifact.parent_process.date_run)
+				ovw_seq[project.id]['libprep_date'].add(row.date_run)
 
 				if sample.udf['Library prep kit'] == 'Truseq RNA stranded polyA' and 'libprep rna stranded polya' not in ovw_seq[project.id]['lims_library_prep']:
 					ovw_seq[project.id]['errors'].add("Libprep type {0} in LIMS doesn't match libprep type {1}".format(ovw_seq[project.id]['lims_library_prep'],sample.udf['Library prep kit']))
@@ -153,29 +159,29 @@ def getOverview(lims,bnr):
 					ovw_seq[project.id]['errors'].add("Libprep type {0} in LIMS doesn't match libprep type {1}".format(ovw_seq[project.id]['lims_library_prep'],sample.udf['Library prep kit']))
 
 			elif process_name in Config.RUN_PROCESSES and not ovw_seq[project.id]['lims_runtype']:
-				protocol_name = getStepProtocol(lims, step_id=sample_artifact.parent_process.id)
+				protocol_name = getStepProtocol(lims, step_id=row.process_id)
 
 				if '-' in protocol_name:
 					ovw_seq[project.id]['lims_runtype'] = protocol_name.split("-",1)[1].lower().strip()
 				else:
 					ovw_seq[project.id]['lims_runtype'] = protocol_name.split(":",1)[1].lower().strip()
 				requested_runtype = sample.udf['Sequencing Runtype'].lower()
-				billing_date = getNearestBillingDate(all_costs, requested_runtype , sample_artifact.parent_process.date_run)
+				billing_date = getNearestBillingDate(all_costs, requested_runtype , row.date_run)
 				ovw_seq[project.id]['run_step_costs'] = float(all_costs[ requested_runtype ][ 'date_step_costs' ][ billing_date ])
 				ovw_seq[project.id]['run_personell_costs'] = float(all_costs[ requested_runtype ][ 'date_personell_costs' ][ billing_date ])
 				ovw_seq[project.id]['total_step_costs'] += float(all_costs[ requested_runtype ][ 'date_step_costs' ][ billing_date ])
 				ovw_seq[project.id]['total_personell_costs'] += float(all_costs[ requested_runtype ][ 'date_personell_costs' ][ billing_date ])
-				ovw_seq[project.id]['run_date'] = sample_artifact.parent_process.date_run
+				ovw_seq[project.id]['run_date'] = row.date_run
 
 				# if ovw_seq[project.id]['lims_runtype'].split(" ")[0] not in ",".join(ovw_seq[project.id]['requested_runtype']).lower():
 				# ovw_seq[project.id]['errors'].add("Run type {0} in LIMS doesn't match run type {1}".format(ovw_seq[project.id]['lims_runtype'],",".join(ovw_seq[project.id]['requested_runtype'])))
 			elif process_name in Config.ANALYSIS_PROCESSES:
-				billing_date = getNearestBillingDate(all_costs, 'mapping wgs' , sample_artifact.parent_process.date_run)
-				ovw_seq[project.id]['analysis_date'].add(sample_artifact.parent_process.date_run)
+				billing_date = getNearestBillingDate(all_costs, 'mapping wgs' , row.date_run)
+				ovw_seq[project.id]['analysis_date'].add(row.date_run)
 				analysis_steps =['Raw data (FastQ)']
 				analysis_step_costs = 0
 				analysis_personell_costs = 0
-				if sample_artifact.parent_process.udf['Mapping']:
+				if row.process_udfs.get('Mapping'):
 					analysis_steps.append('Mapping')
 					if sample.udf['Sample Type'].startswith('RNA'):
 						analysis_step_costs += float(all_costs['mapping rna']['date_step_costs'][ billing_date ])
@@ -183,23 +189,23 @@ def getOverview(lims,bnr):
 					else:
 						analysis_step_costs += float(all_costs['mapping wgs']['date_step_costs'][ billing_date ])
 						analysis_personell_costs += float(all_costs['mapping wgs']['date_personell_costs'][ billing_date ])
-				if sample_artifact.parent_process.udf['Germline SNV/InDel calling']:
+				if row.process_udfs.get('Germline SNV/InDel calling'):
 					analysis_steps.append('Germline SNV/InDel calling')
 					analysis_step_costs += float(all_costs['germline snv/indel calling']['date_step_costs'][ billing_date ])
 					analysis_personell_costs += float(all_costs['germline snv/indel calling']['date_personell_costs'][ billing_date ])
-				if sample_artifact.parent_process.udf['Read count analysis (mRNA)']:
+				if row.process_udfs.get('Read count analysis (mRNA)'):
 					analysis_steps.append('Read count analysis (mRNA)')
 					analysis_step_costs += float(all_costs['read count analysis (mrna)']['date_step_costs'][ billing_date ])
 					analysis_personell_costs += float(all_costs['read count analysis (mrna)']['date_personell_costs'][ billing_date ])
-				if sample_artifact.parent_process.udf['Differential expression analysis + figures (mRNA)']:
+				if row.process_udfs.get('Differential expression analysis + figures (mRNA)'):
 					analysis_steps.append('Differential expression analysis + figures (mRNA)')
 					analysis_step_costs += float(all_costs['differential expression analysis + figures (mrna)']['date_step_costs'][ billing_date ])
 					analysis_personell_costs += float(all_costs['differential expression analysis + figures (mrna)']['date_personell_costs'][ billing_date ])
-				if sample_artifact.parent_process.udf['CNV + SV calling']:
+				if row.process_udfs.get('CNV + SV calling'):
 					analysis_steps.append('CNV + SV calling')
 					analysis_step_costs += float(all_costs['cnv + sv calling']['date_step_costs'][ billing_date ])
 					analysis_personell_costs += float(all_costs['cnv + sv calling']['date_personell_costs'][ billing_date ])
-				if sample_artifact.parent_process.udf['Somatic calling (tumor/normal pair)']:
+				if row.process_udfs.get('Somatic calling (tumor/normal pair)'):
 					analysis_steps.append('Somatic calling (tumor/normal pair)')
 					analysis_step_costs += float(all_costs['somatic calling (tumor/normal pair)']['date_step_costs'][ billing_date ])
 					analysis_personell_costs += float(all_costs['somatic calling (tumor/normal pair)']['date_personell_costs'][ billing_date ])
@@ -304,7 +310,9 @@ def getOverview(lims,bnr):
 
 def run(lims, budget_numbers, output_file):
 
+    budget_numbers = budget_numbers.split(',')
+    budget_samples = getBudgetSamples(lims, budget_numbers)
 
-    for bnr in budget_numbers.split(','):
+    for bnr in budget_numbers:
 
-        getOverview(lims, bnr)
+        getOverview(lims, bnr, budget_samples[bnr]['seq'], budget_samples[bnr]['snp'])
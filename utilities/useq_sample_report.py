@@ -3,9 +3,9 @@
 import sys
 from typing import Dict, Any, TextIO, Optional
 
-from genologics.entities import Project
 from genologics.lims import Lims
 from config import Config
+from modules.useq_lineage import get_lineage_index
 
 
 def get_sample_measurements(lims: Lims, project_id: str, output_file: Optional[TextIO] = None) -> Dict[str, Dict[str, Any]]:
@@ -47,24 +47,18 @@ def get_sample_measurements(lims: Lims, project_id: str, output_file: Optional[T
         are marked as 'NA'.
     """
     collected_measurements = {'samples': {}, 'pool': {}}
-    project = Project(lims, id=project_id)
     samples = lims.get_samples(projectlimsid=project_id)
+    lineage = get_lineage_index(lims, project_id)
 
     for sample in samples:
         if sample.name not in collected_measurements['samples']:
             collected_measurements['samples'][sample.name] = {}
 
-        sample_artifacts = lims.get_artifacts(samplelimsid=sample.id)
+        for row in lineage.sample_rows(sample.id):
+            process_name = row.process_type
+            all_udfs = row.udfs
 
-        for sample_artifact in sample_artifacts:
-            if not sample_artifact.parent_process:
-                continue
-
-            parent_process = sample_artifact.parent_process
-            process_name = parent_process.type.name
-            all_udfs = dict(sample_artifact.udf.items())
-
-            if not all_udfs:
+            if not row.has_udfs:
                 continue
 
             if process_name in Config.ISOLATION_PROCESSES:
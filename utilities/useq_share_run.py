@@ -13,7 +13,6 @@ import json
 import os
 import re
 import sys
-import time
 from pathlib import Path
 from typing import Dict, List, Optional, Tuple, Union, Any
 
@@ -597,7 +596,16 @@ class DataSharer:
             print(f"Error: Failed to upload {local_path} to NextCloud")
             return False
 
-        time.sleep(90)  # Wait for upload to complete
+        # Wait until Nextcloud shows the complete upload
+        if local_path.is_dir():
+            size = sum(file.stat().st_size for file in local_path.rglob('*') if file.is_file())
+        else:
+            size = local_path.stat().st_size
+
+        if not self.nextcloud_util.wait_for(local_path.name, size=size) or not self.nextcloud_util.wait_for(upload_done_file.name):
+            print(f"Error: {local_path.name} did not show up completely on NextCloud")
+            return False
+
         return True
 
     def _display_texttable(self, rows: List[List]):
@@ -2,27 +2,172 @@
 
 from config import Config
 from genologics.lims import Lims
-from typing import Dict, Any, Optional, TextIO
+from genologics.entities import Project
+from modules.useq_lims import prefetch
+from modules.useq_lineage import LAST_MODIFIED_FORMAT
+from typing import Dict, Any, List, Optional, TextIO, Tuple
 from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import closing
+from datetime import datetime, timezone
 from tqdm import tqdm
 
 import csv
-def get_year_overview(lims: Lims, year: Optional[str]) -> Dict[str, Dict[str, Any]]:
-    """Generate overview of projects by year, platform, run type, and sample type.
+import os
+import sqlite3
+
+# Rollup of a closed project: (close_date, platform, run_type, sample_type, nr_samples)
+Rollup = Tuple[str, Optional[str], Optional[str], Optional[str], int]
+
+
+def _connect_rollup_store() -> sqlite3.Connection:
+    """Open the rollup store, creating its tables if needed.
+
+    The store has one rollup per closed project, keyed by project id and close date, the closed projects
+    that are not counted yet (pending) and the time of the last update. Closed projects that are never
+    counted in the overview are stored without platform.
+
+    Returns:
+        Connection to the rollup store.
+    """
+    os.makedirs(os.path.dirname(Config.YEAR_OVERVIEW_STORE) or '.', exist_ok=True)
+    store = sqlite3.connect(Config.YEAR_OVERVIEW_STORE)
+    new_pending = not store.execute("SELECT 1 FROM sqlite_master WHERE name = 'pending'").fetchone()
+    store.executescript("""
+        CREATE TABLE IF NOT EXISTS rollups (
+            project_id TEXT NOT NULL,
+            close_date TEXT NOT NULL,
+            platform TEXT,
+            run_type TEXT,
+            sample_type TEXT,
+            samples INTEGER NOT NULL,
+            PRIMARY KEY (project_id, close_date)
+        );
+        CREATE TABLE IF NOT EXISTS pending (
+            project_id TEXT PRIMARY KEY
+        );
+        CREATE TABLE IF NOT EXISTS sync_state (
+            id INTEGER PRIMARY KEY CHECK (id = 1),
+            synced_at TEXT NOT NULL
+        );
+    """)
+
+    # Stores created before the pending table check their uncounted projects once more
+    if new_pending:
+        with store:
+            store.execute("INSERT INTO pending SELECT project_id FROM rollups WHERE platform IS NULL")
+
+    return store
+
+
+def get_project_rollup(lims: Lims, project: Project) -> Optional[Rollup]:
+    """Collect the year overview counters of a closed project.
 
     Args:
         lims: LIMS instance
-        year: The four-digit year (e.g., '2025') to filter projects based on their `close_date`. If None, projects from all years are processed.
+        project: Closed LIMS project
 
     Returns:
-        Nested dictionary with structure:
-        {year: {platform: {run_types: {run_type: {sample_types: {sample_type: {runs, samples}}}}}}}
+        Tuple of (close_date, platform, run_type, sample_type, nr_samples). The platform is None for
+        projects that are never counted: other applications or no samples. None for projects that are
+        not counted yet: no billing process or no platform.
 
     Note:
-        - Projects without a `close_date` or a billing process are ignored.
         - Projects without a platform but labeled as 'SNP' are automatically
           categorized under 'SNP Fingerprinting'.
     """
+    not_counted = (project.close_date, None, None, None, 0)
+
+    if project.udf.get('Application') not in Config.PROJECT_TYPES.values():
+        return not_counted
+
+    samples = lims.get_samples(projectlimsid=project.id)
+    if not samples:
+        return not_counted
+
+    project_processes = lims.get_processes(
+        type=['USEQ - Ready for billing', 'Ready for billing'],
+        projectname=project.name
+    )
+    if not project_processes:
+        return None
+
+    sample_type = samples[0].udf.get('Sample Type')
+    platform = samples[0].udf.get('Platform')
+    run_type = samples[0].udf.get('Sequencing Runtype')
+    application = project.udf['Application']
+
+    # Handle missing platform for SNP projects
+    if not platform and 'SNP' in application:
+        platform = 'SNP Fingerprinting'
+    elif not platform:
+        print(f"Warning: Project {project.id} has no platform defined")
+        return None
+
+    return project.close_date, platform, run_type, sample_type, len(samples)
+
+
+def update_rollup_store(lims: Lims, store: sqlite3.Connection) -> int:
+    """Add the rollups of the projects closed since the last update to the store.
+
+    Closed projects never change, so only projects modified since the last update are read from the
+    LIMS (all projects on the first update). Of those, only projects whose close date differs from the
+    stored one are rolled up again; reopened projects are removed from the store. Pending projects,
+    closed without billing process or platform, are rolled up again on every update until they count.
+
+    Args:
+        lims: LIMS instance, not a CachedLims: cached projects could hide a close date set since the last update
+        store: Connection to the rollup store
+
+    Returns:
+        Number of projects rolled up.
+    """
+    synced_at = datetime.now(timezone.utc).strftime(LAST_MODIFIED_FORMAT)
+    stored = dict(store.execute("SELECT project_id, close_date FROM rollups"))
+    pending = {project_id for (project_id,) in store.execute("SELECT project_id FROM pending")}
+    last_sync = store.execute("SELECT synced_at FROM sync_state").fetchone()
+
+    projects = lims.get_projects(last_modified=last_sync[0]) if last_sync else lims.get_projects()
+    projects = prefetch(projects + [Project(lims, id=project_id) for project_id in sorted(pending)])
+    changed = [project for project in projects if project.id in pending or stored.get(project.id) != project.close_date]
+    closed = [project for project in changed if project.close_date]
+
+    with ThreadPoolExecutor(max_workers=Config.LIMS_WORKERS) as executor:
+        rollups = list(tqdm(
+            executor.map(lambda project: get_project_rollup(lims, project), closed),
+            total=len(closed), desc="Processing Projects", unit="proj"
+        ))
+
+    with store:
+        store.executemany("DELETE FROM rollups WHERE project_id = ?", [(project.id,) for project in changed])
+        store.execute("DELETE FROM pending")
+        store.executemany(
+            "INSERT INTO rollups (project_id, close_date, platform, run_type, sample_type, samples) VALUES (?, ?, ?, ?, ?, ?)",
+            [(project.id, *rollup) for project, rollup in zip(closed, rollups) if rollup]
+        )
+        store.executemany(
+            "INSERT INTO pending (project_id) VALUES (?)",
+            [(project.id,) for project, rollup in zip(closed, rollups) if not rollup]
+        )
+        store.execute("INSERT OR REPLACE INTO sync_state (id, synced_at) VALUES (1, ?)", (synced_at,))
+
+    return len(closed)
+
+
+def build_overview(rollups: List[Rollup], year: Optional[str]) -> Dict[str, Dict[str, Any]]:
+    """Aggregate project rollups by year, platform, run type, and sample type.
+
+    Args:
+        rollups: Project rollups from get_project_rollup()
+        year: The four-digit year (e.g., '2025') or inclusive year range (e.g., '2023-2025') to filter projects based on their `close_date`. If None, projects from all years are processed.
+
+    Returns:
+        Nested dictionary with structure:
+        {year: {platform: {run_types: {run_type: {sample_types: {sample_type: {runs, samples}}}}}}}
+    """
+    first_year, _, last_year = (year or '').partition('-')
+    last_year = last_year or first_year
+
     # Define a recursive factory for the nested structure
     # Structure: Year -> Platform -> "run_types" -> RunType -> "sample_types" -> SampleType -> Metrics
     tree = lambda: defaultdict(lambda: {
@@ -33,55 +178,46 @@ def get_year_overview(lims: Lims, year: Optional[str]) -> Dict[str, Dict[str, An
 
     overview = defaultdict(tree)
 
-    all_projects = lims.get_projects()
-
-    for project in tqdm(all_projects, desc="Processing Projects", unit="proj"):
-        # 1. Validation and Filtering
-        if not project.close_date:
+    for close_date, platform, run_type, sample_type, nr_samples in rollups:
+        billing_year = close_date.split("-")[0]
+        if year and not first_year <= billing_year <= last_year:
             continue
 
-        if year and not project.close_date.startswith(year):
+        if not platform:
             continue
 
-        if 'Application' not in project.udf:
-            continue
+        # Increment Counters (No "if" checks needed due to defaultdict)
+        stats = overview[billing_year][platform]['run_types'][run_type]['sample_types'][sample_type]
+        stats['runs'] += 1
+        stats['samples'] += nr_samples
 
-        if project.udf['Application'] not in Config.PROJECT_TYPES.values():
-            continue
+    return overview
 
-        # 2. Sample and Process Retrieval
-        samples = lims.get_samples(projectlimsid=project.id)
-        if not samples:
-            continue
 
-        project_processes = lims.get_processes(
-            type=['USEQ - Ready for billing', 'Ready for billing'],
-            projectname=project.name
-        )
-        if not project_processes:
-            continue
+def get_year_overview(lims: Lims, year: Optional[str]) -> Dict[str, Dict[str, Any]]:
+    """Generate overview of projects by year, platform, run type, and sample type.
 
-        # 3. Data Extraction
-        billing_year = project.close_date.split("-")[0]
-        sample_type = samples[0].udf.get('Sample Type')
-        platform = samples[0].udf.get('Platform')
-        run_type = samples[0].udf.get('Sequencing Runtype')
-        application = project.udf['Application']
-
-        # Handle missing platform for SNP projects
-        if not platform and 'SNP' in application:
-            platform = 'SNP Fingerprinting'
-        elif not platform:
-            print(f"Warning: Project {project.id} has no platform defined")
-            continue
+    Newly closed projects are rolled up into the rollup store (Config.YEAR_OVERVIEW_STORE) first,
+    the overview is then aggregated from the stored rollups.
 
-        # 4. Increment Counters (No "if" checks needed due to defaultdict)
-        stats = overview[billing_year][platform]['run_types'][run_type]['sample_types'][sample_type]
-        stats['runs'] += 1
-        stats['samples'] += len(samples)
+    Args:
+        lims: LIMS instance
+        year: The four-digit year (e.g., '2025') or inclusive year range (e.g., '2023-2025') to filter projects based on their `close_date`. If None, projects from all years are processed.
 
-    # Convert back to standard dict for cleaner output/serialization if needed
-    return overview
+    Returns:
+        Nested dictionary with structure:
+        {year: {platform: {run_types: {run_type: {sample_types: {sample_type: {runs, samples}}}}}}}
+
+    Note:
+        - Projects without a `close_date` or a billing process are ignored.
+    """
+    with closing(_connect_rollup_store()) as store:
+        update_rollup_store(lims, store)
+        rollups = store.execute(
+            "SELECT close_date, platform, run_type, sample_type, samples FROM rollups"
+        ).fetchall()
+
+    return build_overview(rollups, year)
 
 
 def print_overview(overview: Dict[str, Dict[str, Any]], overview_file: TextIO):
@@ -126,7 +262,7 @@ def run(lims: Lims, year: str, overview_file: TextIO):
 
     Args:
         lims: LIMS instance
-        year: The four-digit year (e.g., '2025') to filter projects based on their `close_date`. If None, projects from all years are processed.
+        year: The four-digit year (e.g., '2025') or inclusive year range (e.g., '2023-2025') to filter projects based on their `close_date`. If None, projects from all years are processed.
         overview_file: File object to write CSV report to
     """
     overview = get_year_overview(lims, year)